@@ -0,0 +1,325 @@
+"""
+Kontrola dopuszczenia dla drogich tras (upload, logowanie/rejestracja).
+
+- Limit współbieżności per klasa tras z ograniczoną kolejką oczekujących:
+  po jej zapełnieniu albo po ADMISSION_QUEUE_TIMEOUT -> 503 + Retry-After.
+  Slot trzymany jest także w trakcie odbierania ciała żądania, więc wolne
+  uploady nie zajmują wątków ani połączeń DB potrzebnych odczytom.
+- Token bucket per użytkownik (z tokenu sesji) albo per IP -> 429 + Retry-After;
+  logowanie/rejestracja per (e-mail z formularza, IP), bo za NAT operatora
+  czy proxy wielu użytkowników ma jeden adres. IP to scope["client"], które
+  uvicorn ustawia z X-Forwarded-For tylko dla proxy z FORWARDED_ALLOW_IPS.
+- Limit rozmiaru ciała (BodySizeLimitMiddleware) -> 413, także bez Content-Length.
+Pozostałe trasy (feed, zdjęcia, mapa) przechodzą bez żadnego narzutu.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from starlette.exceptions import HTTPException
+
+from metrics import registry
+
+# --- konfiguracja
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "1").lower() in ("1", "true", "yes")
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "8"))
+UPLOAD_QUEUE = int(os.getenv("UPLOAD_QUEUE", "16"))
+AUTH_CONCURRENCY = int(os.getenv("AUTH_CONCURRENCY", "4"))
+AUTH_QUEUE = int(os.getenv("AUTH_QUEUE", "32"))
+# "liczba/sekundy": pojemność kubełka / czas pełnego odnowienia; puste = bez limitu
+UPLOAD_RATE = os.getenv("UPLOAD_RATE", "30/60")
+AUTH_RATE = os.getenv("AUTH_RATE", "10/60")
+MAX_BUCKETS = 100_000
+# formularz logowania jest mały; większego ciała nie czytamy w middleware
+AUTH_BODY_PEEK = 16 * 1024
+
+
+class ConcurrencyLimiter:
+    """
+    Semafor z ograniczoną kolejką. Retry-After szacowany z EWMA czasu obsługi:
+    tyle, ile potrzeba na rozładowanie kolejki przy obecnym tempie.
+    """
+
+    def __init__(self, limit: int, queue: int, timeout: float = ADMISSION_QUEUE_TIMEOUT):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.avg_service = 0.5
+        self._sem: Optional[asyncio.Semaphore] = None
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.avg_service * (self.waiting + 1) / self.limit))
+
+    async def acquire(self) -> bool:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.limit)
+        if self._sem.locked():
+            if self.waiting >= self.queue:
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._sem.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self.waiting -= 1
+        else:
+            await self._sem.acquire()
+        self.active += 1
+        return True
+
+    def release(self, started: float) -> None:
+        self.active -= 1
+        self.avg_service = 0.8 * self.avg_service + 0.2 * (time.perf_counter() - started)
+        self._sem.release()
+
+
+class TokenBucket:
+    """Kubełki per klucz (LRU, maks. MAX_BUCKETS); take() -> None albo sekundy do odczekania."""
+
+    def __init__(self, capacity: float, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str) -> Optional["TokenBucket"]:
+        if not spec:
+            return None
+        count, _, period = spec.partition("/")
+        return cls(float(count), float(period or 1))
+
+    def take(self, key: str) -> Optional[float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.pop(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - last) * self.rate)
+            wait = None
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > MAX_BUCKETS:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+@dataclass
+class RouteClass:
+    name: str
+    methods: Tuple[str, ...]
+    prefixes: Tuple[str, ...]
+    limiter: ConcurrencyLimiter
+    bucket: Optional[TokenBucket]
+    # kubełek per (e-mail z formularza, IP) zamiast per użytkownik/IP
+    key_by_email: bool = False
+
+    def matches(self, method: str, path: str) -> bool:
+        return method in self.methods and path.startswith(self.prefixes)
+
+
+def default_classes() -> List[RouteClass]:
+    upload = ConcurrencyLimiter(UPLOAD_CONCURRENCY, UPLOAD_QUEUE)
+    return [
+        # porcje i finalize uploadu wznawialnego: wspólny limit współbieżności,
+        # ale bez kubełka - jedno zdjęcie to jeden token, pobrany przy init
+        RouteClass("upload", ("POST", "PATCH"), ("/api/upload/resumable/",), upload, None),
+        RouteClass("upload", ("POST", "PUT"), ("/api/upload",), upload, TokenBucket.parse(UPLOAD_RATE)),
+        RouteClass(
+            "auth", ("POST",), ("/api/login", "/api/register"),
+            ConcurrencyLimiter(AUTH_CONCURRENCY, AUTH_QUEUE), TokenBucket.parse(AUTH_RATE),
+            key_by_email=True,
+        ),
+    ]
+
+
+def _client_key(scope) -> str:
+    """user:<id> z ważnego tokenu sesji, w p.p. ip:<adres>."""
+    from auth import verify_token
+
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            raw = value.decode("latin-1")
+            if raw.lower().startswith("bearer "):
+                user_id = verify_token(raw[7:].strip())
+                if user_id is not None:
+                    return f"user:{user_id}"
+            break
+    return f"ip:{_client_ip(scope)}"
+
+
+def _client_ip(scope) -> str:
+    client = scope.get("client")
+    return client[0] if client else "-"
+
+
+async def _peek_form_email(scope, receive):
+    """
+    (e-mail z ciała application/x-www-form-urlencoded albo None, receive
+    odtwarzające przeczytane komunikaty). Inne typy i większe ciała -> None.
+    """
+    content_type = b""
+    for name, value in scope["headers"]:
+        if name == b"content-type":
+            content_type = value.split(b";", 1)[0].strip().lower()
+            break
+    if content_type != b"application/x-www-form-urlencoded":
+        return None, receive
+
+    messages = []
+    body = b""
+    more = True
+    while more and len(body) <= AUTH_BODY_PEEK:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        more = message.get("more_body", False)
+
+    async def replay():
+        return messages.pop(0) if messages else await receive()
+
+    if more:
+        return None, replay
+    emails = parse_qs(body.decode("latin-1")).get("email")
+    return (emails[0].strip().lower() if emails else None), replay
+
+
+async def _reject(send, status: int, retry_after: int, detail: str) -> None:
+    body = ('{"detail":"%s"}' % detail).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+            (b"retry-after", str(retry_after).encode("ascii")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """Czysty middleware ASGI; tylko trasy z `classes` płacą za sprawdzenie."""
+
+    def __init__(self, app, classes: Optional[List[RouteClass]] = None):
+        self.app = app
+        self.classes = classes if classes is not None else default_classes()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = next((c for c in self.classes if c.matches(scope["method"], scope["path"])), None)
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        # najpierw limit per klient (tanie), potem miejsce w kolejce
+        if route.bucket is not None:
+            key = None
+            if route.key_by_email:
+                email, receive = await _peek_form_email(scope, receive)
+                if email:
+                    key = f"email:{email}|ip:{_client_ip(scope)}"
+            wait = route.bucket.take(key or _client_key(scope))
+            if wait is not None:
+                registry.count_rejection(route.name, "rate")
+                await _reject(send, 429, max(1, math.ceil(wait)), "Zbyt wiele żądań, spróbuj za chwilę.")
+                return
+
+        if not await route.limiter.acquire():
+            registry.count_rejection(route.name, "busy")
+            await _reject(send, 503, route.limiter.retry_after(), "Serwer jest przeciążony, spróbuj za chwilę.")
+            return
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route.limiter.release(started)
+
+
+class BodyTooLarge(HTTPException):
+    """Ciało żądania przekroczyło limit w trakcie odbierania."""
+
+    def __init__(self):
+        super().__init__(status_code=413, detail="Plik jest zbyt duży.")
+
+
+class BodySizeLimitMiddleware:
+    """
+    413 dla zbyt dużych ciał żądań, zanim trafią na dysk: przy znanym
+    Content-Length od razu, a przy Transfer-Encoding: chunked w chwili, gdy
+    odebrane bajty przekroczą limit (wyjątek z receive przerywa parsowanie
+    multipart i zapis porcji). limit_for(method, path) -> bajty albo None.
+    """
+
+    def __init__(self, app, limit_for: Callable[[str, str], Optional[int]]):
+        self.app = app
+        self.limit_for = limit_for
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limit_for(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > limit:
+                    registry.count_rejection("upload", "size")
+                    await self._reject(send)
+                    return
+                break
+
+        received = 0
+        started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    registry.count_rejection("upload", "size")
+                    raise BodyTooLarge()
+            return message
+
+        async def tracked_send(message):
+            nonlocal started
+            started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except BodyTooLarge:
+            # zwykle obsłuży go już FastAPI (HTTPException); tu - gdy ciało
+            # czytał kod poza obsługą wyjątków tras
+            if started:
+                raise
+            await self._reject(send)
+
+    async def _reject(self, send) -> None:
+        body = '{"detail":"Plik jest zbyt duży."}'.encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -1,26 +1,71 @@
+import asyncio
+import json
+import math
 import os
-import shutil
-import time
-from typing import Optional, List
+import string
+import tempfile
+from typing import Dict, Optional, List, Tuple
 
-from fastapi import FastAPI, UploadFile, Form, Depends, HTTPException, File
+import anyio.to_thread
+import orjson
+
+from fastapi import FastAPI, UploadFile, Form, Depends, Header, HTTPException, File, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy import select, insert, text
-from sqlalchemy.engine import Result
-from sqlalchemy.orm import Session
-from sqlalchemy.exc import OperationalError
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import and_, case, or_, select, insert
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
 
-from db import engine, get_db
-from models import metadata, users, posts
+import db as database
+from db import DBSession, engine, get_db
+from models import jobs, users, posts
+import bootstrap
+import clusters
+import resumable
+from jobs import ENRICH, job_values
+from geo import bounding_box, cover_bbox, geohash_or_none, haversine_km, valid_coordinates
+import auth
+from auth import SessionUser, current_user, hash_password, issue_token, token_expiry, verify_password
+from admission import ADMISSION_ENABLED, AdmissionMiddleware, BodySizeLimitMiddleware
+from cache import ResponseCache, is_not_modified
+from compression import COMPRESS_MIN_BYTES, CompressionMiddleware, negotiate_encoding
+from metrics import MetricsMiddleware, instrument_engine, registry as metrics_registry
+from pagination import encode_cursor, keyset_before
+from storage import (
+    MAX_UPLOAD_BYTES, STORAGE_BACKEND, ChecksumMismatch, LocalStorage, StoredFile, UploadTooLarge,
+    check_key, get_backend, key_for, normalize_ext,
+)
+import thumbnails
+from thumbnails import THUMB_FORMATS, THUMB_SIZES, THUMB_VERSION, derivative_rel_path, thumb_url_template
+from photos import (
+    IMMUTABLE, REVALIDATE, content_hash, media_type_for, negotiate_format,
+    original_headers, send_file, send_object,
+)
 
 # --- konfiguracja
 API_TITLE = os.getenv("API_TITLE", "Tourismo API")
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "20"))
+FEED_PAGE_SIZE = int(os.getenv("FEED_PAGE_SIZE", "50"))
+FEED_MAX_PAGE_SIZE = int(os.getenv("FEED_MAX_PAGE_SIZE", "100"))
+FEED_CACHE_SIZE = int(os.getenv("FEED_CACHE_SIZE", "256"))
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", "30"))
+NEARBY_MAX_RADIUS_KM = float(os.getenv("NEARBY_MAX_RADIUS_KM", "200"))
+# ile kandydatów (po przybliżonej odległości) sprawdzamy dokładnie na 1 wynik
+NEARBY_CANDIDATE_FACTOR = 4
+THREADPOOL_SIZE = int(os.getenv(
+    "THREADPOOL_SIZE", str(max(40, database.DB_POOL_SIZE + database.DB_MAX_OVERFLOW))
+))
+# pochodne to lokalny cache węzła (odtwarzalny), także przy magazynie S3;
+# katalogi tworzy render_derivatives
+THUMB_DIR = os.getenv("THUMB_DIR", os.path.join(UPLOAD_DIR, "thumbs"))
 
-app = FastAPI(title=API_TITLE)
+# orjson zamiast json.dumps dla zwykłych odpowiedzi; listy omijają też jsonable_encoder
+app = FastAPI(title=API_TITLE, default_response_class=ORJSONResponse)
+
+# strony feedu jako gotowe bajty; czyszczone po każdym udanym uploadzie
+feed_cache = ResponseCache(max_entries=FEED_CACHE_SIZE, ttl=FEED_CACHE_TTL)
 
 # CORS (pozwól na dostęp z aplikacji mobilnej / emulatora)
 app.add_middleware(
@@ -31,47 +76,115 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mount statyczny do zdjęć
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+# gzip/brotli dla dużych odpowiedzi JSON (wg Accept-Encoding); zdjęcia bez zmian
+app.add_middleware(CompressionMiddleware)
 
+# Limit rozmiaru uploadu: 413 zanim ciało trafi na dysk (Content-Length albo
+# liczenie bajtów przy chunked). Zapas na nagłówki multipart i pola formularza;
+# dokładny limit na plik pilnuje save_stream. Wewnątrz metryk i admission.
+UPLOAD_BODY_OVERHEAD = 64 * 1024
 
-# --- pomocnicze: poczekaj na DB z prostym backoffem
-def wait_for_db(max_tries: int = 60, delay_sec: float = 1.0) -> None:
-    """
-    Próbuje nawiązać krótkie połączenie z DB i wykonać SELECT 1.
-    Rzuca RuntimeError po przekroczeniu limitu prób.
-    """
-    last_err: Optional[Exception] = None
-    for attempt in range(1, max_tries + 1):
-        try:
-            with engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
-            return
-        except OperationalError as e:
-            last_err = e
-        except Exception as e:
-            last_err = e
-        time.sleep(delay_sec)
-    raise RuntimeError(f"DB not ready after {max_tries} tries") from last_err
-
-
-# --- lifecycle: inicjalizacja po starcie, gdy DB jest już gotowa
+
+def _upload_body_limit(method: str, path: str) -> Optional[int]:
+    if method not in ("POST", "PUT", "PATCH") or not path.startswith("/api/upload"):
+        return None
+    files = MAX_BATCH_FILES if path == "/api/upload/batch" else 1
+    return files * (MAX_UPLOAD_BYTES + UPLOAD_BODY_OVERHEAD)
+
+
+app.add_middleware(BodySizeLimitMiddleware, limit_for=_upload_body_limit)
+
+# limity współbieżności + token bucket dla uploadu i logowania (503/429 + Retry-After);
+# wewnątrz metryk, żeby odrzucenia też były liczone
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware)
+
+# Metryki: latencja per trasa + czasy zapytań SQL + stan puli -> /api/metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1").lower() in ("1", "true", "yes")
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
+    if database.async_engine is not None:
+        instrument_engine(database.async_engine.sync_engine)
+    for _replica in database.replicas:
+        instrument_engine(_replica.engine)
+        if _replica.async_engine is not None:
+            instrument_engine(_replica.async_engine.sync_engine)
+
+# Mount statyczny do zdjęć (zgodność wsteczna; nowe URL-e -> /api/photos z cache/Range)
+# (magazyn powstaje dopiero przy starcie -> katalog może jeszcze nie istnieć)
+if STORAGE_BACKEND == "local":
+    app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR, check_dir=False), name="uploads")
+
+
+# --- lifecycle: oczekiwanie na DB + jednorazowy bootstrap schematu (bootstrap.py)
 @app.on_event("startup")
 def _startup() -> None:
-    # Poczekaj aż DB przyjmuje zapytania
-    wait_for_db()
-
-    # Ustawienia SQL i utworzenie tabel (idempotentnie)
-    with engine.begin() as conn:
-        # To ma sens tylko dla MySQL/MariaDB. Na PostgreSQL spowoduje błąd składni,
-        # więc zostawiamy warunek bezpieczeństwa.
-        if engine.dialect.name in ("mysql", "mariadb"):
-            conn.execute(
-                text("SET sql_mode=(SELECT REPLACE(@@sql_mode,'ONLY_FULL_GROUP_BY',''));")
-            )
+    bootstrap.run(engine)
+    # magazyn (boto3 / katalog UPLOAD_DIR) przy starcie workera, nie przy imporcie
+    get_backend()
+
+
+@app.on_event("startup")
+async def _configure_threadpool() -> None:
+    # w trybie sync każde zapytanie zajmuje wątek -> tyle wątków, ile połączeń w puli
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
 
-    # Utwórz tabele
-    metadata.create_all(bind=engine)
+
+async def _watch_replicas() -> None:
+    # health check replik w tle; niedostępna/opóźniona -> odczyty idą na primary
+    while True:
+        await run_in_threadpool(database.check_replicas)
+        await asyncio.sleep(database.DB_REPLICA_CHECK_INTERVAL)
+
+
+_replica_watch: Optional[asyncio.Task] = None
+
+
+@app.on_event("startup")
+async def _start_replica_watch() -> None:
+    global _replica_watch
+    if database.replicas:
+        _replica_watch = asyncio.create_task(_watch_replicas())
+
+
+@app.on_event("shutdown")
+async def _shutdown() -> None:
+    if _replica_watch is not None:
+        _replica_watch.cancel()
+    thumbnails.shutdown()
+    auth.shutdown()
+    await database.dispose()
+
+
+# --- odczyty z replik (db.DB_REPLICA_URLS); po własnym zapisie -> primary
+RW_COOKIE = "tourismo_rw"
+
+
+async def get_read_db(request: Request):
+    sticky = False
+    if database.replicas:
+        try:
+            cookie_until = float(request.cookies.get(RW_COOKIE, ""))
+        except ValueError:
+            cookie_until = None
+        authorization = request.headers.get("authorization", "")
+        user_id = auth.verify_token(authorization[7:].strip()) if authorization[:7].lower() == "bearer " else None
+        sticky = database.is_sticky(user_id, cookie_until)
+    # strona z cache mogłaby być starsza niż własny zapis -> sticky omija cache
+    request.state.read_primary = sticky
+    async for db in database.get_read_db(sticky):
+        yield db
+
+
+def _remember_write(response: Response, user_id: Optional[int]) -> None:
+    until = database.mark_write(user_id)
+    if database.replicas:
+        # ciasteczko -> działa też, gdy kolejne żądanie trafi do innego workera
+        response.set_cookie(
+            RW_COOKIE, str(int(until)), max_age=int(database.DB_STICKY_SEC),
+            path="/api", httponly=True, samesite="lax",
+        )
 
 
 # --- endpointy
@@ -81,91 +194,732 @@ def health():
     return {"ok": True}
 
 
+@app.get("/api/metrics")
+def get_metrics() -> Response:
+    engines = {"sync": engine}
+    if database.async_engine is not None:
+        engines["async"] = database.async_engine.sync_engine
+    for replica in database.replicas:
+        engines[replica.name] = replica.engine
+        if replica.async_engine is not None:
+            engines[f"{replica.name}_async"] = replica.async_engine.sync_engine
+    return Response(
+        content=metrics_registry.render(engines),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
 @app.post("/api/register")
-def register(
+async def register(
+    response: Response,
     email: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db),
+    db: DBSession = Depends(get_db),
 ):
     # sprawdź czy istnieje
-    exists: Optional[tuple] = db.execute(
-        select(users.c.id).where(users.c.email == email)
+    exists: Optional[tuple] = (
+        await db.execute(select(users.c.id).where(users.c.email == email))
     ).fetchone()
     if exists:
         raise HTTPException(status_code=400, detail="Użytkownik o takim e-mailu już istnieje.")
-    db.execute(insert(users).values(email=email, password=generate_password_hash(password)))
-    db.commit()
+    pwhash = await hash_password(password)
+    await db.execute(insert(users).values(email=email, password=pwhash))
+    await db.commit()
+    _remember_write(response, None)
     return {"ok": True}
 
 
 @app.post("/api/login")
-def login(
+async def login(
     email: str = Form(...),
     password: str = Form(...),
-    db: Session = Depends(get_db),
+    db: DBSession = Depends(get_db),
 ):
-    row = db.execute(select(users).where(users.c.email == email)).first()
+    row = (await db.execute(select(users).where(users.c.email == email))).first()
     if not row:
         raise HTTPException(status_code=401, detail="Błędny e-mail lub hasło.")
-    # row to Row(users..., ) -> dostęp po kolumnach
-    if not check_password_hash(row.password, password):
+    # row to Row(users..., ) -> dostęp po kolumnach; hash w puli procesów auth
+    if not await verify_password(row.password, password):
         raise HTTPException(status_code=401, detail="Błędny e-mail lub hasło.")
-    return {"ok": True, "user_id": int(row.id), "email": row.email}
+    token = issue_token(int(row.id), row.email)
+    return {
+        "ok": True,
+        "user_id": int(row.id),
+        "email": row.email,
+        "token": token,
+        "expires_at": token_expiry(token),
+    }
 
 
 @app.post("/api/upload")
-def upload_post(
-    user_id: int = Form(...),
-    lat: Optional[float] = Form(None),
-    lon: Optional[float] = Form(None),
+async def upload_post(
+    response: Response,
+    lat: Optional[float] = Form(None, ge=-90, le=90),
+    lon: Optional[float] = Form(None, ge=-180, le=180),
     file: UploadFile = File(...),  # File zamiast Form dla uploadu
-    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None),
+    user: SessionUser = Depends(current_user),  # z podpisanego tokenu, bez SELECT na users
+    db: DBSession = Depends(get_db),
 ):
-    # Walidacja: czy user istnieje
-    if not db.execute(select(users.c.id).where(users.c.id == user_id)).first():
-        raise HTTPException(status_code=404, detail="Użytkownik nie istnieje.")
-
-    # Zapis pliku
-    filename = file.filename or "photo.jpg"
-    # Proste utwardzenie nazwy (uniknięcie ../)
-    safe_name = f"{user_id}_{os.path.basename(filename)}".replace("..", ".")
-    dest_path = os.path.join(UPLOAD_DIR, safe_name)
-    with open(dest_path, "wb") as buf:
-        shutil.copyfileobj(file.file, buf)
+    # Ponowienie już zapisanego uploadu -> ten sam post, bez zapisu pliku
+    key = _idempotency_key(idempotency_key)
+    existing = await _existing_keys(db, user.id, [key] if key else [])
+    if key in existing:
+        return _replayed(response, existing[key])
+
+    # Szybkie odrzucenie, gdy rozmiar znany z góry
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Plik jest zbyt duży.")
+
+    # Zapis pliku: strumieniowo, pod kluczem z hasha treści (duplikaty = 1 plik)
+    try:
+        stored = await run_in_threadpool(get_backend().put_stream, file.file, file.filename)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="Plik jest zbyt duży.")
 
     # Zapis wpisu
-    db.execute(
-        insert(posts).values(
-            user_id=user_id,
-            photo_path=safe_name,
-            lat=lat,
-            lon=lon,
+    replayed = await _create_posts(db, user, [(stored, lat, lon, key)])
+    if key in replayed:
+        return _replayed(response, replayed[key])
+    _remember_write(response, user.id)
+    return {"ok": True, "photo_url": photo_url(stored.key)}
+
+
+@app.post("/api/upload/batch")
+async def upload_batch(
+    response: Response,
+    files: List[UploadFile] = File(...),
+    # JSON: [{"lat": .., "lon": .., "key": ..}, ...] w kolejności plików;
+    # brak/null = bez pozycji; "key" = klucz idempotencji posta (opcjonalny)
+    meta: Optional[str] = Form(None),
+    user: SessionUser = Depends(current_user),
+    db: DBSession = Depends(get_db),
+):
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=413, detail=f"Maksymalnie {MAX_BATCH_FILES} plików naraz.")
+    try:
+        coords = json.loads(meta) if meta else []
+        if not isinstance(coords, list):
+            raise ValueError
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Nieprawidłowe pole meta.")
+
+    items = [
+        coords[index] if index < len(coords) and isinstance(coords[index], dict) else {}
+        for index in range(len(files))
+    ]
+    # posty już zapisane przy poprzedniej próbie: jedno zapytanie na cały batch
+    existing = await _existing_keys(
+        db, user.id, [item["key"] for item in items if _valid_client_key(item.get("key"))],
+    )
+
+    # pliki strumieniowo do magazynu; błąd jednego nie przerywa reszty.
+    # "status" odrzuconego pliku jak kod HTTP: 4xx = ponowienie nic nie da, 5xx = spróbuj później
+    results: List[dict] = []
+    by_key: Dict[str, dict] = {}
+    created: List[Tuple[StoredFile, Optional[float], Optional[float], Optional[str]]] = []
+    for index, (file, item) in enumerate(zip(files, items)):
+        key = item.get("key")
+        if key is not None:
+            if not _valid_client_key(key):
+                results.append({"index": index, "ok": False, "status": 400, "error": "Nieprawidłowy klucz idempotencji."})
+                continue
+            if key in by_key:
+                results.append({"index": index, "ok": False, "status": 400, "error": "Powtórzony klucz idempotencji."})
+                continue
+            if key in existing:
+                by_key[key] = {"index": index, "ok": True, "photo_url": photo_url(existing[key]), "replayed": True}
+                results.append(by_key[key])
+                continue
+        try:
+            lat = float(item["lat"]) if item.get("lat") is not None else None
+            lon = float(item["lon"]) if item.get("lon") is not None else None
+            if not valid_coordinates(lat, lon):
+                raise ValueError("coordinates out of range")
+            if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+                raise UploadTooLarge()
+            stored = await run_in_threadpool(get_backend().put_stream, file.file, file.filename)
+        except UploadTooLarge:
+            results.append({"index": index, "ok": False, "status": 413, "error": "Plik jest zbyt duży."})
+            continue
+        except (TypeError, ValueError):
+            results.append({"index": index, "ok": False, "status": 422, "error": "Nieprawidłowe współrzędne."})
+            continue
+        except OSError:
+            results.append({"index": index, "ok": False, "status": 503, "error": "Nie udało się zapisać pliku."})
+            continue
+        created.append((stored, lat, lon, key))
+        results.append({"index": index, "ok": True, "photo_url": photo_url(stored.key)})
+        if key is not None:
+            by_key[key] = results[-1]
+
+    if created:
+        for key, path in (await _create_posts(db, user, created)).items():
+            by_key[key].update(photo_url=photo_url(path), replayed=True)
+        _remember_write(response, user.id)
+    return {"ok": all(r["ok"] for r in results), "items": results}
+
+
+# --- upload bezpośredni: klient wysyła bajty do magazynu (S3: presigned PUT),
+# API tylko wydaje adres i zapisuje post -> przepustowość zdjęć poza procesem API
+
+@app.post("/api/upload/presign")
+async def presign_upload(
+    sha256: str = Form(..., min_length=64, max_length=64),
+    size: int = Form(..., gt=0),
+    filename: Optional[str] = Form(None),
+    user: SessionUser = Depends(current_user),
+):
+    sha256 = _check_sha256(sha256)
+    if size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Plik jest zbyt duży.")
+    key = key_for(sha256, normalize_ext(filename))
+    # ta sama treść już jest -> wystarczy commit
+    if await run_in_threadpool(get_backend().stat, key) is not None:
+        return {"key": key, "exists": True, "upload": None}
+    upload = await run_in_threadpool(get_backend().presign_upload, key, size, sha256, media_type_for(key))
+    return {"key": key, "exists": False, "upload": upload}
+
+
+def _check_sha256(value: str) -> str:
+    value = value.lower()
+    if any(c not in "0123456789abcdef" for c in value):
+        raise HTTPException(status_code=400, detail="Nieprawidłowy skrót SHA-256.")
+    return value
+
+
+@app.put("/api/upload/direct/{token}")
+async def upload_direct(token: str, request: Request):
+    # cel "presigned URL" magazynu lokalnego; token z presign_upload zamiast sesji
+    claims = auth.unsign_claims(token)
+    if not claims or claims.get("typ") != "upload" or not isinstance(get_backend(), LocalStorage):
+        raise HTTPException(status_code=403, detail="Link do wysłania wygasł lub jest nieprawidłowy.")
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) != claims["size"]:
+        raise HTTPException(status_code=400, detail="Rozmiar pliku nie zgadza się z deklaracją.")
+
+    # ciało żądania porcjami do bufora na dysku, potem zapis z weryfikacją hasha
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    try:
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > claims["size"]:
+                raise HTTPException(status_code=400, detail="Rozmiar pliku nie zgadza się z deklaracją.")
+            await run_in_threadpool(spool.write, chunk)
+        spool.seek(0)
+        try:
+            stored = await run_in_threadpool(
+                get_backend().put_stream, spool, claims["key"], claims["size"], claims["sha256"],
+            )
+        except ChecksumMismatch:
+            raise HTTPException(status_code=400, detail="Treść nie zgadza się z sumą SHA-256.")
+    finally:
+        spool.close()
+    return Response(status_code=200, headers={"ETag": f'"{stored.sha256}"'})
+
+
+@app.post("/api/upload/commit")
+async def upload_commit(
+    response: Response,
+    key: str = Form(...),
+    lat: Optional[float] = Form(None, ge=-90, le=90),
+    lon: Optional[float] = Form(None, ge=-180, le=180),
+    idempotency_key: Optional[str] = Header(None),
+    user: SessionUser = Depends(current_user),
+    db: DBSession = Depends(get_db),
+):
+    client_key = _idempotency_key(idempotency_key)
+    existing = await _existing_keys(db, user.id, [client_key] if client_key else [])
+    if client_key in existing:
+        return _replayed(response, existing[client_key])
+    # tylko klucze adresowane treścią - klient nie wskaże cudzej nazwy pliku
+    digest = content_hash(key)
+    if digest is None:
+        raise HTTPException(status_code=400, detail="Nieprawidłowy klucz zdjęcia.")
+    info = await run_in_threadpool(get_backend().stat, key)
+    if info is None:
+        raise HTTPException(status_code=409, detail="Plik nie został jeszcze wysłany.")
+    stored = StoredFile(key=key, sha256=digest, size=info.size, created=True)
+    replayed = await _create_posts(db, user, [(stored, lat, lon, client_key)])
+    if client_key in replayed:
+        return _replayed(response, replayed[client_key])
+    _remember_write(response, user.id)
+    return {"ok": True, "photo_url": photo_url(key)}
+
+
+# --- upload wznawialny (resumable.py): init -> PATCH porcjami z Upload-Offset -> finalize;
+# po zerwaniu klient pyta o offset (GET) i wysyła dalej, zamiast zaczynać od zera
+
+@app.post("/api/upload/resumable")
+async def resumable_init(
+    size: int = Form(..., gt=0),
+    filename: Optional[str] = Form(None),
+    # opcjonalnie: finalize sprawdzi treść złożoną z porcji
+    sha256: Optional[str] = Form(None, min_length=64, max_length=64),
+    user: SessionUser = Depends(current_user),
+):
+    if size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Plik jest zbyt duży.")
+    if sha256 is not None:
+        sha256 = _check_sha256(sha256)
+    await run_in_threadpool(resumable.maybe_purge)
+    return {
+        "upload_id": resumable.create(user.id, size, filename, sha256),
+        "offset": 0,
+        "size": size,
+        "chunk_size": resumable.RESUMABLE_CHUNK_SIZE,
+    }
+
+
+def _resumable_claims(upload_id: str, user: SessionUser) -> dict:
+    claims = resumable.claims_for(upload_id, user.id)
+    if claims is None:
+        raise HTTPException(status_code=404, detail="Upload nie istnieje lub wygasł.")
+    return claims
+
+
+def _offset_response(offset: int, size: int, status_code: int = 200, detail: Optional[str] = None) -> Response:
+    content = {"offset": offset, "size": size}
+    if detail is not None:
+        content["detail"] = detail
+    return ORJSONResponse(
+        content, status_code=status_code,
+        headers={"Upload-Offset": str(offset), "Cache-Control": "no-store"},
+    )
+
+
+@app.get("/api/upload/resumable/{upload_id}")
+async def resumable_status(upload_id: str, user: SessionUser = Depends(current_user)):
+    claims = _resumable_claims(upload_id, user)
+    return _offset_response(await run_in_threadpool(resumable.offset, claims), claims["size"])
+
+
+@app.patch("/api/upload/resumable/{upload_id}")
+async def resumable_append(upload_id: str, request: Request, user: SessionUser = Depends(current_user)):
+    claims = _resumable_claims(upload_id, user)
+    raw = request.headers.get("upload-offset", "")
+    if not raw.isdigit():
+        raise HTTPException(status_code=400, detail="Brak lub nieprawidłowy nagłówek Upload-Offset.")
+    offset = int(raw)
+    try:
+        f = await run_in_threadpool(resumable.open_append, claims, offset)
+    except resumable.OffsetMismatch as e:
+        return _offset_response(e.offset, claims["size"], 409, "Offset nie zgadza się ze stanem uploadu.")
+    except resumable.UploadBusy:
+        raise HTTPException(
+            status_code=409, detail="Upload jest właśnie zapisywany, spróbuj za chwilę.",
+            headers={"Retry-After": "1"},
+        )
+
+    # to, co dotarło przed zerwaniem połączenia, zostaje na dysku
+    try:
+        async for chunk in request.stream():
+            if offset + len(chunk) > claims["size"]:
+                raise HTTPException(status_code=413, detail="Porcja wykracza poza zadeklarowany rozmiar.")
+            await run_in_threadpool(f.write, chunk)
+            offset += len(chunk)
+    finally:
+        await run_in_threadpool(f.close)
+    return _offset_response(offset, claims["size"])
+
+
+@app.post("/api/upload/resumable/{upload_id}/finalize")
+async def resumable_finalize(
+    response: Response,
+    upload_id: str,
+    lat: Optional[float] = Form(None, ge=-90, le=90),
+    lon: Optional[float] = Form(None, ge=-180, le=180),
+    idempotency_key: Optional[str] = Header(None),
+    user: SessionUser = Depends(current_user),
+    db: DBSession = Depends(get_db),
+):
+    claims = _resumable_claims(upload_id, user)
+    # ponowiony finalize (odpowiedź zginęła) -> plik częściowy już usunięty, post jest
+    key = _idempotency_key(idempotency_key)
+    existing = await _existing_keys(db, user.id, [key] if key else [])
+    if key in existing:
+        return _replayed(response, existing[key])
+    f = await run_in_threadpool(resumable.open_complete, claims)
+    if f is None:
+        offset = await run_in_threadpool(resumable.offset, claims)
+        return _offset_response(offset, claims["size"], 409, "Upload nie jest jeszcze kompletny.")
+    try:
+        stored = await run_in_threadpool(
+            get_backend().put_stream, f, f"upload{claims['ext']}", MAX_UPLOAD_BYTES, claims["sha256"],
         )
+    except ChecksumMismatch:
+        await run_in_threadpool(resumable.discard, claims)
+        raise HTTPException(status_code=400, detail="Treść nie zgadza się z sumą SHA-256.")
+    finally:
+        f.close()
+
+    replayed = await _create_posts(db, user, [(stored, lat, lon, key)])
+    await run_in_threadpool(resumable.discard, claims)
+    if key in replayed:
+        return _replayed(response, replayed[key])
+    _remember_write(response, user.id)
+    return {"ok": True, "photo_url": photo_url(stored.key)}
+
+
+def photo_url(key: str) -> str:
+    return f"/api/photos/{key}"
+
+
+async def _author_of(db: DBSession, user: SessionUser) -> str:
+    # e-mail jest w tokenie; SELECT tylko dla starszych tokenów bez niego
+    if user.email:
+        return user.email
+    email = (await db.execute(select(users.c.email).where(users.c.id == user.id))).scalar_one_or_none()
+    if email is None:
+        raise HTTPException(status_code=401, detail="Sesja wygasła lub jest nieprawidłowa.")
+    return email
+
+
+# --- idempotencja: klient (outbox w aplikacji) nadaje każdemu postowi klucz;
+# ponowienie po zerwanym połączeniu zwraca zapisany post zamiast duplikatu
+_CLIENT_KEY_CHARS = frozenset(string.ascii_letters + string.digits + "-_")
+
+
+def _valid_client_key(value) -> bool:
+    return isinstance(value, str) and 1 <= len(value) <= 64 and set(value) <= _CLIENT_KEY_CHARS
+
+
+def _idempotency_key(value: Optional[str]) -> Optional[str]:
+    if value is not None and not _valid_client_key(value):
+        raise HTTPException(status_code=400, detail="Nieprawidłowy klucz idempotencji.")
+    return value
+
+
+async def _existing_keys(db: DBSession, user_id: int, keys: List[str]) -> Dict[str, str]:
+    """{client_key: photo_path} postów użytkownika już zapisanych z tymi kluczami."""
+    if not keys:
+        return {}
+    rows = await db.execute(
+        select(posts.c.client_key, posts.c.photo_path)
+        .where(posts.c.user_id == user_id)
+        .where(posts.c.client_key.in_(keys))
     )
-    db.commit()
-    return {"ok": True, "photo_url": f"/uploads/{safe_name}"}
+    return {row.client_key: row.photo_path for row in rows}
+
+
+def _replayed(response: Response, path: str) -> dict:
+    response.headers["Idempotent-Replayed"] = "true"
+    return {"ok": True, "photo_url": photo_url(path)}
+
+
+async def _create_posts(
+    db: DBSession,
+    user: SessionUser,
+    items: List[Tuple[StoredFile, Optional[float], Optional[float], Optional[str]]],
+) -> Dict[str, str]:
+    """
+    Zapisuje posty (+ agregaty mapy, zadania workera) jednym commitem.
+    Zwraca {client_key: photo_path} pozycji pominiętych, bo równoległe
+    żądanie z tym samym kluczem zapisało je pierwsze.
+    """
+    author = await _author_of(db, user)
+    keys = [key for _, _, _, key in items if key]
+    replayed: Dict[str, str] = {}
+    for attempt in range(2):
+        fresh = [item for item in items if not (item[3] and item[3] in replayed)]
+        if not fresh:
+            return replayed
+        rows = [_post_values(user.id, author, stored, lat, lon, key) for stored, lat, lon, key in fresh]
+        try:
+            # wszystkie wpisy jednym executemany i jednym commitem
+            await db.execute(insert(posts), rows)
+            await _update_map_cells(db, rows)
+            # wymiary, placeholder, EXIF -> worker w tle (ta sama transakcja co post)
+            await db.execute(insert(jobs), [job_values(ENRICH, stored.key) for stored, _, _, _ in fresh])
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            if attempt or not keys:
+                raise
+            # wyścig dwóch ponowień z tym samym kluczem (ux_posts_user_client_key)
+            replayed = await _existing_keys(db, user.id, keys)
+            continue
+        _posts_committed([stored for stored, _, _, _ in fresh])
+        return replayed
+    return replayed
+
+
+def _post_values(
+    user_id: int, author: str, stored: StoredFile, lat: Optional[float], lon: Optional[float],
+    client_key: Optional[str] = None,
+) -> dict:
+    return {
+        "user_id": user_id,
+        "author": author,
+        "photo_path": stored.key,
+        "lat": lat,
+        "lon": lon,
+        "geohash": geohash_or_none(lat, lon),
+        "client_key": client_key,
+    }
+
+
+async def _update_map_cells(db: DBSession, rows: List[dict]) -> None:
+    # agregaty klastrów w tej samej transakcji co posty
+    deltas = clusters.cell_deltas((r["geohash"], r["lat"], r["lon"]) for r in rows)
+    if deltas:
+        await db.execute(clusters.upsert_statement(engine.dialect.name), deltas)
+
+
+def _posts_committed(stored_files: List[StoredFile]) -> None:
+    feed_cache.invalidate()
+    # Miniatury w tle (pula procesów); nowy plik -> od razu rozgrzej cache
+    for stored in stored_files:
+        if stored.created:
+            thumbnails.schedule(THUMB_DIR, stored.key)
+
+
+# kolumny listy postów - wszystko z jednej tabeli (author zdenormalizowany)
+POST_COLUMNS = (
+    posts.c.id, posts.c.author, posts.c.photo_path, posts.c.lat, posts.c.lon, posts.c.created_at,
+    posts.c.width, posts.c.height, posts.c.placeholder, posts.c.taken_at,
+)
+
+
+def _post_item(row) -> dict:
+    return {
+        "id": int(row["id"]),
+        "user": row["author"],
+        "photo": row["photo_path"],
+        "photo_url": photo_url(row["photo_path"]),
+        # "/api/thumbs/{size}/{format}/<klucz>?v=N" - rozmiar i format wybiera klient
+        "thumb": thumb_url_template(row["photo_path"]),
+        "lat": row["lat"],
+        "lon": row["lon"],
+        "created_at": row["created_at"],  # orjson -> ISO 8601
+        # null, dopóki worker (jobs.py) nie przetworzy zdjęcia
+        "width": row["width"],
+        "height": row["height"],
+        "placeholder": row["placeholder"],
+        "taken_at": row["taken_at"],
+    }
+
+
+async def _feed_page(
+    db: DBSession, cursor: Optional[str], limit: int, user_id: Optional[int] = None,
+) -> dict:
+    # keyset po (created_at, id) -> koszt strony N taki sam jak strony 1;
+    # z user_id ten sam keyset po ix_posts_user_created_id
+    stmt = (
+        select(*POST_COLUMNS)
+        .order_by(posts.c.created_at.desc(), posts.c.id.desc())
+        .limit(limit + 1)  # +1 -> wiemy, czy jest następna strona
+    )
+    if user_id is not None:
+        stmt = stmt.where(posts.c.user_id == user_id)
+    try:
+        before = keyset_before(posts.c.created_at, posts.c.id, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Nieprawidłowy kursor.")
+    if before is not None:
+        stmt = stmt.where(before)
+
+    rows = (await db.execute(stmt)).mappings().all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    next_cursor: Optional[str] = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(last["created_at"], last["id"])
+    return {"items": [_post_item(row) for row in rows], "next_cursor": next_cursor}
+
+
+async def _cached_page(request: Request, key: tuple, produce) -> Response:
+    # trafienie w cache -> sesja nie pobiera połączenia, zero zapytań do DB
+    entry = None if getattr(request.state, "read_primary", False) else feed_cache.get(key)
+    if entry is None:
+        generation = feed_cache.generation()
+        payload = await produce()
+        entry = feed_cache.put(key, orjson.dumps(payload), generation)
+
+    # wariant skompresowany liczony raz na wpis cache, nie na każde żądanie
+    headers = entry.headers
+    headers["Vary"] = "Accept-Encoding"
+    body = entry.body
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+    if encoding is not None and len(body) >= COMPRESS_MIN_BYTES:
+        body = entry.encoded(encoding)
+        headers["Content-Encoding"] = encoding
+        headers["ETag"] = "W/" + entry.etag
+
+    if is_not_modified(
+        entry,
+        request.headers.get("if-none-match"),
+        request.headers.get("if-modified-since"),
+    ):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.get("/api/feed")
-def get_feed(db: Session = Depends(get_db)) -> List[dict]:
-    # proste JOIN + sort DESC
-    result: Result = db.execute(
-        text("""
-            SELECT p.id, p.photo_path, p.lat, p.lon, p.created_at, u.email
-            FROM posts p
-            JOIN users u ON u.id = p.user_id
-            ORDER BY p.created_at DESC
-            LIMIT 100
-        """)
+async def get_feed(
+    request: Request,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(FEED_PAGE_SIZE, ge=1, le=FEED_MAX_PAGE_SIZE),
+    db: DBSession = Depends(get_read_db),
+) -> Response:
+    return await _cached_page(request, ("feed", cursor, limit), lambda: _feed_page(db, cursor, limit))
+
+
+@app.get("/api/users/{user_id}/posts")
+async def get_user_posts(
+    request: Request,
+    user_id: int,
+    cursor: Optional[str] = Query(None),
+    limit: int = Query(FEED_PAGE_SIZE, ge=1, le=FEED_MAX_PAGE_SIZE),
+    db: DBSession = Depends(get_read_db),
+) -> Response:
+    # ta sama pamięć podręczna co feed (czyszczona po każdym uploadzie)
+    return await _cached_page(
+        request, ("user", user_id, cursor, limit), lambda: _feed_page(db, cursor, limit, user_id),
+    )
+
+
+@app.get("/api/posts/nearby")
+async def get_nearby(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(5.0, gt=0, le=NEARBY_MAX_RADIUS_KM),
+    limit: int = Query(FEED_PAGE_SIZE, ge=1, le=FEED_MAX_PAGE_SIZE),
+    db: DBSession = Depends(get_read_db),
+) -> Response:
+    south, west, north, east = bounding_box(lat, lon, radius_km)
+
+    # 1) komórki geohash pokrywające bbox -> przedziały na ix_posts_geohash
+    cells = []
+    for lo, hi in cover_bbox(south, west, north, east):
+        cond = posts.c.geohash >= lo
+        if hi is not None:
+            cond = and_(cond, posts.c.geohash < hi)
+        cells.append(cond)
+
+    # 2) dokładny bbox; przez południk 180° długości z drugiej strony
+    #    przesunięte o 360°, żeby ranking widział je blisko, a nie ~359° dalej
+    filters = [or_(*cells), posts.c.lat.between(south, north)]
+    if west < -180.0:
+        filters.append(or_(posts.c.lon >= west + 360.0, posts.c.lon <= east))
+        post_lon = case((posts.c.lon > 0, posts.c.lon - 360.0), else_=posts.c.lon)
+    elif east > 180.0:
+        filters.append(or_(posts.c.lon <= east - 360.0, posts.c.lon >= west))
+        post_lon = case((posts.c.lon < 0, posts.c.lon + 360.0), else_=posts.c.lon)
+    else:
+        filters.append(posts.c.lon.between(west, east))
+        post_lon = posts.c.lon
+
+    # 3) wstępny ranking przybliżeniem równoodległościowym (sama arytmetyka ->
+    #    działa tak samo na MySQL, PostgreSQL i SQLite), potem dokładny haversine
+    k = math.cos(math.radians(lat))
+    approx = (posts.c.lat - lat) * (posts.c.lat - lat) \
+        + (post_lon - lon) * (post_lon - lon) * (k * k)
+    stmt = (
+        select(*POST_COLUMNS)
+        .where(*filters)
+        .order_by(approx)
+        .limit(limit * NEARBY_CANDIDATE_FACTOR)
     )
+
+    ranked = []
+    for row in (await db.execute(stmt)).mappings():
+        dist = haversine_km(lat, lon, row["lat"], row["lon"])
+        if dist <= radius_km:
+            ranked.append((dist, row))
+    ranked.sort(key=lambda pair: pair[0])
+
     items: List[dict] = []
-    for row in result.mappings():
-        items.append({
-            "id": int(row["id"]),
-            "user": row["email"],
-            "photo": row["photo_path"],
-            "lat": row["lat"],
-            "lon": row["lon"],
-            "created_at": str(row["created_at"]),
-        })
-    return items
+    for dist, row in ranked[:limit]:
+        item = _post_item(row)
+        item["distance_km"] = round(dist, 3)
+        items.append(item)
+    return ORJSONResponse({"items": items})
+
+
+@app.get("/api/map/clusters")
+async def get_map_clusters(
+    bbox: str = Query(..., description="west,south,east,north"),
+    zoom: int = Query(..., ge=0, le=clusters.MAP_MAX_ZOOM),
+    db: DBSession = Depends(get_read_db),
+) -> Response:
+    try:
+        west, south, east, north = (float(v) for v in bbox.split(","))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Nieprawidłowy bbox.")
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise HTTPException(status_code=400, detail="Nieprawidłowy bbox.")
+
+    # bbox przez południk 180° -> dwa zakresy
+    boxes = [(south, west, north, east)] if west <= east else [
+        (south, west, north, 180.0), (south, -180.0, north, east),
+    ]
+    level = min(clusters.level_for_view(zoom, *box) for box in boxes)
+    items: List[dict] = []
+    for box in boxes:
+        rows = (await db.execute(clusters.clusters_query(level, *box))).mappings()
+        items.extend(clusters.cluster_item(row) for row in rows)
+    return ORJSONResponse({"zoom": zoom, "level": level, "clusters": items})
+
+
+@app.api_route("/api/photos/{key:path}", methods=["GET", "HEAD"])
+def get_photo(key: str, request: Request) -> Response:
+    try:
+        check_key(key)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Zdjęcie nie istnieje.")
+    # S3: przekierowanie na presigned GET -> bajty nie przechodzą przez API
+    url = get_backend().presign_download(key)
+    if url is not None:
+        return RedirectResponse(url, status_code=307, headers={"Cache-Control": "private, max-age=300"})
+
+    # URL = hash treści -> niezmienny; cache klienta/CDN na rok, Range dla wznowień
+    info = get_backend().stat(key)
+    if info is None:
+        raise HTTPException(status_code=404, detail="Zdjęcie nie istnieje.")
+    etag, cache_control = original_headers(key, info)
+    return send_object(
+        request, info.size, lambda start, length: get_backend().iter_range(key, start, length),
+        media_type_for(key), etag, cache_control,
+    )
+
+
+@app.api_route("/api/thumbs/{size}/{rest:path}", methods=["GET", "HEAD"])
+async def get_thumb(size: str, rest: str, request: Request) -> Response:
+    # /api/thumbs/{size}/{fmt}/{key} albo /api/thumbs/{size}/{key} (format wg Accept)
+    fmt, _, key = rest.partition("/")
+    vary = None
+    if fmt not in THUMB_FORMATS:
+        fmt, key = negotiate_format(request.headers.get("accept"), tuple(THUMB_FORMATS)), rest
+        vary = "Accept"
+    if size not in THUMB_SIZES:
+        raise HTTPException(status_code=404, detail="Nieznany rozmiar lub format.")
+
+    # klucz względny bez ../ -> ścieżka pochodnej zostaje w THUMB_DIR
+    try:
+        check_key(key)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Zdjęcie nie istnieje.")
+
+    dest = os.path.join(THUMB_DIR, derivative_rel_path(key, size, fmt))
+    if not os.path.exists(dest):
+        if await run_in_threadpool(get_backend().stat, key) is None:
+            raise HTTPException(status_code=404, detail="Zdjęcie nie istnieje.")
+        # generowanie w puli procesów; pętla zdarzeń nie jest blokowana
+        try:
+            await asyncio.wrap_future(thumbnails.schedule(THUMB_DIR, key))
+        except Exception:
+            raise HTTPException(status_code=415, detail="Nie można przetworzyć zdjęcia.")
+
+    # pochodna zależy tylko od treści oryginału i THUMB_VERSION
+    stem = content_hash(key) or os.path.splitext(key)[0].replace("/", "_")
+    etag = f'"{stem}-{size}-{fmt}-v{THUMB_VERSION}"'
+    cache_control = IMMUTABLE if content_hash(key) else REVALIDATE
+    return send_file(
+        request, dest, "image/webp" if fmt == "webp" else "image/jpeg", etag, cache_control, vary,
+    )
+
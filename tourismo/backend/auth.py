@@ -0,0 +1,145 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+# --- konfiguracja
+SESSION_SECRET = os.getenv("SESSION_SECRET", "")
+SESSION_TTL_SEC = int(os.getenv("SESSION_TTL_SEC", str(7 * 24 * 3600)))
+# koszt haszowania w formacie werkzeug, np. "scrypt:32768:8:1" albo "pbkdf2:sha256:600000"
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", "2"))
+
+if not SESSION_SECRET:
+    # losowy klucz per proces = tokeny (sesje, upload_id, presign) ważne tylko
+    # w jednym workerze i do restartu -> lepiej nie wystartować wcale
+    raise RuntimeError("SESSION_SECRET is required (the same value for every worker and restart)")
+_KEY = SESSION_SECRET.encode("utf-8")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+# --- tokeny sesji: base64url(payload).base64url(HMAC-SHA256), weryfikacja bez DB
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def sign_claims(claims: dict) -> str:
+    """Podpisany token z dowolnymi claims (muszą zawierać "exp")."""
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    sig = hmac.new(_KEY, payload.encode("ascii"), hashlib.sha256).digest()
+    return f"{payload}.{_b64encode(sig)}"
+
+
+def unsign_claims(token: str) -> Optional[dict]:
+    """Claims z tokenu albo None (zły podpis, uszkodzony token, wygasł)."""
+    try:
+        payload, sig = token.split(".", 1)
+        expected = hmac.new(_KEY, payload.encode("ascii"), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64decode(sig)):
+            return None
+        data = json.loads(_b64decode(payload))
+        if int(data["exp"]) < time.time():
+            return None
+        return data
+    except Exception:
+        return None
+
+
+def issue_token(user_id: int, email: Optional[str] = None, ttl: int = SESSION_TTL_SEC) -> str:
+    claims = {"uid": int(user_id), "exp": int(time.time()) + ttl}
+    if email:
+        # nazwa autora w tokenie -> zapis posta bez SELECT na users
+        claims["email"] = email
+    return sign_claims(claims)
+
+
+def decode_token(token: str) -> Optional[dict]:
+    """Claims tokenu sesji albo None; tokeny innego typu (np. uploadu) są odrzucane."""
+    data = unsign_claims(token)
+    if data is None or "typ" in data:
+        return None
+    try:
+        data["uid"] = int(data["uid"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return data
+
+
+def verify_token(token: str) -> Optional[int]:
+    """Zwraca user_id albo None."""
+    data = decode_token(token)
+    return data["uid"] if data else None
+
+
+def token_expiry(token: str) -> int:
+    return int(json.loads(_b64decode(token.split(".", 1)[0]))["exp"])
+
+
+@dataclass(frozen=True)
+class SessionUser:
+    id: int
+    # None dla tokenów wydanych przed dodaniem e-maila do claims
+    email: Optional[str] = None
+
+
+async def current_user(authorization: Optional[str] = Header(None)) -> SessionUser:
+    """Dependency: użytkownik z nagłówka "Authorization: Bearer <token>"."""
+    data: Optional[dict] = None
+    if authorization and authorization.lower().startswith("bearer "):
+        data = decode_token(authorization[7:].strip())
+    if data is None:
+        raise HTTPException(
+            status_code=401,
+            detail="Sesja wygasła lub jest nieprawidłowa.",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return SessionUser(id=data["uid"], email=data.get("email"))
+
+
+# --- hasła: osobna, ograniczona pula procesów -> seria logowań nie zajmuje
+# wątków obsługujących feed ani nie blokuje GIL w procesie API
+def _hash(password: str, method: str) -> str:
+    from werkzeug.security import generate_password_hash
+    return generate_password_hash(password, method=method)
+
+
+def _check(pwhash: str, password: str) -> bool:
+    from werkzeug.security import check_password_hash
+    return check_password_hash(pwhash, password)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=AUTH_WORKERS)
+    return _pool
+
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), _hash, password, PASSWORD_HASH_METHOD)
+
+
+async def verify_password(pwhash: str, password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_pool(), _check, pwhash, password)
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
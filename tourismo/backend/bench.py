@@ -0,0 +1,307 @@
+"""
+Benchmark / test obciążeniowy backendu.
+
+Uruchamia `app` w tym samym procesie (httpx + ASGITransport, bez sieci) na
+jednorazowej bazie SQLite albo na wskazanym DATABASE_URL, zasiewa dane
+o zadanym rozmiarze i mierzy scenariusze przy stałej współbieżności.
+Wynik (przepustowość, p50/p95/p99) trafia na stdout lub do --out jako JSON,
+żeby dało się porównywać przebiegi przed wdrożeniem.
+
+    pip install -r requirements.txt -r requirements-bench.txt
+    python bench.py --users 10000 --posts 1000000 --concurrency 32 --out run.json
+    python bench.py --url http://localhost:8000 --scenarios feed,nearby   # zdalnie
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+SCENARIOS = ("feed", "feed_deep", "user_posts", "nearby", "login", "upload")
+BENCH_PASSWORD = "bench-password"
+# obszar zasiewu: Tatry i okolice
+REGION = (49.0, 19.5, 49.6, 20.5)  # south, west, north, east
+SEED_BATCH = 10000
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--users", type=int, default=1000)
+    p.add_argument("--posts", type=int, default=100000)
+    p.add_argument("--db", default=None, help="DATABASE_URL; domyślnie nowy plik SQLite w katalogu tymczasowym")
+    p.add_argument("--reuse", action="store_true", help="nie zasiewaj, jeśli baza ma już dane")
+    p.add_argument(
+        "--url", default=None,
+        help="testuj działający serwer zamiast aplikacji w procesie "
+             "(upload wymaga tego samego SESSION_SECRET co serwer)",
+    )
+    p.add_argument("--scenarios", default=",".join(SCENARIOS))
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--requests", type=int, default=2000, help="liczba żądań na scenariusz")
+    p.add_argument("--warmup", type=int, default=50, help="żądania rozgrzewkowe (poza pomiarem)")
+    p.add_argument("--seed", type=int, default=42)
+    p.add_argument("--out", default=None, help="plik JSON z wynikami (domyślnie stdout)")
+    return p.parse_args(argv)
+
+
+def configure_env(args: argparse.Namespace) -> None:
+    """
+    Musi się wykonać przed importem app/db - konfiguracja czytana jest przy imporcie.
+    DATABASE_URL i UPLOAD_DIR są nadpisywane celowo: benchmark nie może
+    przypadkiem zasiać danych do bazy z odziedziczonego środowiska.
+    """
+    workdir = tempfile.mkdtemp(prefix="tourismo-bench-")
+    os.environ["DATABASE_URL"] = args.db or f"sqlite:///{workdir}/bench.db"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ["UPLOAD_DIR"] = os.path.join(workdir, "uploads")
+    os.environ["UPLOAD_TMP_DIR"] = os.path.join(workdir, "upload_tmp")
+    os.environ["RESUMABLE_DIR"] = os.path.join(workdir, "upload_partial")
+    os.environ.pop("THUMB_DIR", None)
+    os.environ.setdefault("SESSION_SECRET", "bench-secret")
+    # wszystkie żądania idą od jednego klienta -> limity per użytkownik/IP
+    # zafałszowałyby pomiar; limity współbieżności zostają
+    os.environ.setdefault("UPLOAD_RATE", "")
+    os.environ.setdefault("AUTH_RATE", "")
+
+
+# --- zasiew danych
+
+def seed(n_users: int, n_posts: int, rng: random.Random, reuse: bool) -> None:
+    from sqlalchemy import func, insert, select
+
+    from auth import _hash, PASSWORD_HASH_METHOD
+    from db import engine
+    from geo import encode_geohash
+    from models import posts, users
+    from schema import ensure_schema
+
+    ensure_schema(engine)
+    with engine.connect() as conn:
+        have_users = conn.execute(select(func.count()).select_from(users)).scalar_one()
+        have_posts = conn.execute(select(func.count()).select_from(posts)).scalar_one()
+    if reuse and have_users and have_posts:
+        print(f"[bench] reuse: {have_users} users, {have_posts} posts", file=sys.stderr)
+        return
+
+    t0 = time.perf_counter()
+    # jeden hash dla wszystkich - haszowanie 10k haseł to minuty samego scrypt
+    pwhash = _hash(BENCH_PASSWORD, PASSWORD_HASH_METHOD)
+    with engine.begin() as conn:
+        for start in range(have_users, n_users, SEED_BATCH):
+            conn.execute(insert(users), [
+                {"email": f"user{i}@bench.local", "password": pwhash}
+                for i in range(start, min(n_users, start + SEED_BATCH))
+            ])
+        min_user, max_user = conn.execute(select(func.min(users.c.id), func.max(users.c.id))).one()
+
+    south, west, north, east = REGION
+    now = datetime.utcnow().replace(microsecond=0)
+    for start in range(have_posts, n_posts, SEED_BATCH):
+        rows = []
+        for i in range(start, min(n_posts, start + SEED_BATCH)):
+            lat = rng.uniform(south, north)
+            lon = rng.uniform(west, east)
+            user_id = rng.randint(min_user, max_user)
+            rows.append({
+                "user_id": user_id,
+                "author": f"user{user_id - min_user}@bench.local",
+                "photo_path": f"{i % 256:02x}/{i // 256 % 256:02x}/{i:064x}.jpg",
+                "lat": lat,
+                "lon": lon,
+                "geohash": encode_geohash(lat, lon),
+                # kilka postów na sekundę -> realistyczne remisy created_at
+                "created_at": now - timedelta(seconds=(n_posts - i) // 3),
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(posts), rows)
+    print(
+        f"[bench] seeded {n_users} users / {n_posts} posts in {time.perf_counter() - t0:.1f}s",
+        file=sys.stderr,
+    )
+
+
+# --- scenariusze: każdy zwraca fabrykę kolejnych żądań (metoda, ścieżka, kwargs)
+
+def _jpeg_bytes(rng: random.Random) -> bytes:
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", (1600, 1200), tuple(rng.randrange(256) for _ in range(3))).save(buf, "JPEG", quality=85)
+    return buf.getvalue()
+
+
+def build_scenarios(names: List[str], n_users: int, rng: random.Random) -> Dict[str, Callable[[], tuple]]:
+    from auth import issue_token
+    from pagination import encode_cursor
+
+    south, west, north, east = REGION
+    now = datetime.utcnow().replace(microsecond=0)
+    factories: Dict[str, Callable[[], tuple]] = {}
+
+    if "feed" in names:
+        factories["feed"] = lambda: ("GET", "/api/feed", {})
+    if "feed_deep" in names:
+        def _deep():
+            # losowa głęboka strona -> koszt strony N i brak trafień w cache
+            cursor = encode_cursor(now - timedelta(seconds=rng.randint(60, 3600 * 24 * 90)), 2 ** 31 - 1)
+            return "GET", "/api/feed", {"params": {"cursor": cursor}}
+        factories["feed_deep"] = _deep
+    if "user_posts" in names:
+        factories["user_posts"] = lambda: ("GET", f"/api/users/{rng.randint(1, n_users)}/posts", {})
+    if "nearby" in names:
+        factories["nearby"] = lambda: ("GET", "/api/posts/nearby", {"params": {
+            "lat": rng.uniform(south, north), "lon": rng.uniform(west, east), "radius_km": 5,
+        }})
+    if "login" in names:
+        factories["login"] = lambda: ("POST", "/api/login", {"data": {
+            "email": f"user{rng.randrange(n_users)}@bench.local", "password": BENCH_PASSWORD,
+        }})
+    if "upload" in names:
+        photo = _jpeg_bytes(rng)
+
+        def _upload():
+            # dopisany losowy ogon -> inny hash, brak deduplikacji
+            body = photo + os.urandom(16)
+            uid = rng.randint(1, n_users)
+            token = issue_token(uid, f"user{uid - 1}@bench.local")
+            return "POST", "/api/upload", {
+                "data": {"lat": rng.uniform(south, north), "lon": rng.uniform(west, east)},
+                "files": {"file": ("bench.jpg", body, "image/jpeg")},
+                "headers": {"Authorization": f"Bearer {token}"},
+            }
+        factories["upload"] = _upload
+    return factories
+
+
+# --- pomiar
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # nearest-rank
+    idx = min(len(sorted_values) - 1, max(0, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[idx]
+
+
+async def run_scenario(client, make_request: Callable[[], tuple], total: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    remaining = total
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, path, kwargs = make_request()
+            start = time.perf_counter()
+            try:
+                resp = await client.request(method, path, **kwargs)
+                code = str(resp.status_code)
+                if resp.status_code >= 400:
+                    errors += 1
+            except Exception as e:
+                code = type(e).__name__
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    wall = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - wall
+
+    latencies.sort()
+
+    def ms(seconds: float) -> float:
+        return round(seconds * 1000, 3)
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(latencies, 0.50)),
+            "p95": ms(percentile(latencies, 0.95)),
+            "p99": ms(percentile(latencies, 0.99)),
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+            "max": ms(latencies[-1]) if latencies else 0.0,
+        },
+        "status": statuses,
+    }
+
+
+async def main_async(args: argparse.Namespace) -> dict:
+    import httpx
+
+    rng = random.Random(args.seed)
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    if args.url:
+        factories = build_scenarios(names, args.users, rng)
+        client_ctx = httpx.AsyncClient(base_url=args.url, timeout=60)
+        lifespan = None
+    else:
+        seed(args.users, args.posts, rng, args.reuse)
+        from app import app
+        factories = build_scenarios(names, args.users, rng)
+        limits = httpx.Limits(max_connections=args.concurrency)
+        client_ctx = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60, limits=limits,
+        )
+        lifespan = app.router.lifespan_context(app)
+
+    results: Dict[str, dict] = {}
+    if lifespan is not None:
+        await lifespan.__aenter__()
+    try:
+        async with client_ctx as client:
+            for name, make_request in factories.items():
+                if args.warmup:
+                    await run_scenario(client, make_request, args.warmup, args.concurrency)
+                results[name] = await run_scenario(client, make_request, args.requests, args.concurrency)
+                print(f"[bench] {name}: {json.dumps(results[name])}", file=sys.stderr)
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    return {
+        "config": {
+            "users": args.users,
+            "posts": args.posts,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "target": args.url or "in-process",
+            "database": None if args.url else os.environ["DATABASE_URL"].split("://", 1)[0],
+            "db_async": os.getenv("DB_ASYNC", "0"),
+            "python": sys.version.split()[0],
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        },
+        "results": results,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if not args.url:
+        configure_env(args)
+    report = asyncio.run(main_async(args))
+    data = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(data + "\n")
+    else:
+        print(data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Jednorazowy bootstrap przy starcie: oczekiwanie na DB i schemat.
+
+Przy N workerach uvicorn każdy proces woła run(), ale tylko pierwszy
+wykonuje DDL - pod blokadą doradczą bazy. Pozostałe (i kolejne restarty)
+po jednym SELECT widzą aktualny odcisk schematu i pomijają krok.
+Można też wywołać ręcznie / jako init container:  python bootstrap.py
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from sqlalchemy import select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+from models import metadata, schema_meta
+
+# logger uvicorn -> raport ląduje w logu serwera bez osobnej konfiguracji
+log = logging.getLogger("uvicorn.error")
+
+DB_WAIT_TIMEOUT = float(os.getenv("DB_WAIT_TIMEOUT", "60"))
+# auto = sprawdź odcisk i w razie potrzeby migruj; skip = nie dotykaj schematu
+SCHEMA_BOOTSTRAP = os.getenv("SCHEMA_BOOTSTRAP", "auto").lower()
+LOCK_NAME = "tourismo_schema"
+LOCK_TIMEOUT_SEC = 120
+
+
+def wait_for_db(
+    engine: Engine,
+    timeout: float = DB_WAIT_TIMEOUT,
+    base_delay: float = 0.05,
+    max_delay: float = 2.0,
+) -> int:
+    """
+    SELECT 1 z wykładniczym backoffem i pełnym jitterem (0..min(max, base*2^n)),
+    żeby restartujące się workery nie uderzały w DB jednocześnie.
+    Zwraca liczbę prób; RuntimeError po przekroczeniu timeout.
+    """
+    deadline = time.monotonic() + timeout
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return attempt
+        except Exception as e:
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"DB not ready after {attempt} tries / {timeout:.0f}s") from e
+        delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+        time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+
+
+def schema_fingerprint() -> str:
+    """Odcisk deklaracji tabel, kolumn i indeksów z models.py."""
+    parts = []
+    for table in metadata.sorted_tables:
+        parts.append(table.name)
+        parts += [f"{c.name}:{c.type}:{c.nullable}" for c in table.columns]
+        parts += sorted(f"ix:{ix.name}:{','.join(c.name for c in ix.columns)}" for ix in table.indexes)
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _stored_fingerprint(engine: Engine) -> Optional[str]:
+    try:
+        with engine.connect() as conn:
+            return conn.execute(
+                select(schema_meta.c.value).where(schema_meta.c.name == "fingerprint")
+            ).scalar_one_or_none()
+    except SQLAlchemyError:
+        return None  # pierwsze uruchomienie: brak tabeli schema_meta
+
+
+@contextmanager
+def advisory_lock(conn: Connection) -> Iterator[None]:
+    """Blokada na poziomie sesji DB; SQLite (stand-in) nie ma - tam no-op."""
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        key = zlib.crc32(LOCK_NAME.encode())
+        conn.execute(text("SELECT pg_advisory_lock(:k)"), {"k": key})
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": key})
+    elif dialect in ("mysql", "mariadb"):
+        got = conn.execute(
+            text("SELECT GET_LOCK(:n, :t)"), {"n": LOCK_NAME, "t": LOCK_TIMEOUT_SEC}
+        ).scalar()
+        if got != 1:
+            raise RuntimeError("could not acquire schema lock")
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT RELEASE_LOCK(:n)"), {"n": LOCK_NAME})
+    else:
+        yield
+
+
+def ensure_schema_once(engine: Engine) -> str:
+    """Zwraca "current" (nic do zrobienia) albo "applied"."""
+    from clusters import rebuild_if_empty
+    from schema import backfill_author, backfill_geohash, ensure_schema
+
+    expected = schema_fingerprint()
+    if _stored_fingerprint(engine) == expected:
+        return "current"
+
+    with engine.connect() as lock_conn:
+        with advisory_lock(lock_conn):
+            # ktoś mógł zrobić to za nas, gdy czekaliśmy na blokadę
+            if _stored_fingerprint(engine) == expected:
+                return "current"
+            ensure_schema(engine)
+            backfill_geohash(engine)
+            backfill_author(engine)
+            rebuild_if_empty(engine)
+            with engine.begin() as conn:
+                updated = conn.execute(
+                    schema_meta.update()
+                    .where(schema_meta.c.name == "fingerprint")
+                    .values(value=expected)
+                ).rowcount
+                if not updated:
+                    conn.execute(schema_meta.insert().values(name="fingerprint", value=expected))
+        lock_conn.commit()
+    return "applied"
+
+
+def run(engine: Engine) -> Dict[str, object]:
+    """
+    Pełny bootstrap z raportem czasów (logowany jako jedna linia JSON).
+    preboot_cpu_s: CPU procesu zużyte przed bootstrapem - interpreter, importy
+    i budowa aplikacji (worker uvicorn to świeży proces, więc to głównie importy).
+    """
+    t0 = time.perf_counter()
+    report: Dict[str, object] = {"pid": os.getpid(), "preboot_cpu_s": round(time.process_time(), 4)}
+
+    report["db_attempts"] = wait_for_db(engine)
+    t1 = time.perf_counter()
+    report["wait_db_s"] = round(t1 - t0, 4)
+
+    if SCHEMA_BOOTSTRAP == "skip":
+        report["schema"] = "skipped"
+    else:
+        report["schema"] = ensure_schema_once(engine)
+    report["schema_s"] = round(time.perf_counter() - t1, 4)
+    report["total_s"] = round(time.perf_counter() - t0, 4)
+
+    log.info("startup %s", json.dumps(report))
+    return report
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    from db import engine
+
+    run(engine)
@@ -0,0 +1,112 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Hashable, Optional
+
+from compression import compress
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+    last_modified: float  # epoch, pełne sekundy (tak jak w nagłówku HTTP)
+    stored_at: float
+    # skompresowane warianty body, liczone leniwie raz na wpis
+    _encoded: Dict[str, bytes] = field(default_factory=dict, compare=False, repr=False)
+
+    def encoded(self, encoding: str) -> bytes:
+        body = self._encoded.get(encoding)
+        if body is None:
+            body = self._encoded[encoding] = compress(self.body, encoding, cached=True)
+        return body
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        return {
+            "ETag": self.etag,
+            "Last-Modified": formatdate(self.last_modified, usegmt=True),
+            "Cache-Control": "no-cache",  # klient zawsze rewaliduje -> 304
+        }
+
+
+class ResponseCache:
+    """
+    Ograniczony cache LRU gotowych ciał odpowiedzi (bajtów), współdzielony
+    przez wątki jednego procesu. invalidate() czyści całość; ttl ogranicza
+    nieaktualność w pozostałych workerach, które nie widzą invalidacji
+    z innego procesu. Last-Modified to chwila, od której dana treść jest
+    serwowana - po odświeżeniu z identycznym ETag zostaje bez zmian.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry.stored_at > self.ttl:
+                # zostaje do porównania ETag w put(); usunie je LRU lub invalidate()
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def generation(self) -> int:
+        with self._lock:
+            return self._generation
+
+    def put(self, key: Hashable, body: bytes, generation: Optional[int] = None) -> CachedResponse:
+        """
+        Zapisuje ciało odpowiedzi. Jeśli podano generation z chwili przed
+        zapytaniem do DB, a w międzyczasie była invalidacja, wynik jest
+        zwracany, ale nie trafia do cache (nie utrwalamy starych danych).
+        """
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None and previous.etag == etag:
+                last_modified = previous.last_modified
+            else:
+                last_modified = float(int(time.time()))
+            entry = CachedResponse(
+                body=body,
+                etag=etag,
+                last_modified=last_modified,
+                stored_at=time.monotonic(),
+            )
+            if generation is not None and generation != self._generation:
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return entry
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+
+def is_not_modified(entry: CachedResponse, if_none_match: Optional[str], if_modified_since: Optional[str]) -> bool:
+    """Warunki z RFC 9110: If-None-Match ma pierwszeństwo przed If-Modified-Since."""
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        # porównanie słabe: W/"x" == "x"
+        return "*" in tags or entry.etag in (t[2:] if t.startswith("W/") else t for t in tags)
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return entry.last_modified <= since
+    return False
@@ -0,0 +1,165 @@
+"""
+Klastry na mapę: agregaty (liczba, suma lat/lon) per komórka geohash
+dla każdego poziomu szczegółowości, utrzymywane przyrostowo przy zapisie.
+
+Poziom = długość prefiksu geohash (1..MAP_MAX_LEVEL). Zoom mapy (0..22)
+przekłada się na poziom, przy którym komórka ma ~MAP_CELL_PX pikseli
+ekranu, więc liczba klastrów w widoku zależy od rozmiaru ekranu, a nie od
+gęstości postów. Odczyt to range scan po PK (level, cell), bez GROUP BY.
+"""
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, func, insert, literal_column, or_, select
+
+from geo import cell_size_deg, cover_bbox
+from models import map_cells, posts
+
+# --- konfiguracja
+MAP_MAX_LEVEL = 8          # ~38 m x 19 m
+MAP_MAX_ZOOM = 22
+MAP_CELL_PX = 64           # docelowa szerokość komórki na ekranie (kafel = 256 px)
+MAP_MAX_CELLS = 1024       # twardy limit odpowiedzi (duży bbox przy dużym zoomie)
+
+
+def level_for_zoom(zoom: int) -> int:
+    """Najmniejszy poziom, którego komórka jest węższa niż MAP_CELL_PX przy tym zoomie."""
+    target_deg = 360.0 / (1 << zoom) * MAP_CELL_PX / 256
+    for level in range(1, MAP_MAX_LEVEL + 1):
+        if cell_size_deg(level)[1] <= target_deg:
+            return level
+    return MAP_MAX_LEVEL
+
+
+# zoom -> poziom, policzone raz
+ZOOM_LEVELS: Dict[int, int] = {z: level_for_zoom(z) for z in range(MAP_MAX_ZOOM + 1)}
+
+
+def _cells_in_bbox(level: int, south: float, west: float, north: float, east: float) -> int:
+    cell_h, cell_w = cell_size_deg(level)
+    rows = math.floor(north / cell_h) - math.floor(south / cell_h) + 1
+    cols = math.floor(east / cell_w) - math.floor(west / cell_w) + 1
+    return rows * cols
+
+
+def level_for_view(zoom: int, south: float, west: float, north: float, east: float) -> int:
+    """Poziom dla zoomu, obniżany, dopóki bbox nie mieści się w MAP_MAX_CELLS komórkach."""
+    level = ZOOM_LEVELS[min(max(zoom, 0), MAP_MAX_ZOOM)]
+    while level > 1 and _cells_in_bbox(level, south, west, north, east) > MAP_MAX_CELLS:
+        level -= 1
+    return level
+
+
+# --- zapis: delty agregatów dla nowych punktów
+
+def cell_deltas(points: Iterable[Tuple[Optional[str], Optional[float], Optional[float]]]) -> List[dict]:
+    """
+    (geohash, lat, lon) -> wiersze delt dla map_cells, zsumowane per komórka
+    i posortowane (stała kolejność blokad -> brak zakleszczeń między uploadami).
+    """
+    acc: Dict[Tuple[int, str], List[float]] = defaultdict(lambda: [0, 0.0, 0.0])
+    for geohash, lat, lon in points:
+        if not geohash or lat is None or lon is None:
+            continue
+        for level in range(1, MAP_MAX_LEVEL + 1):
+            a = acc[(level, geohash[:level])]
+            a[0] += 1
+            a[1] += lat
+            a[2] += lon
+    return [
+        {"level": level, "cell": cell, "post_count": int(n), "sum_lat": s_lat, "sum_lon": s_lon}
+        for (level, cell), (n, s_lat, s_lon) in sorted(acc.items())
+    ]
+
+
+def upsert_statement(dialect: str):
+    """INSERT ... ON CONFLICT/DUPLICATE KEY, który dodaje deltę do istniejącej komórki."""
+    if dialect in ("mysql", "mariadb"):
+        from sqlalchemy.dialects.mysql import insert as dialect_insert
+        stmt = dialect_insert(map_cells)
+        return stmt.on_duplicate_key_update(
+            post_count=map_cells.c.post_count + stmt.inserted.post_count,
+            sum_lat=map_cells.c.sum_lat + stmt.inserted.sum_lat,
+            sum_lon=map_cells.c.sum_lon + stmt.inserted.sum_lon,
+        )
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(map_cells)
+    return stmt.on_conflict_do_update(
+        index_elements=[map_cells.c.level, map_cells.c.cell],
+        set_={
+            "post_count": map_cells.c.post_count + stmt.excluded.post_count,
+            "sum_lat": map_cells.c.sum_lat + stmt.excluded.sum_lat,
+            "sum_lon": map_cells.c.sum_lon + stmt.excluded.sum_lon,
+        },
+    )
+
+
+# --- odczyt
+
+def clusters_query(level: int, south: float, west: float, north: float, east: float):
+    """
+    Komórki poziomu `level` w bbox: przedziały prefiksów z cover_bbox na PK
+    (prefiksy nie dłuższe niż komórka), a potem filtr po centroidzie
+    (sum/count), bo komórki pokrycia wystają poza bbox.
+    """
+    ranges = []
+    for lo, hi in cover_bbox(south, west, north, east, max_precision=level):
+        cond = map_cells.c.cell >= lo
+        if hi is not None:
+            cond = and_(cond, map_cells.c.cell < hi)
+        ranges.append(cond)
+    n = map_cells.c.post_count
+    return (
+        select(map_cells.c.cell, n, map_cells.c.sum_lat, map_cells.c.sum_lon)
+        .where(map_cells.c.level == level)
+        .where(or_(*ranges))
+        .where(n > 0)
+        .where(map_cells.c.sum_lat.between(n * south, n * north))
+        .where(map_cells.c.sum_lon.between(n * west, n * east))
+        .limit(MAP_MAX_CELLS)
+    )
+
+
+def cluster_item(row) -> dict:
+    n = int(row["post_count"])
+    return {
+        "cell": row["cell"],
+        "count": n,
+        "lat": row["sum_lat"] / n,
+        "lon": row["sum_lon"] / n,
+    }
+
+
+# --- przebudowa od zera (bootstrap nowej tabeli)
+
+def rebuild(engine) -> int:
+    """Przelicza map_cells z posts (GROUP BY prefiksie geohash). Zwraca liczbę komórek."""
+    with engine.begin() as conn:
+        conn.execute(map_cells.delete())
+        for level in range(1, MAP_MAX_LEVEL + 1):
+            # stała w SQL zamiast parametru -> to samo wyrażenie w SELECT i GROUP BY (PostgreSQL)
+            lvl = literal_column(str(level))
+            prefix = func.substr(posts.c.geohash, literal_column("1"), lvl)
+            conn.execute(
+                insert(map_cells).from_select(
+                    ["level", "cell", "post_count", "sum_lat", "sum_lon"],
+                    select(
+                        lvl, prefix, func.count(), func.sum(posts.c.lat), func.sum(posts.c.lon),
+                    )
+                    .where(posts.c.geohash.is_not(None))
+                    .group_by(prefix),
+                )
+            )
+        return conn.execute(select(func.count()).select_from(map_cells)).scalar_one()
+
+
+def rebuild_if_empty(engine) -> int:
+    """Wywoływane z bootstrapu: przelicza tylko nową (pustą) tabelę."""
+    with engine.connect() as conn:
+        if conn.execute(select(map_cells.c.level).limit(1)).first() is not None:
+            return 0
+    return rebuild(engine)
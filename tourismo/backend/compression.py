@@ -0,0 +1,125 @@
+import gzip
+import os
+from typing import Dict, Optional, Tuple
+
+try:  # brotli opcjonalny: bez niego negocjujemy tylko gzip
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+# --- konfiguracja
+# poniżej progu nagłówki i ramka gzip zjadają zysk
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+# poziomy "w locie" (każda odpowiedź) i dla ciał trzymanych w cache (kompresja raz)
+DYNAMIC_LEVELS = {"br": 4, "gzip": 6}
+CACHED_LEVELS = {"br": 7, "gzip": 9}
+# obrazy są już skompresowane; Range/206 nie może dostać innej reprezentacji
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+SUPPORTED: Tuple[str, ...] = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Wybiera kodowanie z Accept-Encoding (z wagami q). Przy remisie
+    preferencja serwera: br (mniejszy wynik), potem gzip. None = bez kompresji.
+    """
+    if not accept_encoding:
+        return None
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip()] = q
+    best, best_q = None, 0.0
+    for enc in SUPPORTED:
+        q = weights.get(enc, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = enc, q
+    return best
+
+
+def compress(body: bytes, encoding: str, cached: bool = False) -> bytes:
+    level = (CACHED_LEVELS if cached else DYNAMIC_LEVELS)[encoding]
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    # mtime=0 -> ten sam wynik dla tych samych bajtów
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+def _compressible(headers: Dict[bytes, bytes]) -> bool:
+    if b"content-encoding" in headers:
+        return False
+    content_type = headers.get(b"content-type", b"").decode("latin-1")
+    return content_type.startswith(COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    """
+    Czysty middleware ASGI: kompresuje odpowiedzi 200 typu JSON/tekst wysłane
+    jednym kawałkiem. Strumienie (zdjęcia, Range) i odpowiedzi, które same
+    ustawiły Content-Encoding (feed z cache), przechodzą bez zmian.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = negotiate_encoding(accept)
+
+        start_message = None
+        passthrough = False
+
+        async def _send(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                if message["status"] != 200 or not _compressible(headers):
+                    passthrough = True
+                    await send(message)
+                    return
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or passthrough or start_message is None:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            start, start_message = start_message, None
+            raw = list(start.get("headers", []))
+            if not any(k == b"vary" and b"accept-encoding" in v.lower() for k, v in raw):
+                raw.append((b"vary", b"Accept-Encoding"))
+            if encoding is None or message.get("more_body") or len(body) < self.minimum_size:
+                passthrough = True
+                await send({**start, "headers": raw})
+                await send(message)
+                return
+            headers = [(k, v) for k, v in raw if k != b"content-length"]
+            body = compress(body, encoding)
+            # inna reprezentacja -> silny ETag staje się słaby
+            headers = [
+                (k, b"W/" + v if k == b"etag" and not v.startswith(b"W/") else v) for k, v in headers
+            ]
+            headers += [
+                (b"content-encoding", encoding.encode("ascii")),
+                (b"content-length", str(len(body)).encode("ascii")),
+            ]
+            await send({**start, "headers": headers})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, _send)
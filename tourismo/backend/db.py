@@ -1,6 +1,14 @@
+import itertools
+import logging
 import os
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError, OperationalError
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 
 DB_USER = os.getenv("DB_USER")
 DB_PASS = os.getenv("DB_PASS")
@@ -8,18 +16,83 @@ DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 
-DATABASE_URL = (
+DATABASE_URL = os.getenv("DATABASE_URL") or (
     f"postgresql+psycopg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     "?sslmode=require"
 )
 
+# --- tryb async: DB_ASYNC=1 -> AsyncEngine + AsyncSession za get_db
+DB_ASYNC = os.getenv("DB_ASYNC", "0").lower() in ("1", "true", "yes")
+
+# --- pula połączeń (pool_size + max_overflow = maks. równoległych zapytań)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# sterownik synchroniczny -> jego odpowiednik asyncio
+_ASYNC_DRIVERS = {
+    "postgresql+psycopg": "postgresql+psycopg",  # psycopg 3 obsługuje oba tryby
+    "postgresql": "postgresql+psycopg",
+    "mysql+pymysql": "mysql+aiomysql",
+    "mysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def _async_url(url: str) -> str:
+    scheme, rest = url.split("://", 1)
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+
+# --- repliki do odczytu (opcjonalne): URL-e po przecinku, ten sam format co DATABASE_URL
+DB_REPLICA_URLS = [u.strip() for u in os.getenv("DB_REPLICA_URLS", "").split(",") if u.strip()]
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+# replika opóźniona bardziej niż tyle sekund jest pomijana jak niedostępna
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+# po własnym zapisie użytkownik czyta z primary przez tyle sekund (read-your-writes)
+DB_STICKY_SEC = float(os.getenv("DB_STICKY_SEC", "10"))
+
+log = logging.getLogger("uvicorn.error")
+
+
+def _pool_kwargs(url: str) -> dict:
+    # SQLite (stand-in do testów/benchmarków) ma własne pule bez tych opcji
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
+
+# Silnik synchroniczny jest zawsze: bootstrap schematu, narzędzia, tryb domyślny.
 engine = create_engine(
     DATABASE_URL,
     echo=False,
     pool_pre_ping=True,
-    future=True
+    future=True,
+    **_pool_kwargs(DATABASE_URL),
 )
 
+
+def _mysql_session_setup(dbapi_conn, _record) -> None:
+    # sql_mode jest per sesja -> ustawiamy na każdym nowym połączeniu z puli,
+    # a nie raz przy starcie (wtedy dotyczyło tylko jednego połączenia)
+    cur = dbapi_conn.cursor()
+    try:
+        cur.execute("SET SESSION sql_mode=(SELECT REPLACE(@@sql_mode,'ONLY_FULL_GROUP_BY',''))")
+    finally:
+        cur.close()
+
+
+if engine.dialect.name in ("mysql", "mariadb"):
+    event.listen(engine, "connect", _mysql_session_setup)
+
 SessionLocal = sessionmaker(
     bind=engine,
     autoflush=False,
@@ -27,9 +100,223 @@ SessionLocal = sessionmaker(
     future=True
 )
 
-def get_db():
-    db = SessionLocal()
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        echo=False,
+        pool_pre_ping=True,
+        **_pool_kwargs(ASYNC_DATABASE_URL),
+    )
+    if async_engine.dialect.name in ("mysql", "mariadb"):
+        event.listen(async_engine.sync_engine, "connect", _mysql_session_setup)
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+class ThreadedSession:
+    """
+    Synchroniczna Session z interfejsem AsyncSession (execute/commit/... są
+    awaitable), żeby endpointy miały jeden kod dla obu trybów. Każde wywołanie
+    idzie do puli wątków; wynik z wierszami jest buforowany jak w trybie async.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+        self._used = False
+
+    async def execute(self, *args, **kwargs):
+        self._used = True
+
+        def _run():
+            result = self.sync_session.execute(*args, **kwargs)
+            return result.freeze()() if result.returns_rows else result
+        return await run_in_threadpool(_run)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self) -> None:
+        # nieużyta sesja (np. trafienie w cache) -> bez przeskoku do puli wątków
+        if self._used:
+            await run_in_threadpool(self.sync_session.close)
+
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession as DBSession
+else:
+    # adnotacja sesji w endpointach (AsyncSession albo ThreadedSession, ten sam
+    # interfejs); w trybie sync bez importu sqlalchemy.ext.asyncio
+    DBSession = ThreadedSession
+
+
+async def get_db():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    db = ThreadedSession(SessionLocal())
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
+
+
+# --- routing odczytów: repliki z health checkiem, failover na primary
+
+class Replica:
+    def __init__(self, index: int, url: str):
+        self.name = f"replica{index}"
+        self.engine = create_engine(url, echo=False, pool_pre_ping=True, future=True, **_pool_kwargs(url))
+        self.session_factory = sessionmaker(bind=self.engine, autoflush=False, future=True)
+        self.async_engine = None
+        self.async_session_factory = None
+        if DB_ASYNC:
+            from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+            async_url = _async_url(url)
+            self.async_engine = create_async_engine(
+                async_url, echo=False, pool_pre_ping=True, **_pool_kwargs(async_url),
+            )
+            self.async_session_factory = async_sessionmaker(
+                bind=self.async_engine, autoflush=False, expire_on_commit=False,
+            )
+        if self.engine.dialect.name in ("mysql", "mariadb"):
+            event.listen(self.engine, "connect", _mysql_session_setup)
+            if self.async_engine is not None:
+                event.listen(self.async_engine.sync_engine, "connect", _mysql_session_setup)
+        self.healthy = True
+        self.lag: Optional[float] = None
+
+    def session(self):
+        if self.async_session_factory is not None:
+            return self.async_session_factory()
+        return ThreadedSession(self.session_factory())
+
+
+# opóźnienie replikacji w sekundach (NULL = nie jest repliką albo brak danych)
+_LAG_SQL = {
+    "postgresql": "SELECT EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())",
+}
+
+
+def _probe(replica: Replica) -> None:
+    """SELECT 1 (+ lag tam, gdzie da się go odczytać); wynik w replica.healthy."""
+    try:
+        with replica.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            lag = None
+            dialect = replica.engine.dialect.name
+            if dialect in _LAG_SQL:
+                lag = conn.execute(text(_LAG_SQL[dialect])).scalar()
+            elif dialect in ("mysql", "mariadb"):
+                row = conn.execute(text("SHOW REPLICA STATUS")).mappings().first()
+                lag = row.get("Seconds_Behind_Source") if row else None
+        replica.lag = float(lag) if lag is not None else None
+        healthy = replica.lag is None or replica.lag <= DB_REPLICA_MAX_LAG
+    except Exception as e:
+        log.debug("replica %s probe failed: %r", replica.name, e)
+        healthy = False
+    if healthy != replica.healthy:
+        log.warning("replica %s is now %s", replica.name, "up" if healthy else "down")
+    replica.healthy = healthy
+
+
+replicas: List[Replica] = [Replica(i, url) for i, url in enumerate(DB_REPLICA_URLS)]
+_round_robin = itertools.count()
+_sticky_until: Dict[int, float] = {}
+_sticky_lock = threading.Lock()
+
+
+def pick_replica() -> Optional[Replica]:
+    """Kolejna zdrowa replika (round-robin) albo None -> czytamy z primary."""
+    healthy = [r for r in replicas if r.healthy]
+    if not healthy:
+        return None
+    return healthy[next(_round_robin) % len(healthy)]
+
+
+def check_replicas() -> None:
+    for replica in replicas:
+        _probe(replica)
+
+
+def mark_write(user_id: Optional[int]) -> float:
+    """Zapamiętuje zapis użytkownika; zwraca chwilę (epoch), do której czyta z primary."""
+    until = time.time() + DB_STICKY_SEC
+    if user_id is not None and replicas:
+        with _sticky_lock:
+            _sticky_until[user_id] = until
+            if len(_sticky_until) > 10000:
+                now = time.time()
+                for uid in [u for u, t in _sticky_until.items() if t < now]:
+                    del _sticky_until[uid]
+    return until
+
+
+def is_sticky(user_id: Optional[int], cookie_until: Optional[float] = None) -> bool:
+    now = time.time()
+    if cookie_until is not None and cookie_until > now:
+        return True
+    return user_id is not None and _sticky_until.get(user_id, 0.0) > now
+
+
+class ReadSession:
+    """
+    Sesja do odczytu na replice. Błąd połączenia z repliką -> replika
+    oznaczana jako niedostępna, a zapytanie powtarzane na primary.
+    """
+
+    def __init__(self, replica: Replica):
+        self.replica: Optional[Replica] = replica
+        self._session = replica.session()
+
+    async def execute(self, *args, **kwargs):
+        try:
+            return await self._session.execute(*args, **kwargs)
+        except DBAPIError as e:
+            # OperationalError: replika wyłączona, odmowa połączenia, zerwane połączenie
+            if self.replica is None or not (e.connection_invalidated or isinstance(e, OperationalError)):
+                raise
+            log.warning("replica %s failed, falling back to primary: %r", self.replica.name, e.orig)
+            self.replica.healthy = False
+            self.replica = None
+            await self.close()
+            self._session = AsyncSessionLocal() if AsyncSessionLocal is not None else ThreadedSession(SessionLocal())
+            return await self._session.execute(*args, **kwargs)
+
+    async def close(self) -> None:
+        await self._session.close()
+
+
+async def get_read_db(sticky: bool = False):
+    """Sesja tylko do odczytu: replika, chyba że brak zdrowych albo sticky (własny zapis)."""
+    replica = None if sticky else pick_replica()
+    if replica is None:
+        async for db in get_db():
+            yield db
+        return
+    db = ReadSession(replica)
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
+async def dispose() -> None:
+    if async_engine is not None:
+        await async_engine.dispose()
+    engine.dispose()
+    for replica in replicas:
+        if replica.async_engine is not None:
+            await replica.async_engine.dispose()
+        replica.engine.dispose()
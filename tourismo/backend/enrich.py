@@ -0,0 +1,143 @@
+"""
+Wzbogacanie zdjęcia po zapisie (uruchamiane przez worker kolejki, jobs.py):
+wymiary, GPS i czas wykonania z EXIF oraz placeholder w formacie BlurHash.
+"""
+import math
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# --- EXIF: numery tagów (PIL.ExifTags), bez importu Pillow na poziomie modułu
+TAG_ORIENTATION = 0x0112
+TAG_DATETIME = 0x0132
+IFD_EXIF = 0x8769
+IFD_GPS = 0x8825
+TAG_DATETIME_ORIGINAL = 0x9003
+GPS_LAT_REF, GPS_LAT, GPS_LON_REF, GPS_LON = 1, 2, 3, 4
+
+# składowe BlurHash (poziomo x pionowo) i rozmiar próbki, z której są liczone
+BLURHASH_COMPONENTS = (4, 3)
+BLURHASH_SAMPLE = 32
+
+_B83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+
+def _dms_to_deg(dms, ref) -> Optional[float]:
+    try:
+        deg = float(dms[0]) + float(dms[1]) / 60.0 + float(dms[2]) / 3600.0
+    except (TypeError, ValueError, IndexError, ZeroDivisionError):
+        return None
+    if isinstance(ref, bytes):
+        ref = ref.decode("ascii", "ignore")
+    return -deg if str(ref).strip().upper() in ("S", "W") else deg
+
+
+def exif_gps(exif) -> Optional[Tuple[float, float]]:
+    gps = exif.get_ifd(IFD_GPS)
+    if not gps or GPS_LAT not in gps or GPS_LON not in gps:
+        return None
+    lat = _dms_to_deg(gps[GPS_LAT], gps.get(GPS_LAT_REF, "N"))
+    lon = _dms_to_deg(gps[GPS_LON], gps.get(GPS_LON_REF, "E"))
+    if lat is None or lon is None or not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+        return None
+    if lat == 0.0 and lon == 0.0:
+        return None  # typowy "pusty" wpis z aparatów bez fixa GPS
+    return lat, lon
+
+
+def exif_taken_at(exif) -> Optional[datetime]:
+    raw = exif.get_ifd(IFD_EXIF).get(TAG_DATETIME_ORIGINAL) or exif.get(TAG_DATETIME)
+    if not raw:
+        return None
+    try:
+        return datetime.strptime(str(raw).strip("\x00 ")[:19], "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+
+
+# --- BlurHash (https://blurha.sh): kilka składowych DCT w ~20-30 znakach base83
+def _b83(value: int, length: int) -> str:
+    return "".join(_B83[(value // 83 ** (length - i - 1)) % 83] for i in range(length))
+
+
+def _to_linear(v: int) -> float:
+    v = v / 255.0
+    return v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4
+
+
+def _to_srgb(v: float) -> int:
+    v = max(0.0, min(1.0, v))
+    out = v * 12.92 if v <= 0.0031308 else 1.055 * v ** (1 / 2.4) - 0.055
+    return int(out * 255 + 0.5)
+
+
+def _sign_pow(v: float, exp: float) -> float:
+    return math.copysign(abs(v) ** exp, v)
+
+
+def blurhash(pixels: List[Tuple[int, int, int]], width: int, height: int,
+             components: Tuple[int, int] = BLURHASH_COMPONENTS) -> str:
+    cx, cy = components
+    linear = [(_to_linear(r), _to_linear(g), _to_linear(b)) for r, g, b in pixels]
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(cx)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(cy)]
+
+    factors: List[Tuple[float, float, float]] = []
+    for j in range(cy):
+        for i in range(cx):
+            norm = (1.0 if i == 0 and j == 0 else 2.0) / (width * height)
+            r = g = b = 0.0
+            for y in range(height):
+                row = y * width
+                wy = cos_y[j][y]
+                for x in range(width):
+                    w = cos_x[i][x] * wy
+                    pr, pg, pb = linear[row + x]
+                    r += w * pr
+                    g += w * pg
+                    b += w * pb
+            factors.append((r * norm, g * norm, b * norm))
+
+    dc, ac = factors[0], factors[1:]
+    out = _b83((cx - 1) + (cy - 1) * 9, 1)
+    if ac:
+        actual_max = max(abs(c) for f in ac for c in f)
+        quant_max = max(0, min(82, int(actual_max * 166 - 0.5)))
+        max_value = (quant_max + 1) / 166
+        out += _b83(quant_max, 1)
+    else:
+        max_value = 1.0
+        out += _b83(0, 1)
+    out += _b83((_to_srgb(dc[0]) << 16) + (_to_srgb(dc[1]) << 8) + _to_srgb(dc[2]), 4)
+    for f in ac:
+        q = [max(0, min(18, int(_sign_pow(c / max_value, 0.5) * 9 + 9.5))) for c in f]
+        out += _b83(q[0] * 19 * 19 + q[1] * 19 + q[2], 2)
+    return out
+
+
+def analyze(path: str) -> Dict[str, object]:
+    """
+    Metadane zdjęcia: width/height (po uwzględnieniu orientacji EXIF),
+    placeholder, taken_at oraz lat/lon, jeśli EXIF ma pozycję GPS.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as im:
+        exif = im.getexif()
+        width, height = im.size
+        if exif.get(TAG_ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width
+        result: Dict[str, object] = {
+            "width": width,
+            "height": height,
+            "taken_at": exif_taken_at(exif),
+        }
+        gps = exif_gps(exif)
+        if gps is not None:
+            result["lat"], result["lon"] = gps
+
+        # JPEG: dekodowanie w zmniejszonej skali, BlurHash i tak widzi tylko 32 px
+        im.draft("RGB", (BLURHASH_SAMPLE * 4, BLURHASH_SAMPLE * 4))
+        im = ImageOps.exif_transpose(im).convert("RGB")
+        im.thumbnail((BLURHASH_SAMPLE, BLURHASH_SAMPLE))
+        result["placeholder"] = blurhash(list(im.getdata()), im.width, im.height)
+    return result
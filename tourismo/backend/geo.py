@@ -0,0 +1,144 @@
+import math
+from typing import List, Optional, Tuple
+
+# --- geohash: klucz przestrzenny, którego prefiks = komórka siatki.
+# Alfabet jest rosnący zarówno w ASCII, jak i w typowych collation MySQL/PostgreSQL,
+# więc komórka to zwykły przedział [lo, hi) na indeksie B-tree (bez LIKE).
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+GEOHASH_PRECISION = 9          # ~4.8 m x 4.8 m
+EARTH_RADIUS_KM = 6371.0088
+MAX_COVER_CELLS = 16           # górna granica liczby przedziałów w zapytaniu
+
+
+def encode_geohash(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars: List[str] = []
+    bits = 0
+    value = 0
+    even = True  # geohash zaczyna od długości geograficznej
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                value = (value << 1) | 1
+                lon_lo = mid
+            else:
+                value <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def valid_coordinates(lat: Optional[float], lon: Optional[float]) -> bool:
+    """Skończone lat w [-90, 90] i lon w [-180, 180]; brak (None) jest poprawny."""
+    if lat is not None and not (math.isfinite(lat) and -90.0 <= lat <= 90.0):
+        return False
+    if lon is not None and not (math.isfinite(lon) and -180.0 <= lon <= 180.0):
+        return False
+    return True
+
+
+def geohash_or_none(lat: Optional[float], lon: Optional[float]) -> Optional[str]:
+    if lat is None or lon is None:
+        return None
+    return encode_geohash(lat, lon)
+
+
+def cell_size_deg(precision: int) -> Tuple[float, float]:
+    """(wysokość, szerokość) komórki w stopniach dla danej długości prefiksu."""
+    total = 5 * precision
+    lat_bits = total // 2
+    lon_bits = total - lat_bits
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat: float, lon: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    (south, west, north, east) opisujące okrąg. Długości mogą wyjść poza
+    [-180, 180] przy południku 180° - wołający sprawdza to sam.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    south, north = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    cos_lat = math.cos(math.radians(lat))
+    if cos_lat < 1e-6 or north >= 90.0 or south <= -90.0:
+        return south, -180.0, north, 180.0
+    dlon = min(180.0, dlat / cos_lat)
+    return south, lon - dlon, north, lon + dlon
+
+
+def _normalize_lon(lon: float) -> float:
+    return (lon + 180.0) % 360.0 - 180.0
+
+
+def _prefix_upper_bound(prefix: str) -> Optional[str]:
+    """Najmniejszy klucz większy od wszystkich z danym prefiksem (None = brak)."""
+    chars = list(prefix)
+    while chars:
+        idx = GEOHASH_ALPHABET.index(chars[-1])
+        if idx + 1 < len(GEOHASH_ALPHABET):
+            chars[-1] = GEOHASH_ALPHABET[idx + 1]
+            return "".join(chars)
+        chars.pop()
+    return None
+
+
+def cover_bbox(
+    south: float, west: float, north: float, east: float,
+    max_cells: int = MAX_COVER_CELLS,
+    max_precision: int = GEOHASH_PRECISION,
+) -> List[Tuple[str, Optional[str]]]:
+    """
+    Pokrywa bbox komórkami geohash o największej precyzji (do max_precision),
+    przy której liczba komórek nie przekracza max_cells. Zwraca przedziały
+    [lo, hi) gotowe do warunku na indeksie; sąsiednie komórki są scalane.
+    Precyzja 1 (najwyżej 32 komórki) jest zawsze dozwolona, więc bbox pasa
+    przy biegunie dalej daje ograniczone przedziały, a nie cały indeks.
+    """
+    prefixes: List[str] = []
+    for precision in range(1, max_precision + 1):
+        cell_h, cell_w = cell_size_deg(precision)
+        rows = math.floor(north / cell_h) - math.floor(south / cell_h) + 1
+        cols = math.floor(east / cell_w) - math.floor(west / cell_w) + 1
+        # bbox na całą długość: więcej kolumn niż jest komórek -> to te same komórki
+        cols = min(cols, round(360.0 / cell_w))
+        if rows * cols > max_cells and prefixes:
+            break
+        cells = set()
+        for r in range(rows):
+            # środek komórki -> brak problemów z granicami przedziałów
+            lat = min(89.999999, (math.floor(south / cell_h) + r + 0.5) * cell_h)
+            for c in range(cols):
+                lon = (math.floor(west / cell_w) + c + 0.5) * cell_w
+                cells.add(encode_geohash(lat, _normalize_lon(lon), precision))
+        prefixes = sorted(cells)
+
+    ranges: List[Tuple[str, Optional[str]]] = []
+    for prefix in prefixes:
+        hi = _prefix_upper_bound(prefix)
+        if ranges and ranges[-1][1] == prefix:
+            ranges[-1] = (ranges[-1][0], hi)
+        else:
+            ranges.append((prefix, hi))
+    return ranges
@@ -0,0 +1,167 @@
+"""
+Trwała kolejka zadań w tabeli `jobs` i worker, który je wykonuje.
+
+Upload wstawia zadanie w tej samej transakcji co post, więc nic nie ginie
+przy restarcie; czas żądania nie zależy od tego, ile pracy dojdzie tutaj.
+Worker to osobny proces (python jobs.py, w compose: usługa "worker").
+Kilka workerów może działać równolegle - na PostgreSQL/MySQL 8 pobieranie
+idzie przez FOR UPDATE SKIP LOCKED, więc nie biorą tych samych wierszy.
+"""
+import logging
+import os
+import signal
+import socket
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.engine import Engine
+
+from clusters import cell_deltas, upsert_statement
+from geo import geohash_or_none
+from models import jobs, posts
+
+log = logging.getLogger("tourismo.jobs")
+
+# --- konfiguracja
+JOB_BATCH = int(os.getenv("JOB_BATCH", "8"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+# "running" dłużej niż tyle -> worker padł, zadanie wraca do puli
+JOB_LOCK_TIMEOUT = int(os.getenv("JOB_LOCK_TIMEOUT", "300"))
+
+ENRICH = "enrich"
+
+
+def job_values(kind: str, photo_path: str) -> dict:
+    """Wiersz do insert(jobs); run_after z zegara aplikacji, tak jak przy pobieraniu."""
+    return {"kind": kind, "photo_path": photo_path, "status": "pending", "run_after": datetime.utcnow()}
+
+
+def claim(engine: Engine, worker_id: str, limit: int = JOB_BATCH) -> List[dict]:
+    """Rezerwuje do `limit` zadań gotowych do wykonania (i porzuconych przez martwe workery)."""
+    now = datetime.utcnow()
+    ready = or_(
+        and_(jobs.c.status == "pending", jobs.c.run_after <= now),
+        and_(jobs.c.status == "running", jobs.c.locked_at < now - timedelta(seconds=JOB_LOCK_TIMEOUT)),
+    )
+    with engine.begin() as conn:
+        rows = conn.execute(
+            select(jobs.c.id, jobs.c.kind, jobs.c.photo_path, jobs.c.attempts)
+            .where(ready)
+            .order_by(jobs.c.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)  # SQLite: ignorowane, zapis i tak jest wyłączny
+        ).mappings().all()
+        if not rows:
+            return []
+        conn.execute(
+            update(jobs)
+            .where(jobs.c.id.in_([r["id"] for r in rows]))
+            .values(status="running", locked_by=worker_id, locked_at=now, attempts=jobs.c.attempts + 1)
+        )
+    return [dict(r) for r in rows]
+
+
+def complete(engine: Engine, job_id: int) -> None:
+    with engine.begin() as conn:
+        conn.execute(
+            update(jobs).where(jobs.c.id == job_id)
+            .values(status="done", locked_by=None, locked_at=None, error=None)
+        )
+
+
+def fail(engine: Engine, job: dict, error: str) -> None:
+    """Ponowienie z wykładniczym backoffem albo status "failed" po ostatniej próbie."""
+    attempts = job["attempts"] + 1
+    values = {"locked_by": None, "locked_at": None, "error": error[:255]}
+    if attempts >= JOB_MAX_ATTEMPTS:
+        values["status"] = "failed"
+    else:
+        values["status"] = "pending"
+        values["run_after"] = datetime.utcnow() + timedelta(seconds=min(3600, 5 * 2 ** attempts))
+    with engine.begin() as conn:
+        conn.execute(update(jobs).where(jobs.c.id == job["id"]).values(**values))
+
+
+# --- obsługa zadań: kind -> funkcja(engine, job)
+
+def run_enrich(engine: Engine, job: dict) -> None:
+    from enrich import analyze
+    from storage import get_backend
+
+    key = job["photo_path"]
+    with get_backend().local_copy(key) as path:
+        meta = analyze(path)
+    with engine.begin() as conn:
+        conn.execute(
+            update(posts).where(posts.c.photo_path == key).values(
+                width=meta["width"],
+                height=meta["height"],
+                placeholder=meta["placeholder"],
+                taken_at=meta["taken_at"],
+            )
+        )
+        # pozycja z EXIF tylko tam, gdzie klient jej nie przysłał
+        if "lat" in meta:
+            geohash = geohash_or_none(meta["lat"], meta["lon"])
+            located = conn.execute(
+                update(posts)
+                .where(posts.c.photo_path == key)
+                .where(posts.c.lat.is_(None))
+                .values(lat=meta["lat"], lon=meta["lon"], geohash=geohash)
+            ).rowcount
+            if located:
+                # nowe punkty na mapie -> te same przyrostowe agregaty co przy uploadzie
+                deltas = cell_deltas([(geohash, meta["lat"], meta["lon"])] * located)
+                conn.execute(upsert_statement(engine.dialect.name), deltas)
+
+
+HANDLERS: Dict[str, Callable[[Engine, dict], None]] = {
+    ENRICH: run_enrich,
+}
+
+
+def run_once(engine: Engine, worker_id: str) -> int:
+    """Jedna runda: pobierz porcję i wykonaj. Zwraca liczbę pobranych zadań."""
+    batch = claim(engine, worker_id)
+    for job in batch:
+        handler = HANDLERS.get(job["kind"])
+        try:
+            if handler is None:
+                raise ValueError(f"unknown job kind: {job['kind']}")
+            handler(engine, job)
+        except Exception as e:
+            log.warning("job %s (%s %s) failed: %r", job["id"], job["kind"], job["photo_path"], e)
+            fail(engine, job, repr(e))
+        else:
+            complete(engine, job["id"])
+    return len(batch)
+
+
+def run_forever(engine: Engine, worker_id: Optional[str] = None) -> None:
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stopping = False
+
+    def _stop(*_args):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+    log.info("worker %s started", worker_id)
+    while not stopping:
+        if not run_once(engine, worker_id):
+            time.sleep(JOB_POLL_INTERVAL)
+    log.info("worker %s stopped", worker_id)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    import bootstrap
+    from db import engine
+
+    # schemat: ten sam jednorazowy bootstrap co API (no-op, gdy aktualny)
+    bootstrap.run(engine)
+    run_forever(engine)
@@ -0,0 +1,233 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# --- granice kubełków histogramu (sekundy), jak domyślne w klientach Prometheus
+BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram:
+    """Histogram kumulatywny z sumą i licznikiem; aktualizacja O(log n) pod blokadą."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # ostatni = +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.http_latency: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.http_status: Dict[Tuple[str, str, int], int] = defaultdict(int)
+        self.db_latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.pool_checkouts = 0
+        self.pool_connects = 0
+        self.rejections: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    def observe_http(self, method: str, route: str, status: int, seconds: float) -> None:
+        with self._lock:
+            self.http_latency[(method, route)].observe(seconds)
+            self.http_status[(method, route, status)] += 1
+
+    def observe_db(self, key: str, seconds: float) -> None:
+        with self._lock:
+            self.db_latency[key].observe(seconds)
+
+    def count_pool_checkout(self) -> None:
+        with self._lock:
+            self.pool_checkouts += 1
+
+    def count_pool_connect(self) -> None:
+        with self._lock:
+            self.pool_connects += 1
+
+    def count_rejection(self, route_class: str, reason: str) -> None:
+        with self._lock:
+            self.rejections[(route_class, reason)] += 1
+
+    def render(self, engines: Dict[str, Engine]) -> str:
+        lines: List[str] = []
+        with self._lock:
+            lines += _render_histogram(
+                "tourismo_http_request_duration_seconds",
+                "Czas obsługi żądania HTTP per trasa.",
+                {("method", "route"): self.http_latency},
+            )
+            lines.append("# HELP tourismo_http_responses_total Odpowiedzi HTTP per trasa i status.")
+            lines.append("# TYPE tourismo_http_responses_total counter")
+            for (method, route, status), n in sorted(self.http_status.items()):
+                lines.append(
+                    f'tourismo_http_responses_total{{method="{method}",route="{_esc(route)}",'
+                    f'status="{status}"}} {n}'
+                )
+            lines += _render_histogram(
+                "tourismo_db_query_duration_seconds",
+                "Czas wykonania zapytania SQL per znormalizowana instrukcja.",
+                {("statement",): {(k,): h for k, h in self.db_latency.items()}},
+            )
+            lines.append("# HELP tourismo_db_pool_checkouts_total Pobrania połączenia z puli.")
+            lines.append("# TYPE tourismo_db_pool_checkouts_total counter")
+            lines.append(f"tourismo_db_pool_checkouts_total {self.pool_checkouts}")
+            lines.append("# HELP tourismo_db_pool_connects_total Nowe połączenia fizyczne.")
+            lines.append("# TYPE tourismo_db_pool_connects_total counter")
+            lines.append(f"tourismo_db_pool_connects_total {self.pool_connects}")
+            lines.append("# HELP tourismo_admission_rejected_total Żądania odrzucone przez kontrolę dopuszczenia.")
+            lines.append("# TYPE tourismo_admission_rejected_total counter")
+            for (route_class, reason), n in sorted(self.rejections.items()):
+                lines.append(
+                    f'tourismo_admission_rejected_total{{class="{route_class}",reason="{reason}"}} {n}'
+                )
+
+        lines += _render_pools(engines)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+# --- normalizacja SQL: literały i listy parametrów -> "?", białe znaki -> 1 spacja.
+# Wynik cache'owany po tekście instrukcji (SQLAlchemy i tak reużywa te same stringi).
+_NUM = re.compile(r"\b\d+(\.\d+)?\b")
+_STR = re.compile(r"'(?:[^']|'')*'")
+_PARAM = re.compile(r"(%\(\w+\)s|%s|\?|:\w+|\$\d+)")
+_IN_LIST = re.compile(r"\(\s*\?(\s*,\s*\?)*\s*\)")
+_WS = re.compile(r"\s+")
+_MAX_KEYS = 500
+_normalized: Dict[str, str] = {}
+
+
+def normalize_statement(sql: str) -> str:
+    key = _normalized.get(sql)
+    if key is not None:
+        return key
+    key = _STR.sub("?", sql)
+    key = _PARAM.sub("?", key)
+    key = _NUM.sub("?", key)
+    key = _IN_LIST.sub("(?)", key)
+    key = _WS.sub(" ", key).strip()[:200]
+    # ograniczona kardynalność etykiet -> nowe instrukcje ponad limit do jednego worka
+    if key not in registry.db_latency and len(registry.db_latency) >= _MAX_KEYS:
+        key = "other"
+    if len(_normalized) < _MAX_KEYS * 4:
+        _normalized[sql] = key
+    return key
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Podpina pomiar czasu zapytań i liczniki puli do (synchronicznego) Engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack = conn.info.get("_query_start")
+        if stack:
+            registry.observe_db(normalize_statement(statement), time.perf_counter() - stack.pop())
+
+    @event.listens_for(engine, "handle_error")
+    def _error(ctx):
+        stack = ctx.connection.info.get("_query_start") if ctx.connection is not None else None
+        if stack:
+            stack.pop()
+
+    @event.listens_for(engine.pool, "checkout")
+    def _checkout(dbapi_conn, record, proxy):
+        registry.count_pool_checkout()
+
+    @event.listens_for(engine.pool, "connect")
+    def _connect(dbapi_conn, record):
+        registry.count_pool_connect()
+
+
+class MetricsMiddleware:
+    """
+    Czysty middleware ASGI (bez BaseHTTPMiddleware -> bez dodatkowego taska
+    na żądanie). Etykietą jest szablon trasy, nie surowa ścieżka, więc
+    kardynalność jest stała.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            route = scope.get("route")
+            if route is not None:
+                label = route.path
+            elif scope["path"].startswith("/uploads/"):
+                label = "/uploads/*"
+            else:
+                label = "unmatched"
+            registry.observe_http(scope["method"], label, status, time.perf_counter() - start)
+
+
+def _esc(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+
+def _render_histogram(name: str, help_text: str, series: dict) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for label_names, data in series.items():
+        for label_values, hist in sorted(data.items()):
+            labels = ",".join(f'{n}="{_esc(v)}"' for n, v in zip(label_names, label_values))
+            cumulative = 0
+            for bound, n in zip(BUCKETS, hist.counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {hist.count}')
+            lines.append(f"{name}_sum{{{labels}}} {hist.total:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {hist.count}")
+    return lines
+
+
+def _render_pools(engines: Dict[str, Engine]) -> List[str]:
+    # nazwa metryki -> (metoda QueuePool, opis)
+    gauges = {
+        "size": ("size", "Rozmiar puli."),
+        "checked_out": ("checkedout", "Połączenia aktualnie wypożyczone."),
+        "checked_in": ("checkedin", "Połączenia wolne w puli."),
+        "overflow": ("overflow", "Połączenia ponad pool_size (ujemne = niewykorzystany zapas)."),
+    }
+    lines: List[str] = []
+    for gauge, (method, help_text) in gauges.items():
+        name = f"tourismo_db_pool_{gauge}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for label, engine in engines.items():
+            fn = getattr(engine.pool, method, None)  # np. SingletonThreadPool ich nie ma
+            if fn is not None:
+                lines.append(f'{name}{{engine="{_esc(label)}"}} {fn()}')
+    return lines
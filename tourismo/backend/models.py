@@ -1,4 +1,4 @@
-from sqlalchemy import MetaData, Table, Column, Integer, String, Float, DateTime, ForeignKey, func
+from sqlalchemy import MetaData, Table, Column, Integer, String, Float, DateTime, ForeignKey, Index, func
 
 metadata = MetaData()
 
@@ -17,4 +17,60 @@ posts = Table(
     Column("lat", Float, nullable=True),
     Column("lon", Float, nullable=True),
     Column("created_at", DateTime, server_default=func.now(), nullable=False),
+    # geohash(lat, lon) liczony przy zapisie -> "w pobliżu" jako range scan po indeksie
+    Column("geohash", String(12), nullable=True),
+    # zdenormalizowany users.email (ustawiany przy zapisie) -> feed bez JOIN z users
+    Column("author", String(120), nullable=True),
+    # uzupełniane w tle przez worker (jobs.py) z pliku zdjęcia
+    Column("width", Integer, nullable=True),
+    Column("height", Integer, nullable=True),
+    Column("placeholder", String(64), nullable=True),  # BlurHash
+    Column("taken_at", DateTime, nullable=True),  # EXIF DateTimeOriginal
+    # klucz idempotencji od klienta (nagłówek Idempotency-Key / meta batcha);
+    # ponowienie z tym samym kluczem zwraca istniejący post zamiast tworzyć nowy
+    Column("client_key", String(64), nullable=True),
+    # feed: keyset (created_at DESC, id DESC) -> range scan zamiast sortowania tabeli
+    Index("ix_posts_created_at_id", "created_at", "id"),
+    Index("ix_posts_geohash", "geohash"),
+    # posty użytkownika: ten sam keyset zawężony do user_id
+    Index("ix_posts_user_created_id", "user_id", "created_at", "id"),
+    # worker aktualizuje wszystkie posty z danym plikiem (klucz = hash treści)
+    Index("ix_posts_photo_path", "photo_path"),
+    # NULL-e są różne -> unikalność tylko dla uploadów z kluczem
+    Index("ux_posts_user_client_key", "user_id", "client_key", unique=True),
+)
+
+# agregaty klastrów mapy per (poziom geohash, komórka); utrzymywane przy zapisie (clusters.py)
+map_cells = Table(
+    "map_cells", metadata,
+    Column("level", Integer, primary_key=True, autoincrement=False),
+    Column("cell", String(12), primary_key=True),
+    Column("post_count", Integer, nullable=False),
+    Column("sum_lat", Float, nullable=False),
+    Column("sum_lon", Float, nullable=False),
+)
+
+# trwała kolejka zadań w tle; worker: python jobs.py
+jobs = Table(
+    "jobs", metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("kind", String(32), nullable=False),
+    Column("photo_path", String(255), nullable=False),
+    # pending -> running -> done | failed (po JOB_MAX_ATTEMPTS próbach)
+    Column("status", String(16), nullable=False, server_default="pending"),
+    Column("attempts", Integer, nullable=False, server_default="0"),
+    Column("run_after", DateTime, server_default=func.now(), nullable=False),
+    Column("locked_by", String(64), nullable=True),
+    Column("locked_at", DateTime, nullable=True),
+    Column("error", String(255), nullable=True),
+    Column("created_at", DateTime, server_default=func.now(), nullable=False),
+    # pobieranie: status + run_after, kolejność po id
+    Index("ix_jobs_status_run_after", "status", "run_after", "id"),
+)
+
+# stan bootstrapu schematu (odcisk models.py) -> workery pomijają DDL, gdy aktualny
+schema_meta = Table(
+    "schema_meta", metadata,
+    Column("name", String(64), primary_key=True),
+    Column("value", String(64), nullable=False),
 )
@@ -0,0 +1,49 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.sql.elements import ColumnElement
+
+
+# --- kursor keyset: nieprzezroczysty token z parą (created_at, id)
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """
+    Koduje pozycję ostatniego elementu strony do postaci tokenu base64url.
+    Klient traktuje go jako nieprzezroczysty i odsyła w parametrze `cursor`.
+    """
+    raw = json.dumps([created_at.isoformat(), int(row_id)], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Odwrotność encode_cursor. Rzuca ValueError dla uszkodzonego tokenu.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception as e:
+        raise ValueError("invalid cursor") from e
+
+
+def keyset_before(created_col, id_col, cursor: Optional[str]) -> Optional[ColumnElement]:
+    """
+    Warunek "starsze niż kursor" dla sortowania (created_at DESC, id DESC).
+    Sam OR/AND nie jest granicą zakresu dla PostgreSQL (skan od najnowszych
+    z filtrem albo BitmapOr + sort), dlatego dochodzi nadmiarowe
+    created_at <= X: na nim MySQL i PostgreSQL zaczynają range scan indeksu
+    (created_at, id) dokładnie od pozycji kursora.
+    """
+    if not cursor:
+        return None
+    created_at, row_id = decode_cursor(cursor)
+    return and_(
+        created_col <= created_at,
+        or_(
+            created_col < created_at,
+            and_(created_col == created_at, id_col < row_id),
+        ),
+    )
@@ -0,0 +1,166 @@
+import os
+import re
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from fastapi import Request
+from starlette.responses import Response, StreamingResponse
+
+from storage import ObjectInfo
+
+# --- serwowanie zdjęć: niezmienne URL-e, silne ETagi, Range, negocjacja formatu
+CAS_KEY = re.compile(r"^[0-9a-f]{2}/[0-9a-f]{2}/([0-9a-f]{64})\.[a-z0-9]+$")
+IMMUTABLE = "public, max-age=31536000, immutable"
+# stare klucze ({user_id}_{nazwa}) nie są adresowane treścią -> krótki cache + rewalidacja
+REVALIDATE = "public, max-age=300, must-revalidate"
+READ_CHUNK = 256 * 1024
+
+MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+    ".heic": "image/heic",
+}
+
+
+def content_hash(key: str) -> Optional[str]:
+    """SHA-256 zapisany w kluczu (storage.key_for) albo None dla starych nazw."""
+    m = CAS_KEY.match(key)
+    return m.group(1) if m else None
+
+
+def negotiate_format(accept: Optional[str], available: Tuple[str, ...]) -> str:
+    """
+    Wybiera format pochodnej po nagłówku Accept. Kolejność `available` to
+    preferencja serwera (mniejszy plik pierwszy); ostatni jest bezpiecznym
+    fallbackiem, który dekoduje każdy klient.
+    """
+    accept = (accept or "").lower()
+    for fmt in available[:-1]:
+        if f"image/{fmt}" in accept:
+            return fmt
+    return available[-1]
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Jeden zakres "bytes=a-b" / "a-" / "-n" -> (start, end) włącznie.
+    None = nagłówek ignorujemy (wiele zakresów, inna jednostka) i wysyłamy całość.
+    ValueError = zakres niespełnialny (416).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                raise ValueError
+            return max(0, size - length), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        raise ValueError("bad range")
+    if start >= size or end < start:
+        raise ValueError("unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def _iter_file(path: str, start: int, length: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(READ_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+
+def send_object(
+    request: Request,
+    size: int,
+    chunks: Callable[[int, int], Iterator[bytes]],
+    media_type: str,
+    etag: str,
+    cache_control: str,
+    vary: Optional[str] = None,
+) -> Response:
+    """
+    Odpowiedź z obsługą If-None-Match (304), Range/If-Range (206/416)
+    i strumieniowaniem porcjami - bez wczytywania całości do pamięci.
+    `chunks(start, length)` daje bajty z pliku lokalnego albo magazynu.
+    """
+    headers: Dict[str, str] = {
+        "ETag": etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    if vary:
+        headers["Vary"] = vary
+
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    start, end = 0, size - 1
+    status = 200
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    # If-Range z innym ETagiem (lub datą - nie wystawiamy Last-Modified) -> cały plik
+    if range_header and size and (if_range is None or if_range.strip() == etag):
+        try:
+            parsed = _parse_range(range_header, size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if parsed is not None:
+            start, end = parsed
+            status = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    length = max(0, end - start + 1)
+    headers["Content-Length"] = str(length)
+    if request.method == "HEAD":
+        return Response(status_code=status, headers=headers, media_type=media_type)
+    return StreamingResponse(
+        chunks(start, length),
+        status_code=status,
+        headers=headers,
+        media_type=media_type,
+    )
+
+
+def send_file(
+    request: Request,
+    path: str,
+    media_type: str,
+    etag: str,
+    cache_control: str,
+    vary: Optional[str] = None,
+) -> Response:
+    """send_object dla pliku lokalnego (pochodne w THUMB_DIR)."""
+    return send_object(
+        request, os.stat(path).st_size, lambda start, length: _iter_file(path, start, length),
+        media_type, etag, cache_control, vary,
+    )
+
+
+def original_headers(key: str, info: ObjectInfo) -> Tuple[str, str]:
+    """(ETag, Cache-Control) dla oryginału: hash z klucza albo wersja obiektu."""
+    digest = content_hash(key)
+    if digest:
+        return f'"{digest}"', IMMUTABLE
+    return f'"{info.version}"', REVALIDATE
+
+
+def media_type_for(path: str) -> str:
+    return MEDIA_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
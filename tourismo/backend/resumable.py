@@ -0,0 +1,143 @@
+"""
+Upload wznawialny: init -> kolejne porcje (PATCH z Upload-Offset) -> finalize.
+
+Przerwane połączenie nie zeruje postępu: klient pyta o offset (GET)
+i wysyła dalej od miejsca, w którym serwer przestał odbierać.
+
+Stan sesji jest w podpisanym upload_id (użytkownik, rozmiar, rozszerzenie,
+opcjonalny SHA-256, ważność), a postęp to po prostu rozmiar pliku
+częściowego w RESUMABLE_DIR - bez tabeli w bazie. Przy wielu węzłach
+RESUMABLE_DIR musi być wspólnym wolumenem (albo ruch sticky per klient).
+"""
+import os
+import secrets
+import time
+from typing import BinaryIO, Optional
+
+try:  # blokada pliku między workerami; poza POSIX tylko w obrębie procesu
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+from auth import sign_claims, unsign_claims
+from storage import normalize_ext
+
+# --- konfiguracja
+# poza UPLOAD_DIR: niedokończone uploady nie mogą być dostępne pod /uploads
+RESUMABLE_DIR = os.getenv("RESUMABLE_DIR", "upload_partial")
+RESUMABLE_TTL_SEC = int(os.getenv("RESUMABLE_TTL_SEC", str(24 * 3600)))
+# sugerowana porcja dla klienta: mała, żeby zerwanie kosztowało niewiele
+RESUMABLE_CHUNK_SIZE = int(os.getenv("RESUMABLE_CHUNK_SIZE", str(256 * 1024)))
+
+TOKEN_TYPE = "resumable"
+_last_purge = 0.0
+
+
+class OffsetMismatch(Exception):
+    """Porcja nie zaczyna się tam, gdzie kończy się plik częściowy."""
+
+    def __init__(self, offset: int):
+        super().__init__(offset)
+        self.offset = offset
+
+
+class UploadBusy(Exception):
+    """Inne żądanie właśnie dopisuje do tego uploadu (np. ponowienie po timeoucie)."""
+
+
+def create(user_id: int, size: int, filename: Optional[str], sha256: Optional[str]) -> str:
+    """Nowa sesja uploadu -> upload_id (podpisany, ważny RESUMABLE_TTL_SEC)."""
+    os.makedirs(RESUMABLE_DIR, exist_ok=True)
+    return sign_claims({
+        "typ": TOKEN_TYPE,
+        "uid": user_id,
+        "id": secrets.token_hex(16),
+        "size": size,
+        "ext": normalize_ext(filename),
+        "sha256": sha256,
+        "exp": int(time.time()) + RESUMABLE_TTL_SEC,
+    })
+
+
+def claims_for(upload_id: str, user_id: int) -> Optional[dict]:
+    """Claims sesji albo None (obcy, wygasły lub sfałszowany upload_id)."""
+    claims = unsign_claims(upload_id)
+    if not claims or claims.get("typ") != TOKEN_TYPE or claims.get("uid") != user_id:
+        return None
+    return claims
+
+
+def partial_path(claims: dict) -> str:
+    # "id" to losowy hex z create() -> bezpieczna nazwa pliku
+    return os.path.join(RESUMABLE_DIR, claims["id"])
+
+
+def offset(claims: dict) -> int:
+    try:
+        return os.path.getsize(partial_path(claims))
+    except FileNotFoundError:
+        return 0
+
+
+def open_append(claims: dict, expected_offset: int) -> BinaryIO:
+    """
+    Plik częściowy ustawiony na `expected_offset`, na wyłączność do zamknięcia.
+    OffsetMismatch, gdy plik ma inny rozmiar; UploadBusy, gdy ktoś już dopisuje.
+    """
+    fd = os.open(partial_path(claims), os.O_RDWR | os.O_CREAT, 0o600)
+    f = os.fdopen(fd, "r+b")
+    try:
+        if fcntl is not None:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadBusy()
+        current = os.fstat(f.fileno()).st_size
+        if current != expected_offset:
+            raise OffsetMismatch(current)
+        f.seek(current)
+        return f
+    except BaseException:
+        f.close()
+        raise
+
+
+def open_complete(claims: dict) -> Optional[BinaryIO]:
+    """Kompletny plik częściowy do odczytu (finalize) albo None, gdy brakuje bajtów."""
+    if offset(claims) != claims["size"]:
+        return None
+    return open(partial_path(claims), "rb")
+
+
+def discard(claims: dict) -> None:
+    try:
+        os.remove(partial_path(claims))
+    except FileNotFoundError:
+        pass
+
+
+def purge_expired(now: Optional[float] = None) -> int:
+    """Usuwa porzucone pliki częściowe (starsze niż ważność upload_id)."""
+    cutoff = (now or time.time()) - RESUMABLE_TTL_SEC
+    removed = 0
+    try:
+        entries = list(os.scandir(RESUMABLE_DIR))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def maybe_purge() -> None:
+    """purge_expired() najwyżej raz na godzinę (wołane przy init)."""
+    global _last_purge
+    now = time.time()
+    if now - _last_purge >= 3600:
+        _last_purge = now
+        purge_expired(now)
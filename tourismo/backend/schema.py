@@ -0,0 +1,79 @@
+from sqlalchemy import inspect, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
+
+from geo import encode_geohash
+from models import metadata, posts, users
+
+BACKFILL_BATCH = 1000
+
+
+def ensure_schema(engine: Engine) -> None:
+    """
+    Idempotentny bootstrap schematu bez narzędzia do migracji:
+    - tworzy brakujące tabele,
+    - dokłada brakujące kolumny (tylko nullable / z wartością domyślną),
+    - dokłada brakujące indeksy (create_all pomija je dla istniejących tabel).
+    """
+    metadata.create_all(bind=engine)
+
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                name = engine.dialect.identifier_preparer.format_table(table)
+                conn.exec_driver_sql(f"ALTER TABLE {name} ADD COLUMN {ddl}")
+
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+def backfill_geohash(engine: Engine) -> int:
+    """Uzupełnia posts.geohash dla wierszy sprzed wprowadzenia kolumny (porcjami)."""
+    done = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(posts.c.id, posts.c.lat, posts.c.lon)
+                .where(posts.c.geohash.is_(None))
+                .where(posts.c.lat.is_not(None))
+                .where(posts.c.lon.is_not(None))
+                .limit(BACKFILL_BATCH)
+            ).all()
+            for row in rows:
+                conn.execute(
+                    update(posts)
+                    .where(posts.c.id == row.id)
+                    .values(geohash=encode_geohash(row.lat, row.lon))
+                )
+        done += len(rows)
+        if len(rows) < BACKFILL_BATCH:
+            return done
+
+
+def backfill_author(engine: Engine) -> int:
+    """Uzupełnia posts.author z users.email dla wierszy sprzed wprowadzenia kolumny."""
+    email = select(users.c.email).where(users.c.id == posts.c.user_id).scalar_subquery()
+    done = 0
+    last_id = 0
+    while True:
+        # postęp po id -> osierocony wiersz (brak usera) nie zapętla pętli
+        with engine.begin() as conn:
+            ids = conn.execute(
+                select(posts.c.id)
+                .where(posts.c.author.is_(None))
+                .where(posts.c.id > last_id)
+                .order_by(posts.c.id)
+                .limit(BACKFILL_BATCH)
+            ).scalars().all()
+            if ids:
+                conn.execute(update(posts).where(posts.c.id.in_(ids)).values(author=email))
+                last_id = ids[-1]
+        done += len(ids)
+        if len(ids) < BACKFILL_BATCH:
+            return done
@@ -0,0 +1,403 @@
+"""
+Magazyn zdjęć za wspólnym interfejsem (StorageBackend):
+- LocalStorage: katalog UPLOAD_DIR z kluczami shardowanymi po hashu,
+- S3Storage: dowolne S3-kompatybilne (AWS, MinIO; testy: moto), boto3 opcjonalne.
+Wybór: STORAGE_BACKEND=local|s3. Przy S3 bajty zdjęć mogą omijać API:
+klient wysyła je pod presigned URL, a pobiera przez przekierowanie.
+"""
+import base64
+import errno
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import BinaryIO, ContextManager, Dict, Iterator, Optional
+
+# --- konfiguracja
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local").lower()
+UPLOAD_DIR = os.getenv("UPLOAD_DIR", "uploads")
+# pliki w trakcie zapisu - poza UPLOAD_DIR, który jest serwowany publicznie
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR", "upload_tmp")
+S3_BUCKET = os.getenv("S3_BUCKET", "")
+S3_PREFIX = os.getenv("S3_PREFIX", "")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+# adres widziany przez klientów (np. MinIO za proxy); domyślnie S3_ENDPOINT_URL
+S3_PUBLIC_ENDPOINT_URL = os.getenv("S3_PUBLIC_ENDPOINT_URL") or None
+S3_REGION = os.getenv("S3_REGION") or None
+PRESIGN_TTL_SEC = int(os.getenv("PRESIGN_TTL_SEC", "900"))
+
+# dozwolone rozszerzenia -> rozszerzenie kanoniczne (ten sam plik = ten sam klucz)
+_EXTENSIONS = {
+    ".jpg": ".jpg",
+    ".jpeg": ".jpg",
+    ".png": ".png",
+    ".webp": ".webp",
+    ".heic": ".heic",
+}
+_DEFAULT_EXT = ".jpg"
+
+
+class UploadTooLarge(Exception):
+    """Plik przekracza MAX_UPLOAD_BYTES."""
+
+
+class ChecksumMismatch(Exception):
+    """Treść nie zgadza się z zadeklarowanym SHA-256 (upload bezpośredni)."""
+
+
+@dataclass(frozen=True)
+class StoredFile:
+    key: str        # klucz obiektu w magazynie, np. "ab/cd/<sha256>.jpg"
+    sha256: str
+    size: int
+    created: bool   # False -> identyczny plik już był (deduplikacja)
+
+
+def normalize_ext(filename: Optional[str]) -> str:
+    ext = os.path.splitext(filename or "")[1].lower()
+    return _EXTENSIONS.get(ext, _DEFAULT_EXT)
+
+
+def key_for(digest: str, ext: str) -> str:
+    """
+    Dwa poziomy shardów po 256 katalogów -> nawet przy milionach zdjęć
+    pojedynczy katalog ma kilkadziesiąt wpisów.
+    """
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{ext}"
+
+
+def save_stream(
+    src: BinaryIO,
+    upload_dir: str,
+    filename: Optional[str] = None,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    expected_sha256: Optional[str] = None,
+    tmp_dir: str = UPLOAD_TMP_DIR,
+) -> StoredFile:
+    """
+    Kopiuje strumień porcjami po CHUNK_SIZE do pliku tymczasowego w tmp_dir,
+    licząc SHA-256 w locie. Po przekroczeniu max_bytes przerywa (UploadTooLarge).
+    Plik trafia pod klucz wyznaczony przez hash; jeśli już istnieje,
+    kopia tymczasowa jest usuwana.
+    """
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"upload exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                out.write(chunk)
+
+        hexdigest = digest.hexdigest()
+        if expected_sha256 is not None and hexdigest != expected_sha256:
+            raise ChecksumMismatch(hexdigest)
+        key = key_for(hexdigest, normalize_ext(filename))
+        dest_path = os.path.join(upload_dir, key)
+        if os.path.exists(dest_path):
+            os.remove(tmp_path)
+            return StoredFile(key=key, sha256=hexdigest, size=size, created=False)
+
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        # mkstemp tworzy 0600 -> pliki serwowane przez StaticFiles muszą być czytelne
+        os.chmod(tmp_path, 0o644)
+        _move_into_place(tmp_path, dest_path)
+        return StoredFile(key=key, sha256=hexdigest, size=size, created=True)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _move_into_place(tmp_path: str, dest_path: str) -> None:
+    try:
+        os.replace(tmp_path, dest_path)  # atomowo w obrębie jednego systemu plików
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # UPLOAD_TMP_DIR na innym wolumenie (np. osobny mount w kontenerze):
+        # kopia obok celu pod losową nazwą z kropką (check_key jej nie przepuści),
+        # potem atomowy rename - czytelnik nigdy nie zobaczy połowy pliku
+        fd, staging = tempfile.mkstemp(dir=os.path.dirname(dest_path), prefix=".")
+        os.close(fd)
+        try:
+            shutil.copyfile(tmp_path, staging)
+            os.chmod(staging, 0o644)
+            os.replace(staging, dest_path)
+        except BaseException:
+            if os.path.exists(staging):
+                os.remove(staging)
+            raise
+        os.remove(tmp_path)
+
+
+def check_key(key: str) -> str:
+    """
+    Klucz względny bez ../, \\, ścieżek absolutnych i segmentów z kropką
+    na początku (pliki/katalogi robocze); ValueError w p.p.
+    """
+    if (
+        not key or key.startswith("/") or "\\" in key or "\x00" in key
+        or any(not part or part.startswith(".") for part in key.split("/"))
+    ):
+        raise ValueError("invalid key")
+    return key
+
+
+@dataclass(frozen=True)
+class ObjectInfo:
+    size: int
+    # identyfikator wersji dla kluczy nieadresowanych treścią (ETag)
+    version: str
+
+
+class StorageBackend(ABC):
+    """Interfejs magazynu; klucze to ścieżki względne ("ab/cd/<sha>.jpg")."""
+
+    @abstractmethod
+    def put_stream(
+        self, src: BinaryIO, filename: Optional[str] = None,
+        max_bytes: int = MAX_UPLOAD_BYTES, expected_sha256: Optional[str] = None,
+    ) -> StoredFile:
+        ...
+
+    @abstractmethod
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        ...
+
+    @abstractmethod
+    def iter_range(self, key: str, start: int, length: int) -> Iterator[bytes]:
+        ...
+
+    @abstractmethod
+    def local_copy(self, key: str) -> ContextManager[str]:
+        """Ścieżka lokalnego pliku z treścią (Pillow, EXIF); FileNotFoundError, gdy brak."""
+
+    @abstractmethod
+    def presign_upload(self, key: str, size: int, sha256: str, content_type: str) -> Dict[str, object]:
+        """{"method", "url", "headers"} do bezpośredniego wysłania pliku przez klienta."""
+
+    def presign_download(self, key: str) -> Optional[str]:
+        """URL do pobrania z pominięciem API; None = serwuje API."""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        base = os.path.realpath(self.root)
+        path = os.path.realpath(os.path.join(base, check_key(key)))
+        if not path.startswith(base + os.sep):
+            raise ValueError("invalid key")
+        return path
+
+    def put_stream(self, src, filename=None, max_bytes=MAX_UPLOAD_BYTES, expected_sha256=None):
+        return save_stream(src, self.root, filename, max_bytes, expected_sha256)
+
+    def stat(self, key):
+        try:
+            st = os.stat(self.path(key))
+        except (OSError, ValueError):
+            return None
+        # katalog shardu to nie zdjęcie (open() w iter_range i tak by się nie udał)
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        return ObjectInfo(size=st.st_size, version=f"{st.st_mtime_ns:x}-{st.st_size:x}")
+
+    def iter_range(self, key, start, length):
+        with open(self.path(key), "rb") as f:
+            f.seek(start)
+            remaining = length
+            while remaining > 0:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    @contextmanager
+    def local_copy(self, key):
+        path = self.path(key)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(key)
+        yield path
+
+    def presign_upload(self, key, size, sha256, content_type):
+        # bez zewnętrznego magazynu "presigned URL" wskazuje API: podpisany dla
+        # tego klucza, rozmiaru i hasha, ważny do "exp" (jak presigned PUT w S3).
+        # Ponowne użycie w tym czasie jest nieszkodliwe: treść musi mieć ten sam
+        # SHA-256, a klucz jest adresowany treścią -> najwyżej ten sam plik drugi raz
+        from auth import sign_claims
+
+        token = sign_claims({
+            "typ": "upload", "key": key, "size": size, "sha256": sha256,
+            "exp": int(time.time()) + PRESIGN_TTL_SEC,
+        })
+        return {"method": "PUT", "url": f"/api/upload/direct/{token}", "headers": {"Content-Type": content_type}}
+
+
+class S3Storage(StorageBackend):
+    def __init__(
+        self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+        public_endpoint_url: Optional[str] = None, region: Optional[str] = None,
+    ):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError as e:  # pragma: no cover
+            raise RuntimeError("STORAGE_BACKEND=s3 requires boto3 (pip install -r requirements-s3.txt)") from e
+        if not bucket:
+            raise RuntimeError("STORAGE_BACKEND=s3 requires S3_BUCKET")
+        config = Config(signature_version="s3v4", retries={"max_attempts": 5, "mode": "adaptive"})
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region, config=config)
+        # podpis obejmuje host -> osobny klient dla adresu publicznego
+        self.presigner = (
+            boto3.client("s3", endpoint_url=public_endpoint_url, region_name=region, config=config)
+            if public_endpoint_url else self.client
+        )
+
+    def _object_key(self, key: str) -> str:
+        return self.prefix + check_key(key)
+
+    def _is_missing(self, e: Exception) -> bool:
+        code = getattr(e, "response", {}).get("Error", {}).get("Code")
+        return code in ("404", "NoSuchKey", "NotFound")
+
+    def put_stream(self, src, filename=None, max_bytes=MAX_UPLOAD_BYTES, expected_sha256=None):
+        # klucz = hash treści, więc najpierw lokalny bufor (na dysku, nie w RAM),
+        # potem upload_fileobj - multipart porcjami, bez całego pliku w pamięci
+        digest = hashlib.sha256()
+        size = 0
+        with tempfile.TemporaryFile() as spool:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"upload exceeds {max_bytes} bytes")
+                digest.update(chunk)
+                spool.write(chunk)
+            hexdigest = digest.hexdigest()
+            if expected_sha256 is not None and hexdigest != expected_sha256:
+                raise ChecksumMismatch(hexdigest)
+            key = key_for(hexdigest, normalize_ext(filename))
+            if self.stat(key) is not None:
+                return StoredFile(key=key, sha256=hexdigest, size=size, created=False)
+            spool.seek(0)
+            self.client.upload_fileobj(
+                spool, self.bucket, self._object_key(key),
+                ExtraArgs={"ContentType": _content_type(key)},
+            )
+        return StoredFile(key=key, sha256=hexdigest, size=size, created=True)
+
+    def stat(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as e:
+            if self._is_missing(e):
+                return None
+            raise
+        except ValueError:
+            return None
+        return ObjectInfo(size=int(head["ContentLength"]), version=head.get("ETag", "").strip('"'))
+
+    def iter_range(self, key, start, length):
+        if length <= 0:
+            return
+        obj = self.client.get_object(
+            Bucket=self.bucket, Key=self._object_key(key), Range=f"bytes={start}-{start + length - 1}",
+        )
+        yield from obj["Body"].iter_chunks(CHUNK_SIZE)
+
+    @contextmanager
+    def local_copy(self, key):
+        from botocore.exceptions import ClientError
+
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(key)[1]) as tmp:
+            try:
+                self.client.download_fileobj(self.bucket, self._object_key(key), tmp)
+            except ClientError as e:
+                if self._is_missing(e):
+                    raise FileNotFoundError(key) from e
+                raise
+            tmp.flush()
+            yield tmp.name
+
+    def presign_upload(self, key, size, sha256, content_type):
+        # S3 sprawdza x-amz-checksum-sha256 -> pod kluczem z hashem nie wyląduje inna treść
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode("ascii")
+        url = self.presigner.generate_presigned_url(
+            "put_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self._object_key(key),
+                "ContentType": content_type,
+                "ContentLength": size,
+                "ChecksumSHA256": checksum,
+            },
+            ExpiresIn=PRESIGN_TTL_SEC,
+        )
+        return {
+            "method": "PUT",
+            "url": url,
+            "headers": {"Content-Type": content_type, "x-amz-checksum-sha256": checksum},
+        }
+
+    def presign_download(self, key):
+        return self.presigner.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": self._object_key(key)},
+            ExpiresIn=PRESIGN_TTL_SEC,
+        )
+
+
+_CONTENT_TYPES = {".jpg": "image/jpeg", ".png": "image/png", ".webp": "image/webp", ".heic": "image/heic"}
+
+
+def _content_type(key: str) -> str:
+    return _CONTENT_TYPES.get(os.path.splitext(key)[1].lower(), "application/octet-stream")
+
+
+_backend: Optional[StorageBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_backend() -> StorageBackend:
+    """Magazyn wg STORAGE_BACKEND; jeden na proces (także w procesach miniatur)."""
+    global _backend
+    if _backend is not None:
+        return _backend
+    with _backend_lock:
+        if _backend is None:
+            if STORAGE_BACKEND == "s3":
+                _backend = S3Storage(
+                    S3_BUCKET, S3_PREFIX, S3_ENDPOINT_URL, S3_PUBLIC_ENDPOINT_URL, S3_REGION,
+                )
+            elif STORAGE_BACKEND == "local":
+                _backend = LocalStorage(UPLOAD_DIR)
+            else:
+                raise RuntimeError(f"unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+        return _backend
@@ -0,0 +1,59 @@
+"""
+Testy backendu: pip install -r requirements.txt -r requirements-test.txt,
+potem python -m pytest tests. Moduły są płaskie (uruchamiane z katalogu
+backend), więc katalog backend trafia na sys.path. Konfiguracja z env
+czytana jest przy imporcie -> ustawiamy ją, zanim coś zaimportuje db/storage.
+Baza: SQLite w katalogu tymczasowym (ten sam stand-in co w bench.py).
+"""
+import io
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_TMP = tempfile.mkdtemp(prefix="tourismo-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_TMP}/test.db",
+    "DB_ASYNC": "0",
+    "DB_REPLICA_URLS": "",
+    "STORAGE_BACKEND": "local",
+    "UPLOAD_DIR": os.path.join(_TMP, "uploads"),
+    "UPLOAD_TMP_DIR": os.path.join(_TMP, "upload_tmp"),
+    "RESUMABLE_DIR": os.path.join(_TMP, "upload_partial"),
+    "THUMB_DIR": os.path.join(_TMP, "thumbs"),
+    "SESSION_SECRET": "test-secret",
+    "PASSWORD_HASH_METHOD": "pbkdf2:sha256:1000",
+    "ADMISSION_ENABLED": "0",
+    "METRICS_ENABLED": "0",
+})
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    """TestClient aplikacji z zalogowanym użytkownikiem (nagłówek Authorization)."""
+    from fastapi.testclient import TestClient
+
+    import app as app_module
+
+    with TestClient(app_module.app) as c:
+        c.post("/api/register", data={"email": "test@example.com", "password": "secret"})
+        token = c.post("/api/login", data={"email": "test@example.com", "password": "secret"}).json()["token"]
+        c.headers["Authorization"] = f"Bearer {token}"
+        yield c
+
+
+@pytest.fixture
+def jpeg_bytes():
+    """Mały, za każdym razem inny JPEG (inna treść = inny klucz w magazynie)."""
+    from PIL import Image
+
+    def make() -> bytes:
+        buf = io.BytesIO()
+        Image.effect_noise((16, 16), 64).convert("RGB").save(buf, "JPEG")
+        return buf.getvalue() + os.urandom(8)
+
+    return make
@@ -0,0 +1,69 @@
+import pytest
+from fastapi import FastAPI, Form
+from fastapi.testclient import TestClient
+
+from admission import AdmissionMiddleware, ConcurrencyLimiter, RouteClass, TokenBucket
+
+
+def _auth_app():
+    app = FastAPI()
+
+    @app.post("/api/login")
+    async def login(email: str = Form(...), password: str = Form(...)):
+        return {"email": email, "password": password}
+
+    route = RouteClass(
+        "auth", ("POST",), ("/api/login",), ConcurrencyLimiter(4, 4), TokenBucket.parse("2/60"),
+        key_by_email=True,
+    )
+    app.add_middleware(AdmissionMiddleware, classes=[route])
+    return app
+
+
+def test_auth_rate_is_per_email_not_per_shared_ip():
+    with TestClient(_auth_app()) as c:
+        # wielu użytkowników za jednym adresem (NAT, proxy)
+        for i in range(10):
+            r = c.post("/api/login", data={"email": f"user{i}@example.com", "password": "x"})
+            assert r.status_code == 200
+            # ciało przeczytane przez middleware dociera do endpointu bez zmian
+            assert r.json() == {"email": f"user{i}@example.com", "password": "x"}
+
+
+def test_auth_rate_limits_one_email():
+    with TestClient(_auth_app()) as c:
+        codes = [
+            c.post("/api/login", data={"email": "Victim@Example.com ", "password": str(i)}).status_code
+            for i in range(3)
+        ]
+        assert codes == [200, 200, 429]
+        r = c.post("/api/login", data={"email": "victim@example.com", "password": "x"})
+        assert r.status_code == 429
+        assert int(r.headers["retry-after"]) >= 1
+
+
+def test_auth_rate_falls_back_to_ip_for_other_bodies():
+    with TestClient(_auth_app()) as c:
+        codes = [
+            c.post("/api/login", files={"email": (None, f"u{i}@x"), "password": (None, "x")}).status_code
+            for i in range(3)
+        ]
+    assert codes == [200, 200, 429]
+
+
+def test_token_bucket(monkeypatch):
+    import admission
+
+    now = [0.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    bucket = TokenBucket.parse("2/10")  # 2 żądania, pełne odnowienie w 10 s
+    assert bucket.take("u") is None
+    assert bucket.take("u") is None
+    assert bucket.take("u") == pytest.approx(5.0)
+    assert bucket.take("other") is None  # osobny kubełek
+    now[0] += 5
+    assert bucket.take("u") is None
+
+
+def test_token_bucket_parse_empty():
+    assert TokenBucket.parse("") is None
@@ -0,0 +1,59 @@
+from cache import ResponseCache, is_not_modified
+
+
+def test_response_cache_lru_and_etag():
+    cache = ResponseCache(max_entries=2, ttl=60)
+    a = cache.put("a", b"A")
+    cache.put("b", b"B")
+    assert cache.get("a") is a  # "a" teraz najświeższy
+    cache.put("c", b"C")
+    assert cache.get("b") is None
+    assert cache.get("a").body == b"A"
+    assert a.etag.startswith('"') and a.etag.endswith('"')
+
+
+def test_response_cache_ttl(monkeypatch):
+    import cache as cache_module
+
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(ttl=30)
+    cache.put("k", b"x")
+    now[0] += 31
+    assert cache.get("k") is None
+
+
+def test_response_cache_skips_put_after_invalidation():
+    cache = ResponseCache()
+    generation = cache.generation()
+    cache.invalidate()  # upload w trakcie liczenia strony
+    entry = cache.put("k", b"stale", generation)
+    assert entry.body == b"stale"
+    assert cache.get("k") is None
+
+
+def test_response_cache_keeps_last_modified_for_same_body():
+    cache = ResponseCache()
+    first = cache.put("k", b"same")
+    again = cache.put("k", b"same")
+    assert again.last_modified == first.last_modified
+
+
+def test_is_not_modified():
+    entry = ResponseCache().put("k", b"body")
+    assert is_not_modified(entry, entry.etag, None)
+    assert is_not_modified(entry, "W/" + entry.etag, None)
+    assert is_not_modified(entry, '"other", ' + entry.etag, None)
+    assert not is_not_modified(entry, '"other"', None)
+    assert is_not_modified(entry, None, entry.headers["Last-Modified"])
+    assert not is_not_modified(entry, None, "Thu, 01 Jan 1970 00:00:00 GMT")
+
+
+def test_feed_revalidates_and_invalidates_on_upload(client, jpeg_bytes):
+    first = client.get("/api/feed")
+    etag = first.headers["ETag"]
+    assert client.get("/api/feed", headers={"If-None-Match": etag}).status_code == 304
+    client.post("/api/upload", files={"file": ("a.jpg", jpeg_bytes(), "image/jpeg")})
+    fresh = client.get("/api/feed", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.headers["ETag"] != etag
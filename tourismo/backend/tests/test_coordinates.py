@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from geo import valid_coordinates
+
+
+@pytest.mark.parametrize("lat, lon, ok", [
+    (None, None, True),
+    (49.2, 19.9, True),
+    (-90, -180, True),
+    (90, 180, True),
+    (float("nan"), 19.9, False),
+    (49.2, float("inf"), False),
+    (1e300, 0.0, False),
+    (0.0, -999, False),
+    (90.0001, 0.0, False),
+])
+def test_valid_coordinates(lat, lon, ok):
+    assert valid_coordinates(lat, lon) is ok
+
+
+BAD = [("nan", "19.9"), ("inf", "19.9"), ("1e300", "-999"), ("91", "0"), ("0", "180.5")]
+
+
+@pytest.mark.parametrize("lat, lon", BAD)
+def test_upload_rejects_bad_coordinates(client, jpeg_bytes, lat, lon):
+    r = client.post(
+        "/api/upload", data={"lat": lat, "lon": lon}, files={"file": ("a.jpg", jpeg_bytes(), "image/jpeg")},
+    )
+    assert r.status_code == 422
+
+
+@pytest.mark.parametrize("lat, lon", BAD)
+def test_commit_rejects_bad_coordinates(client, lat, lon):
+    r = client.post("/api/upload/commit", data={"key": "ab/cd/" + "0" * 64 + ".jpg", "lat": lat, "lon": lon})
+    assert r.status_code == 422
+
+
+def test_batch_rejects_bad_coordinates_per_item(client, jpeg_bytes):
+    meta = [{"lat": 49.2, "lon": 19.9}, {"lat": "nan", "lon": 1}, {"lat": 1e300, "lon": -999}]
+    r = client.post(
+        "/api/upload/batch",
+        data={"meta": json.dumps(meta)},
+        files=[("files", ("a.jpg", jpeg_bytes(), "image/jpeg")) for _ in meta],
+    )
+    assert r.status_code == 200
+    items = r.json()["items"]
+    assert [item["ok"] for item in items] == [True, False, False]
+    assert items[1]["error"] == "Nieprawidłowe współrzędne."
+    assert items[1]["status"] == 422
+
+
+def test_upload_accepts_valid_coordinates(client, jpeg_bytes):
+    r = client.post(
+        "/api/upload", data={"lat": "-90", "lon": "180"}, files={"file": ("a.jpg", jpeg_bytes(), "image/jpeg")},
+    )
+    assert r.status_code == 200
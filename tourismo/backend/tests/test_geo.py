@@ -0,0 +1,122 @@
+import random
+
+import pytest
+
+from geo import (
+    GEOHASH_PRECISION, bounding_box, cover_bbox, encode_geohash, geohash_or_none, haversine_km,
+)
+
+
+def _covered(geohash, ranges):
+    return any(geohash >= lo and (hi is None or geohash < hi) for lo, hi in ranges)
+
+
+def test_encode_geohash_reference_value():
+    # przykład z opisu algorytmu (Wikipedia / geohash.org)
+    assert encode_geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert encode_geohash(0.0, 0.0, 1) == "s"
+    assert len(encode_geohash(50.06, 19.94)) == GEOHASH_PRECISION
+
+
+def test_geohash_or_none_needs_both_coordinates():
+    assert geohash_or_none(None, 19.9) is None
+    assert geohash_or_none(49.2, None) is None
+    assert geohash_or_none(49.2, 19.9) == encode_geohash(49.2, 19.9)
+
+
+def test_cover_bbox_ranges_are_sorted_and_bounded():
+    ranges = cover_bbox(*bounding_box(49.3, 19.95, 5.0))
+    assert 1 <= len(ranges) <= 16
+    assert ranges == sorted(ranges)
+    for lo, hi in ranges:
+        assert hi is None or lo < hi
+
+
+@pytest.mark.parametrize("lat, lon, radius_km", [
+    (49.3, 19.95, 5.0),      # Tatry
+    (0.0, 0.0, 1.0),         # przecięcie równika i południka 0
+    (-33.86, 151.2, 50.0),
+    (89.95, 10.0, 20.0),     # okolice bieguna -> bbox na całą długość
+])
+def test_cover_bbox_contains_every_point_in_bbox(lat, lon, radius_km):
+    south, west, north, east = bounding_box(lat, lon, radius_km)
+    ranges = cover_bbox(south, west, north, east)
+    rng = random.Random(1)
+    for _ in range(500):
+        p_lat = rng.uniform(south, north)
+        p_lon = rng.uniform(max(west, -180.0), min(east, 180.0))
+        assert _covered(encode_geohash(p_lat, p_lon), ranges), (p_lat, p_lon)
+
+
+def test_cover_bbox_across_antimeridian():
+    # bbox wychodzi poza -180 -> komórki po obu stronach południka 180°
+    south, west, north, east = bounding_box(-17.0, -179.95, 20.0)
+    assert west < -180.0
+    ranges = cover_bbox(south, west, north, east)
+    assert _covered(encode_geohash(-17.0, 179.9), ranges)
+    assert _covered(encode_geohash(-17.0, -179.9), ranges)
+    assert not _covered(encode_geohash(-17.0, 0.0), ranges)
+
+
+def test_cover_bbox_full_longitude_band_stays_bounded():
+    # pas na całą długość przez granicę komórek precyzji 1 -> bez ("", None) na cały indeks
+    ranges = cover_bbox(44.0, -180.0, 46.0, 180.0)
+    assert all(lo for lo, _ in ranges)
+    assert len(ranges) < 16
+    rng = random.Random(2)
+    for _ in range(500):
+        p_lat, p_lon = rng.uniform(44.0, 46.0), rng.uniform(-180.0, 180.0)
+        assert _covered(encode_geohash(p_lat, p_lon), ranges), (p_lat, p_lon)
+    assert not _covered(encode_geohash(-10.0, 0.0), ranges)
+
+
+def test_haversine_km():
+    assert haversine_km(50.0, 19.0, 50.0, 19.0) == 0.0
+    # 1° szerokości ~ 111.2 km
+    assert haversine_km(0.0, 0.0, 1.0, 0.0) == pytest.approx(111.19, abs=0.05)
+    # przez południk 180° odległość jest krótka, a nie ~ obwód Ziemi
+    assert haversine_km(-17.0, 179.9, -17.0, -179.9) < 25
+
+
+def _upload(client, jpeg_bytes, lat, lon):
+    r = client.post(
+        "/api/upload", data={"lat": lat, "lon": lon}, files={"file": ("a.jpg", jpeg_bytes(), "image/jpeg")},
+    )
+    assert r.status_code == 200, r.text
+    return r.json()["photo_url"]
+
+
+def test_nearby_filters_by_bbox_and_distance(client, jpeg_bytes):
+    near = _upload(client, jpeg_bytes, 49.2001, 19.9001)
+    far = _upload(client, jpeg_bytes, 49.5, 19.9)  # ~33 km na północ
+    r = client.get("/api/posts/nearby", params={"lat": 49.2, "lon": 19.9, "radius_km": 5})
+    assert r.status_code == 200
+    urls = [item["photo_url"] for item in r.json()["items"]]
+    assert near in urls
+    assert far not in urls
+    assert all(item["distance_km"] <= 5 for item in r.json()["items"])
+
+
+def test_nearby_across_antimeridian(client, jpeg_bytes):
+    east_side = _upload(client, jpeg_bytes, -17.0, 179.95)
+    west_side = _upload(client, jpeg_bytes, -17.0, -179.95)
+    r = client.get("/api/posts/nearby", params={"lat": -17.0, "lon": -179.99, "radius_km": 20})
+    urls = [item["photo_url"] for item in r.json()["items"]]
+    assert east_side in urls and west_side in urls
+
+
+def test_nearby_rejects_out_of_range_query(client):
+    assert client.get("/api/posts/nearby", params={"lat": 91, "lon": 0}).status_code == 422
+    assert client.get("/api/posts/nearby", params={"lat": 0, "lon": 181}).status_code == 422
+
+
+def test_nearby_ranks_across_antimeridian(client, jpeg_bytes):
+    # więcej kandydatów po tej samej stronie niż limit * NEARBY_CANDIDATE_FACTOR;
+    # najbliższy jest po drugiej stronie południka 180°
+    from app import NEARBY_CANDIDATE_FACTOR
+
+    for i in range(NEARBY_CANDIDATE_FACTOR + 2):
+        _upload(client, jpeg_bytes, -40.0 + i * 0.001, 179.9)
+    nearest = _upload(client, jpeg_bytes, -40.0, -179.995)
+    r = client.get("/api/posts/nearby", params={"lat": -40.0, "lon": 179.995, "radius_km": 20, "limit": 1})
+    assert [item["photo_url"] for item in r.json()["items"]] == [nearest]
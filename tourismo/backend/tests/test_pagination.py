@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table, create_engine, insert, select
+from sqlalchemy.dialects import mysql, postgresql
+
+from pagination import decode_cursor, encode_cursor, keyset_before
+
+_metadata = MetaData()
+items = Table(
+    "items", _metadata,
+    Column("id", Integer, primary_key=True),
+    Column("created_at", DateTime, nullable=False),
+)
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    cursor = encode_cursor(created_at, 42)
+    assert "=" not in cursor  # bez paddingu -> bezpieczny w query string
+    assert decode_cursor(cursor) == (created_at, 42)
+
+
+@pytest.mark.parametrize("cursor", ["", "not-base64!", "WzFd", encode_cursor(datetime(2024, 1, 1), 1)[:-3]])
+def test_decode_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_keyset_before_without_cursor():
+    assert keyset_before(items.c.created_at, items.c.id, None) is None
+    assert keyset_before(items.c.created_at, items.c.id, "") is None
+
+
+@pytest.mark.parametrize("dialect", [postgresql.dialect(), mysql.dialect()])
+def test_keyset_before_has_index_range_bound(dialect):
+    cursor = encode_cursor(datetime(2024, 1, 1), 7)
+    sql = str(keyset_before(items.c.created_at, items.c.id, cursor).compile(dialect=dialect))
+    # granica zakresu dla indeksu (created_at, id) - poza OR-em
+    assert sql.startswith("items.created_at <=")
+    assert " OR " in sql
+
+
+def test_keyset_pages_cover_all_rows_with_ties():
+    engine = create_engine("sqlite://")
+    _metadata.create_all(engine)
+    base = datetime(2024, 1, 1)
+    # po 3 wiersze z tym samym created_at -> granica strony w środku remisu
+    rows = [{"id": i, "created_at": base + timedelta(seconds=i // 3)} for i in range(1, 23)]
+    with engine.begin() as conn:
+        conn.execute(insert(items), rows)
+
+    order = (items.c.created_at.desc(), items.c.id.desc())
+    seen, cursor = [], None
+    with engine.connect() as conn:
+        while True:
+            stmt = select(items).order_by(*order).limit(4)
+            before = keyset_before(items.c.created_at, items.c.id, cursor)
+            if before is not None:
+                stmt = stmt.where(before)
+            page = conn.execute(stmt).all()
+            if not page:
+                break
+            seen.extend(row.id for row in page)
+            cursor = encode_cursor(page[-1].created_at, page[-1].id)
+        expected = [row.id for row in conn.execute(select(items).order_by(*order))]
+    assert seen == expected
+
+
+def test_feed_rejects_invalid_cursor(client):
+    assert client.get("/api/feed", params={"cursor": "garbage"}).status_code == 400
@@ -0,0 +1,41 @@
+import pytest
+
+from photos import _parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),       # sufiks dłuższy niż plik -> całość
+    ("bytes=900-5000", (900, 999)),  # koniec przycięty do rozmiaru
+    ("bytes=0-0", (0, 0)),
+])
+def test_parse_range(header, expected):
+    assert _parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["items=0-1", "bytes=0-1,5-6"])
+def test_parse_range_ignored(header):
+    assert _parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=5-1", "bytes=-0", "bytes=a-b"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(ValueError):
+        _parse_range(header, 1000)
+
+
+def test_photo_range_and_validators(client, jpeg_bytes):
+    body = jpeg_bytes()
+    url = client.post("/api/upload", files={"file": ("a.jpg", body, "image/jpeg")}).json()["photo_url"]
+    full = client.get(url)
+    assert full.content == body
+    assert "immutable" in full.headers["Cache-Control"]
+    etag = full.headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+    part = client.get(url, headers={"Range": "bytes=0-9"})
+    assert part.status_code == 206
+    assert part.content == body[:10]
+    assert part.headers["Content-Range"] == f"bytes 0-9/{len(body)}"
+    assert client.get(url, headers={"Range": f"bytes={len(body)}-"}).status_code == 416
@@ -0,0 +1,97 @@
+import hashlib
+import io
+
+import pytest
+
+pytest.importorskip("boto3")
+moto = pytest.importorskip("moto")
+
+from storage import S3Storage  # noqa: E402
+
+BUCKET = "tourismo-test"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    # moto: S3 w pamięci, bez sieci; fałszywe poświadczenia, żeby boto3 nie szukał prawdziwych
+    for name, value in {
+        "AWS_ACCESS_KEY_ID": "testing", "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_SESSION_TOKEN": "testing", "AWS_DEFAULT_REGION": "us-east-1",
+    }.items():
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        store = S3Storage(BUCKET, prefix="photos", region="us-east-1")
+        store.client.create_bucket(Bucket=BUCKET)
+        yield store
+
+
+def test_put_stream_is_content_addressed(s3):
+    stored = s3.put_stream(io.BytesIO(b"photo"), "a.JPG")
+    assert stored.created
+    assert stored.sha256 == hashlib.sha256(b"photo").hexdigest()
+    assert stored.key.endswith(".jpg")
+    head = s3.client.head_object(Bucket=BUCKET, Key="photos/" + stored.key)
+    assert head["ContentType"] == "image/jpeg"
+    # ta sama treść -> ten sam klucz, bez drugiego uploadu
+    again = s3.put_stream(io.BytesIO(b"photo"), "b.jpg")
+    assert again.key == stored.key and not again.created
+
+
+def test_put_stream_limits(s3):
+    from storage import ChecksumMismatch, UploadTooLarge
+
+    with pytest.raises(UploadTooLarge):
+        s3.put_stream(io.BytesIO(b"x" * 10), "a.jpg", max_bytes=5)
+    with pytest.raises(ChecksumMismatch):
+        s3.put_stream(io.BytesIO(b"photo"), "a.jpg", expected_sha256="0" * 64)
+
+
+def test_stat(s3):
+    stored = s3.put_stream(io.BytesIO(b"photo"), "a.jpg")
+    info = s3.stat(stored.key)
+    assert info.size == 5 and info.version
+    assert s3.stat("00/00/" + "0" * 64 + ".jpg") is None
+    assert s3.stat("../x.jpg") is None
+
+
+def test_iter_range(s3):
+    stored = s3.put_stream(io.BytesIO(b"0123456789"), "a.jpg")
+    assert b"".join(s3.iter_range(stored.key, 2, 5)) == b"23456"
+    assert b"".join(s3.iter_range(stored.key, 0, 0)) == b""
+
+
+def test_local_copy(s3):
+    stored = s3.put_stream(io.BytesIO(b"photo"), "a.jpg")
+    with s3.local_copy(stored.key) as path:
+        assert path.endswith(".jpg")
+        with open(path, "rb") as f:
+            assert f.read() == b"photo"
+    with pytest.raises(FileNotFoundError):
+        with s3.local_copy("00/00/" + "0" * 64 + ".jpg"):
+            pass
+
+
+def test_presigned_upload_and_commit(s3, client, jpeg_bytes, monkeypatch):
+    import requests
+
+    import storage
+
+    monkeypatch.setattr(storage, "_backend", s3)
+    body = jpeg_bytes()
+    sha256 = hashlib.sha256(body).hexdigest()
+    presign = client.post("/api/upload/presign", data={"sha256": sha256, "size": len(body), "filename": "a.jpg"}).json()
+    assert presign["exists"] is False
+    upload = presign["upload"]
+    assert upload["url"].startswith("https://")
+
+    # przed PUT-em nie ma czego zatwierdzić
+    assert client.post("/api/upload/commit", data={"key": presign["key"]}).status_code == 409
+    # sprawdzenie treści robi S3 (moto go nie emuluje) -> tu tylko, że checksum jest podpisany
+    assert "x-amz-checksum-sha256" in upload["url"]
+    assert requests.put(upload["url"], data=body, headers=upload["headers"]).status_code == 200
+
+    r = client.post("/api/upload/commit", data={"key": presign["key"]})
+    assert r.status_code == 200
+    assert s3.stat(presign["key"]).size == len(body)
+    again = client.post("/api/upload/presign", data={"sha256": sha256, "size": len(body), "filename": "a.jpg"})
+    assert again.json()["exists"] is True
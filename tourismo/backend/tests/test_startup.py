@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_has_no_side_effects(tmp_path):
+    # import app: bez tworzenia katalogów magazynu i bez części async SQLAlchemy (DB_ASYNC=0)
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp_path}/t.db",
+        "UPLOAD_DIR": str(tmp_path / "uploads"),
+        "THUMB_DIR": str(tmp_path / "thumbs"),
+    }
+    code = "import sys, app; print('sqlalchemy.ext.asyncio' in sys.modules)"
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    assert out.stdout.strip() == "False"
+    assert not (tmp_path / "uploads").exists()
+    assert not (tmp_path / "thumbs").exists()
+
+
+def test_import_requires_session_secret(tmp_path):
+    # losowy klucz per proces rozjechałby tokeny między workerami -> brak startu
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{tmp_path}/t.db", "SESSION_SECRET": ""}
+    out = subprocess.run([sys.executable, "-c", "import app"], cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    assert out.returncode != 0
+    assert "SESSION_SECRET is required" in out.stderr
+
+
+def test_bootstrap_report(client):
+    import bootstrap
+    import db
+
+    report = bootstrap.run(db.engine)
+    assert report["schema"] == "current"
+    assert report["preboot_cpu_s"] > 0
+    assert "import_s" not in report
@@ -0,0 +1,122 @@
+import io
+
+import pytest
+
+from storage import LocalStorage, check_key
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStorage(str(tmp_path / "uploads"))
+
+
+def test_stat_regular_file(store):
+    stored = store.put_stream(io.BytesIO(b"photo"), "a.jpg")
+    info = store.stat(stored.key)
+    assert info is not None and info.size == 5
+
+
+def test_stat_directory_is_missing(store):
+    stored = store.put_stream(io.BytesIO(b"photo"), "a.jpg")
+    shard = stored.key.split("/")[0]
+    assert store.stat(shard) is None
+    assert store.stat(stored.key.rsplit("/", 1)[0]) is None
+
+
+@pytest.mark.parametrize("key", [
+    "", "/etc/passwd", "../x.jpg", "a/../../x", "a\\b", "a//b", "a/./b", ".partial/abc", "ab/.tmp", ".x.jpg",
+])
+def test_check_key_rejects_unsafe_keys(key):
+    with pytest.raises(ValueError):
+        check_key(key)
+
+
+def test_photo_route_does_not_serve_directories(client, jpeg_bytes):
+    key = client.post("/api/upload", files={"file": ("a.jpg", jpeg_bytes(), "image/jpeg")}).json()["photo_url"]
+    key = key[len("/api/photos/"):]
+    assert client.get(f"/api/photos/{key}").status_code == 200
+    assert client.get(f"/api/photos/{key.split('/')[0]}").status_code == 404
+    assert client.get(f"/api/photos/{key.rsplit('/', 1)[0]}").status_code == 404
+
+
+def test_storage_backend_is_abstract():
+    from storage import StorageBackend
+
+    with pytest.raises(TypeError):
+        StorageBackend()
+
+    class Partial(StorageBackend):
+        def stat(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_presigned_local_upload(client, jpeg_bytes):
+    import hashlib
+
+    body = jpeg_bytes()
+    sha256 = hashlib.sha256(body).hexdigest()
+    presign = client.post("/api/upload/presign", data={"sha256": sha256, "size": len(body), "filename": "a.jpg"}).json()
+    assert presign["exists"] is False
+    url = presign["upload"]["url"]
+    assert client.put(url, content=body).status_code == 200
+    # link ważny do "exp"; ponowienie tej samej treści niczego nie psuje
+    assert client.put(url, content=body).status_code == 200
+    assert client.put(url, content=body[:-1] + b"x").status_code == 400
+    r = client.post("/api/upload/commit", data={"key": presign["key"]})
+    assert r.status_code == 200
+
+
+def test_temp_files_stay_outside_upload_dir(tmp_path):
+    from storage import save_stream
+
+    root, tmp_dir = tmp_path / "uploads", tmp_path / "tmp"
+    stored = save_stream(io.BytesIO(b"photo"), str(root), "a.jpg", tmp_dir=str(tmp_dir))
+    assert (root / stored.key).read_bytes() == b"photo"
+    assert sorted(p.name for p in root.iterdir()) == [stored.key.split("/")[0]]
+    assert list(tmp_dir.iterdir()) == []
+
+
+def test_save_stream_across_filesystems(tmp_path, monkeypatch):
+    import errno
+    import os
+
+    import storage
+
+    real_replace = os.replace
+
+    def replace(src, dst):
+        # rename z katalogu tymczasowego na inny wolumen -> EXDEV
+        if os.path.dirname(src) == str(tmp_path / "tmp"):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        real_replace(src, dst)
+
+    monkeypatch.setattr(storage.os, "replace", replace)
+    stored = storage.save_stream(io.BytesIO(b"photo"), str(tmp_path / "uploads"), "a.jpg", tmp_dir=str(tmp_path / "tmp"))
+    dest = tmp_path / "uploads" / stored.key
+    assert dest.read_bytes() == b"photo"
+    assert oct(dest.stat().st_mode & 0o777) == "0o644"
+    assert list((tmp_path / "tmp").iterdir()) == []
+    assert [p.name for p in dest.parent.iterdir()] == [dest.name]
+
+
+def test_partial_uploads_are_not_public(client):
+    import os
+
+    import resumable
+    from storage import UPLOAD_DIR
+
+    init = client.post("/api/upload/resumable", data={"size": 10, "filename": "a.jpg"}).json()
+    r = client.patch(
+        f"/api/upload/resumable/{init['upload_id']}", content=b"12345", headers={"Upload-Offset": "0"},
+    )
+    assert r.json()["offset"] == 5
+    partial = os.listdir(resumable.RESUMABLE_DIR)
+    assert partial
+    assert not os.path.realpath(resumable.RESUMABLE_DIR).startswith(os.path.realpath(UPLOAD_DIR) + os.sep)
+    for name in partial:
+        assert client.get(f"/api/photos/.partial/{name}").status_code == 404
+        assert client.get(f"/uploads/.partial/{name}").status_code == 404
+    assert client.get("/api/photos/.tmp").status_code == 404
@@ -0,0 +1,23 @@
+from thumbnails import THUMB_FORMATS, THUMB_SIZES, THUMB_VERSION, thumb_url_template
+
+
+def test_thumb_url_template():
+    key = "ab/cd/" + "f" * 64 + ".jpg"
+    template = thumb_url_template(key)
+    assert template == f"/api/thumbs/{{size}}/{{format}}/{key}?v={THUMB_VERSION}"
+
+
+def test_feed_item_carries_single_thumb_template(client, jpeg_bytes):
+    client.post("/api/upload", files={"file": ("a.jpg", jpeg_bytes(), "image/jpeg")})
+    item = client.get("/api/feed", params={"limit": 1}).json()["items"][0]
+    assert "thumbs" not in item
+    template = item["thumb"]
+    assert item["photo"] in template
+
+    size, fmt = next(iter(THUMB_SIZES)), next(iter(THUMB_FORMATS))
+    r = client.get(template.replace("{size}", size).replace("{format}", fmt))
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("image/")
+    # bez segmentu formatu -> negocjacja po Accept
+    r = client.get(template.replace("{size}", size).replace("{format}/", ""), headers={"Accept": "image/webp"})
+    assert r.headers["content-type"] == "image/webp"
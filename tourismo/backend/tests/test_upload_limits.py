@@ -0,0 +1,76 @@
+from fastapi import FastAPI, File, Request, UploadFile
+from fastapi.testclient import TestClient
+
+from admission import BodySizeLimitMiddleware
+from storage import MAX_UPLOAD_BYTES
+
+LIMIT = 1024
+
+
+def _limited_app():
+    app = FastAPI()
+    seen = []
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        seen.append(len(await file.read()))
+        return {"ok": True}
+
+    @app.patch("/raw")
+    async def raw(request: Request):
+        total = 0
+        async for chunk in request.stream():
+            total += len(chunk)
+        seen.append(total)
+        return {"ok": True}
+
+    app.add_middleware(BodySizeLimitMiddleware, limit_for=lambda method, path: LIMIT)
+    return app, seen
+
+
+def _chunks(total, size=256):
+    for _ in range(total // size):
+        yield b"x" * size
+
+
+def test_rejects_by_content_length():
+    app, seen = _limited_app()
+    with TestClient(app) as c:
+        r = c.post("/upload", files={"file": ("a.jpg", b"x" * (LIMIT * 2), "image/jpeg")})
+    assert r.status_code == 413
+    assert r.json() == {"detail": "Plik jest zbyt duży."}
+    assert seen == []
+
+
+def test_rejects_chunked_body_while_receiving():
+    app, seen = _limited_app()
+    with TestClient(app) as c:
+        # generator -> Transfer-Encoding: chunked, bez Content-Length
+        r = c.patch("/raw", content=_chunks(LIMIT * 4))
+    assert r.status_code == 413
+    assert seen == []
+
+
+def test_small_chunked_body_passes():
+    app, seen = _limited_app()
+    with TestClient(app) as c:
+        r = c.patch("/raw", content=_chunks(LIMIT // 2))
+    assert r.status_code == 200
+    assert seen == [LIMIT // 2]
+
+
+def test_app_rejects_chunked_upload_over_limit(client):
+    def multipart():
+        yield (
+            b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.jpg\"\r\n"
+            b"Content-Type: image/jpeg\r\n\r\n"
+        )
+        chunk = b"x" * (1024 * 1024)
+        for _ in range(MAX_UPLOAD_BYTES // len(chunk) + 2):
+            yield chunk
+        yield b"\r\n--b--\r\n"
+
+    r = client.post(
+        "/api/upload", content=multipart(), headers={"Content-Type": "multipart/form-data; boundary=b"},
+    )
+    assert r.status_code == 413
@@ -0,0 +1,100 @@
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Optional
+
+# --- konfiguracja
+# nazwa -> maksymalna dłuższa krawędź w px
+THUMB_SIZES: Dict[str, int] = {"sm": 240, "md": 480, "lg": 1080}
+# format w URL -> (format Pillow, rozszerzenie pliku, parametry zapisu)
+THUMB_FORMATS = {
+    "webp": ("WEBP", ".webp", {"quality": 78, "method": 4}),
+    "jpeg": ("JPEG", ".jpg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+THUMB_WORKERS = int(os.getenv("THUMB_WORKERS", "2"))
+# podbić przy zmianie rozmiarów/jakości -> nowe URL-e i ETagi, stare cache wygasają same
+THUMB_VERSION = 1
+
+_pool: Optional[ProcessPoolExecutor] = None
+_inflight: Dict[str, Future] = {}
+_lock = threading.RLock()
+
+
+def derivative_rel_path(key: str, size: str, fmt: str) -> str:
+    """Ścieżka pochodnej względem katalogu miniatur, np. "v1/md/ab/cd/<sha>.webp"."""
+    stem = os.path.splitext(key)[0]
+    return f"v{THUMB_VERSION}/{size}/{stem}{THUMB_FORMATS[fmt][1]}"
+
+
+def thumb_url_template(key: str) -> str:
+    """
+    Jeden szablon adresu pochodnych zamiast listy wszystkich wariantów:
+    klient podstawia {size} (THUMB_SIZES) i {format} (THUMB_FORMATS);
+    bez segmentu "{format}/" format wybiera serwer po Accept.
+    """
+    return f"/api/thumbs/{{size}}/{{format}}/{key}?v={THUMB_VERSION}"
+
+
+def render_derivatives(thumb_dir: str, key: str) -> None:
+    """
+    Dekoduje oryginał raz i zapisuje wszystkie rozmiary w każdym formacie.
+    Uruchamiane w procesie roboczym -> import Pillow dopiero tutaj; oryginał
+    z magazynu (storage.get_backend), pochodne to lokalny cache węzła.
+    """
+    from PIL import Image, ImageOps
+
+    from storage import get_backend
+
+    with get_backend().local_copy(key) as src_path, Image.open(src_path) as im:
+        # JPEG: dekodowanie od razu w zmniejszonej skali (DCT), duża oszczędność CPU
+        largest = max(THUMB_SIZES.values())
+        im.draft("RGB", (largest, largest))
+        im = ImageOps.exif_transpose(im)
+        if im.mode != "RGB":
+            im = im.convert("RGB")
+
+        # od największego do najmniejszego -> każdy kolejny skaluje mniejszy obraz
+        for size, edge in sorted(THUMB_SIZES.items(), key=lambda kv: -kv[1]):
+            im.thumbnail((edge, edge), Image.LANCZOS)
+            for fmt, (pil_format, _ext, params) in THUMB_FORMATS.items():
+                dest = os.path.join(thumb_dir, derivative_rel_path(key, size, fmt))
+                if os.path.exists(dest):
+                    continue
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                tmp = f"{dest}.{os.getpid()}.tmp"
+                im.save(tmp, pil_format, **params)
+                os.replace(tmp, dest)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=THUMB_WORKERS)
+    return _pool
+
+
+def _forget(key: str) -> None:
+    with _lock:
+        _inflight.pop(key, None)
+
+
+def schedule(thumb_dir: str, key: str) -> Future:
+    """
+    Zleca wygenerowanie pochodnych w puli procesów. Równoległe żądania
+    o to samo zdjęcie dostają ten sam Future.
+    """
+    with _lock:
+        fut = _inflight.get(key)
+        if fut is None:
+            fut = _get_pool().submit(render_derivatives, thumb_dir, key)
+            _inflight[key] = fut
+            fut.add_done_callback(lambda _f, k=key: _forget(k))
+        return fut
+
+
+def shutdown() -> None:
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
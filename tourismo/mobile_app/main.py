@@ -1,5 +1,4 @@
 import os
-import shutil
 from typing import Optional, List
 
 # --- KivyMD
@@ -8,18 +7,25 @@ from kivymd.uix.screen import MDScreen
 from kivymd.uix.screenmanager import MDScreenManager
 from kivymd.uix.dialog import MDDialog
 from kivymd.uix.button import MDFlatButton
+from kivymd.uix.card import MDCard
 
 # --- Kivy
 from kivy.lang import Builder
 from kivy.metrics import dp
 from kivy.properties import StringProperty, ListProperty, NumericProperty, BooleanProperty
 from kivy.clock import Clock
-from kivy.uix.image import AsyncImage  # tylko do asynchronicznych zdjęć
+from kivy.uix.image import AsyncImage
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
 
 # --- Twoje moduły
-from services.api_client import APIClient
+from services.api_client import APIClient, is_unauthorized
+from services.background import BackgroundExecutor
+from services.cache import DiskCache
+from services.outbox import Outbox, OutboxSync
 from utils.camera import CameraHelper
+from utils.feed import append_page, merge_first_page
 from utils.gps import GPSHelper
+from utils.images import prepare_for_upload
 
 
 # === PROSTY ZAMIENNIK SNACKBARA ============================================
@@ -69,84 +75,124 @@ class RegisterScreen(MDScreen):
     pass
 
 
+class CachedImage(AsyncImage):
+    """
+    Obraz po URL przez dyskowy cache (services/cache.py): trafienie -> plik
+    lokalny od razu, pudło -> pobranie w tle wspólną sesją HTTP, potem plik.
+    """
+    url = StringProperty("")
+
+    def on_url(self, _instance, url):
+        app = MDApp.get_running_app()
+        path = app.cache.get_image(url) if url else None
+        self.source = path or ""
+        if url and path is None:
+            def ok(downloaded, url=url):
+                # karta mogła już zostać użyta dla innego posta
+                if self.url == url:
+                    self.source = downloaded
+
+            app.image_tasks.submit(app.cache.fetch_image, app.api.session, url, on_success=ok, key=url)
+
+
+class PostCard(RecycleDataViewBehavior, MDCard):
+    """
+    Karta posta w RecycleView (wygląd w tourismo.kv). Powstaje tylko tyle kart,
+    ile mieści się na ekranie; przy przewijaniu dostają nowe dane z rv.data.
+    """
+    post_id = NumericProperty(0)
+    url = StringProperty("")
+    user = StringProperty("")
+    subtitle = StringProperty("")
+
+
+# doładowanie starszej strony, gdy do końca listy zostało mniej niż tyle
+LOAD_MORE_PX = dp(800)
+
+
 class FeedScreen(MDScreen):
-    posts = ListProperty([])  # [{user, photo, lat, lon, created_at}]
+    posts = ListProperty([])  # [{id, user, photo, thumb, lat, lon, created_at, ...}] jak z API
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.next_cursor: Optional[str] = None
+        self._more_task = None
 
     def on_pre_enter(self):
+        app = MDApp.get_running_app()
+        if not self.posts:
+            # start: od razu ostatni feed z dysku, świeży dojdzie w tle (diff)
+            data, etag = app.cache.load_feed()
+            if data is not None:
+                self.apply_first_page(data)
+                app.feed_etag = etag
         # Odśwież feed po wejściu
-        MDApp.get_running_app().refresh_feed()
+        app.refresh_feed()
 
-    def populate_grid(self):
-        grid = self.ids.grid
-        grid.clear_widgets()
+    def _row(self, item: dict) -> dict:
+        # klucze = właściwości PostCard
         api = MDApp.get_running_app().api
+        return {
+            "post_id": item["id"],
+            # miniatura ~480 px zamiast oryginału z aparatu
+            "url": api.thumb_url(item) or api.photo_url(item) or "",
+            "user": item.get("user") or "",
+            "subtitle": item.get("created_at") or "",
+        }
+
+    def apply_first_page(self, data: dict):
+        """Świeża pierwsza strona -> do listy trafiają tylko różnice."""
+        rv = self.ids.feed_list
+        fresh, changed, reset = merge_first_page(self.posts, data["items"])
+        if reset:
+            self._cancel_more()
+            self.posts = list(fresh)
+            self.next_cursor = data.get("next_cursor")
+            rv.data = [self._row(item) for item in self.posts]
+            return
+        # RecycleView przelicza układ raz na klatkę, niezależnie od liczby zmian
+        for index, item in changed:
+            self.posts[index] = item
+            rv.data[index] = self._row(item)
+        if fresh:
+            self.posts[0:0] = fresh
+            rv.data[0:0] = [self._row(item) for item in fresh]
+
+    def on_feed_scroll(self, rv):
+        hidden = rv.children[0].height - rv.height if rv.children else 0
+        if hidden > 0 and rv.scroll_y * hidden < LOAD_MORE_PX:
+            self.load_more()
+
+    def load_more(self):
+        if not self.next_cursor or self._more_task is not None:
+            return
+        app = MDApp.get_running_app()
+
+        def ok(data):
+            self._more_task = None
+            older = append_page(self.posts, data["items"])
+            self.next_cursor = data.get("next_cursor")
+            self.posts.extend(older)
+            self.ids.feed_list.data.extend(self._row(item) for item in older)
+
+        def err(e):
+            self._more_task = None
+            show_snackbar(f"Feed: {e}")
+
+        self._more_task = app.tasks.submit(
+            app.api.get_feed, cursor=self.next_cursor, on_success=ok, on_error=err,
+        )
 
-        from kivymd.uix.card import MDCard
-        from kivymd.uix.boxlayout import MDBoxLayout
-        from kivymd.uix.label import MDLabel
-        from kivy.uix.widget import Widget
-        from kivy.graphics import Color, Rectangle
-
-        for item in self.posts:
-            card = MDCard(
-                radius=[12, 12, 12, 12],
-                padding=dp(0),
-                md_bg_color=(
-                    MDApp.get_running_app().theme_cls.surfaceColor
-                    if hasattr(MDApp.get_running_app().theme_cls, "surfaceColor")
-                    else MDApp.get_running_app().theme_cls.bg_light
-                ),
-                style="elevated",
-                ripple_behavior=True,
-                size_hint_y=None,
-                height=dp(220),
-            )
-
-            box = MDBoxLayout(orientation="vertical")
-
-            img = AsyncImage(
-                source=api.uploads_url(item["photo"]),
-                allow_stretch=True,
-                keep_ratio=True,
-            )
-
-            meta = MDBoxLayout(
-                orientation="vertical",
-                padding=dp(12),
-                size_hint_y=None,
-                height=dp(64),
-            )
-
-            user = MDLabel(
-                text=item.get("user", ""),
-                theme_text_color="Custom",
-                text_color=(1, 1, 1, 1),
-                bold=True,
-            )
-
-            sub = MDLabel(
-                text=(item.get("created_at") or ""),
-                theme_text_color="Custom",
-                text_color=(1, 1, 1, 0.85),
-                font_style="Label",
-            )
-
-            # półprzezroczysty overlay pod napisami
-            overlay = Widget(size_hint_y=None, height=dp(64))
-            with overlay.canvas.before:
-                Color(0, 0, 0, 0.35)
-                overlay._rect = Rectangle(pos=overlay.pos, size=overlay.size)
-            overlay.bind(pos=lambda w, v: setattr(overlay._rect, "pos", v))
-            overlay.bind(size=lambda w, v: setattr(overlay._rect, "size", v))
-
-            meta.add_widget(user)
-            meta.add_widget(sub)
-
-            box.add_widget(img)
-            box.add_widget(overlay)
-            box.add_widget(meta)
-            card.add_widget(box)
-            grid.add_widget(card)
+    def _cancel_more(self):
+        if self._more_task is not None:
+            self._more_task.cancel()
+            self._more_task = None
+
+    def reset(self):
+        self._cancel_more()
+        self.posts = []
+        self.next_cursor = None
+        self.ids.feed_list.data = []
 
 
 class NewPostScreen(MDScreen):
@@ -155,6 +201,7 @@ class NewPostScreen(MDScreen):
     lat = NumericProperty(0.0)
     lon = NumericProperty(0.0)
     has_location = BooleanProperty(False)
+    uploading = BooleanProperty(False)
 
     def open_camera(self):
         def ok(path):
@@ -201,35 +248,43 @@ class NewPostScreen(MDScreen):
             show_snackbar("Brak zdjęcia do wysłania.")
             return
 
-        try:
-            app.api.upload_photo(
-                user_id=user_id,
-                filepath=self.photo_path,
-                lat=self.lat if self.has_location else None,
-                lon=self.lon if self.has_location else None,
-            )
-
-            # opcjonalny lokalny cache zdjęć
+        if self.uploading:
+            return
+
+        def _enqueue(path, lat, lon):
+            # w wątku roboczym: zmniejszenie i zapis do outboxu - bez sieci;
+            # wysyłką zajmuje się OutboxSync, gdy jest zasięg
+            prepared = prepare_for_upload(path)
             try:
-                uploads_dir = os.path.join(os.getcwd(), "uploads_cache")
-                os.makedirs(uploads_dir, exist_ok=True)
-                shutil.copy(
-                    self.photo_path,
-                    os.path.join(uploads_dir, os.path.basename(self.photo_path)),
-                )
-            except Exception:
-                pass
+                return app.outbox.add(user_id, prepared, lat, lon)
+            finally:
+                if prepared != path:
+                    os.remove(prepared)
 
+        def ok(_client_key):
+            self.uploading = False
             self.photo_path = ""
             self.coords = ""
             self.has_location = False
 
-            show_snackbar("Opublikowano!")
+            app.sync.kick()
+            show_snackbar("Post czeka na wysłanie - pójdzie, gdy będzie zasięg.")
+            # FeedScreen.on_pre_enter odświeża feed
             app.change_screen("feed")
-            Clock.schedule_once(lambda *_: app.refresh_feed(), 0.2)
 
-        except Exception as e:
-            show_snackbar(f"Upload: {e}")
+        def err(e):
+            self.uploading = False
+            show_snackbar(f"Zapis posta: {e}")
+
+        self.uploading = True
+        app.tasks.submit(
+            _enqueue,
+            self.photo_path,
+            self.lat if self.has_location else None,
+            self.lon if self.has_location else None,
+            on_success=ok,
+            on_error=err,
+        )
 
 
 class Root(MDScreenManager):
@@ -243,6 +298,7 @@ class TourismoApp(MDApp):
     api: APIClient
     state_user_id: Optional[int] = None
     state_email: Optional[str] = None
+    feed_etag: Optional[str] = None
 
     def build(self):
         # Motyw
@@ -258,9 +314,40 @@ class TourismoApp(MDApp):
         except Exception:
             pass
 
-        self.api = APIClient()
+        # sesja z poprzedniego uruchomienia -> start od feedu z dysku, także offline
+        self.api = APIClient(session_path=os.path.join(self.user_data_dir, "session.json"))
+        # wszystkie wywołania API idą przez pulę; wyniki wracają przez Clock
+        self.tasks = BackgroundExecutor()
+        # obrazy osobno, żeby seria miniatur nie blokowała feedu i uploadu
+        self.image_tasks = BackgroundExecutor(workers=2)
+        self.cache = DiskCache(os.path.join(self.user_data_dir, "cache"))
+        # posty do wysłania przeżywają brak zasięgu i restart aplikacji
+        self.outbox = Outbox(os.path.join(self.user_data_dir, "outbox"))
+        self.sync = OutboxSync(
+            self.outbox, self.api,
+            on_synced=lambda n: Clock.schedule_once(lambda dt: self._outbox_synced(n), 0),
+            on_unauthorized=lambda: Clock.schedule_once(lambda dt: self._session_expired(), 0),
+        )
+        self.sync.start()
         kv_path = os.path.join(os.path.dirname(__file__), "tourismo.kv")
-        return Builder.load_file(kv_path)
+        root = Builder.load_file(kv_path)
+        if self.api.restore_session():
+            self.state_user_id = self.api.user_id
+            self.state_email = self.api.email
+            # FeedScreen.on_pre_enter: feed z cache od razu, świeży w tle
+            root.current = "feed"
+        return root
+
+    def on_resume(self):
+        # powrót na pierwszy plan -> często inny zasięg; outbox próbuje od razu
+        self.sync.kick()
+
+    def on_stop(self):
+        # porzuca trwające żądania i zamyka pulę połączeń keep-alive
+        self.sync.stop()
+        self.tasks.shutdown()
+        self.image_tasks.shutdown()
+        self.api.close()
 
     # --- nawigacja
     def change_screen(self, name: str):
@@ -271,35 +358,88 @@ class TourismoApp(MDApp):
         if not email or not password:
             show_snackbar("Podaj e-mail i hasło.")
             return
-        try:
-            data = self.api.login(email, password)
+
+        def ok(data):
             self.state_user_id = int(data["user_id"])
             self.state_email = data["email"]
             show_snackbar(f"Witaj, {self.state_email}!")
             self.change_screen("feed")
-        except Exception as e:
-            show_snackbar(f"Logowanie: {e}")
+            # posty zapisane offline przed wygaśnięciem sesji
+            self.sync.logged_in()
+
+        self.tasks.submit(
+            self.api.login, email, password,
+            on_success=ok,
+            on_error=lambda e: show_snackbar(f"Logowanie: {e}"),
+        )
+
+    def do_logout(self):
+        # odpowiedzi, które przyjdą po wylogowaniu, nie mogą już zmieniać UI
+        self.tasks.cancel_all()
+        self.root.get_screen("newpost").uploading = False
+        self.root.get_screen("feed").reset()
+        self.feed_etag = None
+        self.api.logout()
+        self.state_user_id = None
+        self.state_email = None
+        self.change_screen("login")
+
+    def _session_expired(self):
+        # token odrzucony przez serwer (wygasł / zmieniony sekret) -> logowanie od nowa;
+        # feed i outbox mogą zgłosić to równocześnie
+        if self.api.token is None:
+            return
+        self.do_logout()
+        show_snackbar("Sesja wygasła. Zaloguj się ponownie.")
 
     def do_register(self, email: str, password: str):
         if not email or not password:
             show_snackbar("Podaj e-mail i hasło.")
             return
-        try:
-            self.api.register(email, password)
+
+        def ok(_data):
             show_snackbar("Konto utworzone. Zaloguj się.")
             self.change_screen("login")
-        except Exception as e:
-            show_snackbar(f"Rejestracja: {e}")
+
+        self.tasks.submit(
+            self.api.register, email, password,
+            on_success=ok,
+            on_error=lambda e: show_snackbar(f"Rejestracja: {e}"),
+        )
+
+    # --- outbox
+    def _outbox_synced(self, count: int):
+        show_snackbar("Opublikowano!" if count == 1 else f"Opublikowano {count} posty(ów).")
+        self.refresh_feed()
 
     # --- feed
     def refresh_feed(self):
-        try:
-            data = self.api.get_feed()
-            feed: FeedScreen = self.root.get_screen("feed")
-            feed.posts = data
-            Clock.schedule_once(lambda *_: feed.populate_grid(), 0)
-        except Exception as e:
-            show_snackbar(f"Feed: {e}")
+        def fetch(etag):
+            # warunkowo: 304 -> na ekranie jest aktualny feed, bez przesyłania strony
+            data, new_etag = self.api.get_feed_revalidate(etag)
+            if data is not None:
+                self.cache.save_feed(data, new_etag)
+            return data, new_etag
+
+        def ok(result):
+            data, self.feed_etag = result
+            if data is not None:
+                feed: FeedScreen = self.root.get_screen("feed")
+                feed.apply_first_page(data)
+
+        def err(e):
+            if is_unauthorized(e):
+                self._session_expired()
+            else:
+                show_snackbar(f"Feed: {e}")
+
+        # key="feed": odświeżenia w trakcie trwającego -> jedno kolejne, po nim (bez równoległych GET)
+        self.tasks.submit(
+            fetch, self.feed_etag,
+            on_success=ok,
+            on_error=err,
+            key="feed",
+        )
 
 
 if __name__ == "__main__":
@@ -1,48 +1,318 @@
 # services/api_client.py
 
-BASE_URL = "http://127.0.0.1:8000/api" 
+BASE_URL = "http://127.0.0.1:8000/api"
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import ExitStack
+from typing import Optional
+from urllib.parse import quote
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --- połączenia
+# (connect, read): na słabym zasięgu szybko porzucamy martwe połączenie,
+# ale dajemy czas na odpowiedź serwera
+TIMEOUT = (4, 10)
+UPLOAD_TIMEOUT = (4, 30)
+BATCH_TIMEOUT = (4, 60)
+# upload wznawialny: porcja, gdy serwer nie poda swojej, i limit prób wznowienia
+RESUMABLE_CHUNK = 256 * 1024
+RESUMABLE_ATTEMPTS = 8
+# zapytania API + pobieranie obrazów do cache; więcej otwartych gniazd nic nie da
+POOL_SIZE = 6
+# zapisany token uznajemy za ważny, jeśli zostało mu co najmniej tyle sekund
+SESSION_MIN_TTL = 300
+
+# ponawiamy tylko metody idempotentne (+ nieudane nawiązanie połączenia,
+# wtedy żądanie nie dotarło do serwera); 429/503 z admission -> wg Retry-After
+RETRY = Retry(
+    total=3,
+    connect=3,
+    read=2,
+    status=2,
+    backoff_factor=0.5,  # 0.5 s, 1 s, 2 s
+    status_forcelist=(429, 502, 503, 504),
+    allowed_methods=frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}),
+    respect_retry_after_header=True,
+    raise_on_status=False,  # po ostatniej próbie zwróć odpowiedź -> raise_for_status
+)
+
+try:  # urllib3 dekoduje br tylko z pakietem brotli/brotlicffi
+    import brotli  # noqa: F401
+    ACCEPT_ENCODING = "br, gzip, deflate"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+
+def is_unauthorized(exc: BaseException) -> bool:
+    """401 z serwera: token wygasł lub jest nieważny -> trzeba zalogować się ponownie."""
+    response = getattr(exc, "response", None)
+    return isinstance(exc, requests.HTTPError) and response is not None and response.status_code == 401
+
 
 class APIClient:
-    def __init__(self, base_url: str = BASE_URL):
+    def __init__(self, base_url: str = BASE_URL, session_path: Optional[str] = None):
         self.base_url = base_url.rstrip("/")
+        # adresy mediów w odpowiedziach API są względne wobec hosta, nie /api
+        self.origin = self.base_url.rsplit("/api", 1)[0]
+        # token sesji z /login; wysyłany jako "Authorization: Bearer ..."
+        self.token = None
+        self.user_id = None
+        self.email = None
+        self.expires_at = None
+        # plik z sesją (token + ważność) -> kolejny start bez logowania, także offline
+        self.session_path = session_path
 
-    def register(self, email: str, password: str):
-        resp = requests.post(
-            f"{self.base_url}/register",
-            data={"email": email, "password": password},
-            timeout=5,
+        # jedna sesja na całe życie aplikacji: keep-alive, bez ponownego
+        # TCP+TLS przy każdym żądaniu
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=RETRY)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Accept": "application/json",
+            "Accept-Encoding": ACCEPT_ENCODING,
+            "User-Agent": "tourismo-mobile",
+        })
+
+    def close(self):
+        self.session.close()
+
+    def _auth_headers(self):
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+    def _request(self, method: str, path: str, timeout=TIMEOUT, headers=None, **kwargs):
+        resp = self.session.request(
+            method,
+            f"{self.base_url}{path}",
+            headers={**self._auth_headers(), **(headers or {})},
+            timeout=timeout,
+            **kwargs,
         )
         resp.raise_for_status()
         return resp.json()
 
+    def register(self, email: str, password: str):
+        return self._request("POST", "/register", data={"email": email, "password": password})
+
     def login(self, email: str, password: str):
-        resp = requests.post(
-            f"{self.base_url}/login",
-            data={"email": email, "password": password},
-            timeout=5,
-        )
-        resp.raise_for_status()
-        return resp.json()
+        data = self._request("POST", "/login", data={"email": email, "password": password})
+        self.token = data.get("token")
+        self.user_id = data.get("user_id")
+        self.email = data.get("email")
+        self.expires_at = data.get("expires_at")
+        self._save_session()
+        return data
+
+    def logout(self):
+        self.token = None
+        self.user_id = None
+        self.email = None
+        self.expires_at = None
+        if self.session_path:
+            try:
+                os.remove(self.session_path)
+            except FileNotFoundError:
+                pass
+
+    # --- sesja na dysku (token jest podpisany i sam wygasa -> wystarczy exp)
+
+    def restore_session(self) -> bool:
+        """Sesja z poprzedniego uruchomienia, jeśli token jest jeszcze ważny; bez sieci."""
+        if not self.session_path:
+            return False
+        try:
+            with open(self.session_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            token, user_id, expires_at = saved["token"], int(saved["user_id"]), float(saved["expires_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        if expires_at - time.time() < SESSION_MIN_TTL:
+            self.logout()
+            return False
+        self.token, self.user_id, self.expires_at = token, user_id, expires_at
+        self.email = saved.get("email")
+        return True
+
+    def _save_session(self):
+        if not self.session_path or not self.token or self.expires_at is None:
+            return
+        directory = os.path.dirname(self.session_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # mkstemp -> plik 0600; podmiana atomowa, żeby zabita aplikacja nie zostawiła połowy
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".part")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({
+                "token": self.token,
+                "user_id": self.user_id,
+                "email": self.email,
+                "expires_at": self.expires_at,
+            }, f)
+        os.replace(tmp, self.session_path)
+
+    def get_feed(self, cursor=None, limit=None):
+        params = {}
+        if cursor:
+            params["cursor"] = cursor
+        if limit:
+            params["limit"] = limit
+        # -> {"items": [...], "next_cursor": str | None}
+        return self._request("GET", "/feed", params=params)
 
-    def get_feed(self):
-        resp = requests.get(f"{self.base_url}/feed", timeout=5)
+    def get_feed_revalidate(self, etag=None):
+        """
+        Pierwsza strona feedu warunkowo (If-None-Match).
+        -> (dane albo None, gdy 304 - bez zmian od `etag`; ETag odpowiedzi)
+        """
+        headers = self._auth_headers()
+        if etag:
+            headers["If-None-Match"] = etag
+        resp = self.session.get(f"{self.base_url}/feed", headers=headers, timeout=TIMEOUT)
+        if resp.status_code == 304:
+            return None, etag
         resp.raise_for_status()
-        return resp.json()
+        return resp.json(), resp.headers.get("ETag")
+
+    # --- adresy mediów
+
+    def media_url(self, path):
+        """Ścieżka z odpowiedzi API ("/api/photos/...") -> pełny URL; absolutne bez zmian."""
+        if not path:
+            return None
+        if path.startswith(("http://", "https://")):
+            return path
+        return f"{self.origin}{path}"
+
+    def uploads_url(self, key: str):
+        """Oryginał zdjęcia po kluczu z pola "photo" (Range, cache, redirect na S3)."""
+        return self.media_url(f"/api/photos/{quote(key, safe='/')}") if key else None
+
+    def photo_url(self, item: dict):
+        return self.media_url(item.get("photo_url")) or self.uploads_url(item.get("photo"))
 
-    def upload_photo(self, user_id: int, filepath: str, lat=None, lon=None):
-        files = {"file": open(filepath, "rb")}
-        data = {"user_id": user_id}
+    def thumb_url(self, item: dict, size: str = "md", fmt: str = "jpeg"):
+        """Miniatura z szablonu "thumb" (sm | md | lg; webp | jpeg | auto = wg Accept)."""
+        # jpeg zamiast webp: nie każdy build Kivy/SDL2 na Androidzie dekoduje webp
+        template = item.get("thumb")
+        if not template:
+            return None
+        path = template.replace("{format}/", "" if fmt == "auto" else f"{fmt}/")
+        return self.media_url(path.replace("{size}", size))
+
+    # --- upload (POST: bez ponowień po wysłaniu, żeby nie zdublować posta;
+    # z client_key serwer sam rozpoznaje powtórkę -> ponawianie jest bezpieczne)
+
+    @staticmethod
+    def _idempotency(client_key):
+        return {"Idempotency-Key": client_key} if client_key else None
+
+    def upload_photo(self, filepath: str, lat=None, lon=None, client_key=None):
+        data = {}
         if lat is not None and lon is not None:
             data["lat"] = lat
             data["lon"] = lon
 
-        resp = requests.post(
-            f"{self.base_url}/upload",
-            data=data,
-            files=files,
-            timeout=20,
+        with open(filepath, "rb") as fh:
+            return self._request(
+                "POST", "/upload", timeout=UPLOAD_TIMEOUT, data=data, files={"file": fh},
+                headers=self._idempotency(client_key),
+            )
+
+    def upload_photos(self, items):
+        """
+        Wiele zdjęć jednym żądaniem: items = [{"filepath": .., "lat": .., "lon": .., "key": ..}]
+        ("key" - opcjonalny klucz idempotencji posta).
+        Zwraca {"ok": bool, "items": [{"index", "ok", "photo_url" | "status", "error"}]}.
+        """
+        with ExitStack() as stack:
+            files = [
+                ("files", (f"photo{i}.jpg", stack.enter_context(open(it["filepath"], "rb"))))
+                for i, it in enumerate(items)
+            ]
+            meta = [{"lat": it.get("lat"), "lon": it.get("lon"), "key": it.get("key")} for it in items]
+            return self._request(
+                "POST", "/upload/batch", timeout=BATCH_TIMEOUT,
+                data={"meta": json.dumps(meta)}, files=files,
+            )
+
+    # --- upload wznawialny: porcjami, po zerwaniu od ostatniego potwierdzonego bajtu
+
+    def upload_photo_resumable(self, filepath: str, lat=None, lon=None, progress=None, client_key=None):
+        """
+        init -> PATCH porcjami -> finalize. Błąd sieci nie zaczyna uploadu od nowa:
+        klient pyta serwer o offset i wysyła dalej (do RESUMABLE_ATTEMPTS prób).
+        progress(sent, total) - opcjonalnie, wołane z wątku wysyłającego.
+        """
+        size = os.path.getsize(filepath)
+        digest = hashlib.sha256()
+        with open(filepath, "rb") as fh:
+            for block in iter(lambda: fh.read(RESUMABLE_CHUNK), b""):
+                digest.update(block)
+
+        init = self._request("POST", "/upload/resumable", data={
+            "size": size,
+            "filename": os.path.basename(filepath),
+            "sha256": digest.hexdigest(),
+        })
+        path = f"/upload/resumable/{init['upload_id']}"
+        chunk_size = init.get("chunk_size") or RESUMABLE_CHUNK
+        offset = init.get("offset", 0)
+        failures = 0
+
+        with open(filepath, "rb") as fh:
+            while offset < size:
+                fh.seek(offset)
+                chunk = fh.read(chunk_size)
+                conflict = None
+                try:
+                    resp = self.session.patch(
+                        f"{self.base_url}{path}",
+                        data=chunk,
+                        headers={
+                            **self._auth_headers(),
+                            "Upload-Offset": str(offset),
+                            "Content-Type": "application/offset+octet-stream",
+                        },
+                        timeout=UPLOAD_TIMEOUT,
+                    )
+                    if resp.status_code == 409:
+                        # inny stan na serwerze (poprzednia porcja jednak dotarła
+                        # albo wciąż jest zapisywana) -> offset z odpowiedzi
+                        conflict = resp
+                    else:
+                        resp.raise_for_status()
+                        offset = int(resp.json()["offset"])
+                        failures = 0
+                        if progress is not None:
+                            progress(offset, size)
+                        continue
+                except (requests.ConnectionError, requests.Timeout):
+                    pass
+                failures += 1
+                if failures >= RESUMABLE_ATTEMPTS:
+                    raise RuntimeError("Upload przerwany: nie udało się wysłać kolejnej porcji.")
+                time.sleep(min(30, 0.5 * 2 ** failures))
+                try:
+                    offset = self._resumable_offset(path, conflict)
+                except (requests.ConnectionError, requests.Timeout):
+                    pass  # nadal bez sieci; zły offset i tak wróci jako 409 z poprawnym
+
+        data = {}
+        if lat is not None and lon is not None:
+            data["lat"] = lat
+            data["lon"] = lon
+        return self._request(
+            "POST", f"{path}/finalize", data=data, headers=self._idempotency(client_key),
         )
-        resp.raise_for_status()
-        return resp.json()
+
+    def _resumable_offset(self, path: str, resp=None) -> int:
+        # 409 niesie offset w nagłówku; w p.p. pytamy (GET, ponawiany przez adapter)
+        if resp is not None and resp.headers.get("Upload-Offset", "").isdigit():
+            return int(resp.headers["Upload-Offset"])
+        return int(self._request("GET", path)["offset"])
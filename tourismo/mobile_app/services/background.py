@@ -0,0 +1,141 @@
+# services/background.py
+"""
+Wywołania sieciowe poza wątkiem UI Kivy.
+
+submit() uruchamia funkcję w puli wątków, a wynik (albo wyjątek) oddaje
+przez Clock.schedule_once, więc callbacki zawsze działają w głównym wątku
+i mogą bezpośrednio ruszać widgety.
+
+Zadania z tym samym `key` są łączone:
+- póki poprzednie czeka w kolejce, nowe żądanie dopina się do niego;
+- jeśli poprzednie już trwa, nowe czeka i startuje dopiero po nim (najwyżej
+  jedno takie na klucz, kolejne dopinają się do niego). Nie ma dwóch
+  równoległych żądań o to samo, a ostatni odbiorca i tak dostaje dane
+  świeższe niż moment zlecenia (np. feed po właśnie opublikowanym zdjęciu).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from kivy.clock import Clock
+
+log = logging.getLogger("tourismo.background")
+
+# --- konfiguracja
+# upload + feed + drobne żądania równolegle (obrazy mają osobną pulę, patrz main.py)
+WORKERS = 3
+
+Callback = Optional[Callable]
+
+
+class Task:
+    """Uchwyt zadania; cancel() gwarantuje, że żaden callback już nie zostanie wywołany."""
+
+    def __init__(self, executor: "BackgroundExecutor", key: Optional[str]):
+        self._executor = executor
+        self.key = key
+        self.started = False
+        self.finished = False
+        self.cancelled = False
+        self.future = None
+        self.callbacks: List[Tuple[Callback, Callback]] = []
+        # zadanie z tym samym kluczem, zlecone w trakcie tego -> start po nim
+        self.followup: Optional["Task"] = None
+        self.call: Optional[Tuple[Callable, tuple, dict]] = None
+
+    def cancel(self):
+        self._executor.cancel(self)
+
+
+class BackgroundExecutor:
+    def __init__(self, workers: int = WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self._lock = threading.Lock()
+        self._by_key: Dict[str, Task] = {}
+        self._inflight: Set[Task] = set()
+
+    def submit(self, fn, *args, on_success: Callback = None, on_error: Callback = None,
+               key: Optional[str] = None, **kwargs) -> Task:
+        with self._lock:
+            previous = self._by_key.get(key) if key else None
+            if previous is not None and not previous.started:
+                previous.callbacks.append((on_success, on_error))
+                return previous
+            task = Task(self, key)
+            task.callbacks.append((on_success, on_error))
+            task.call = (fn, args, kwargs)
+            if key:
+                self._by_key[key] = task
+            self._inflight.add(task)
+            if previous is not None and not previous.finished:
+                # to samo żądanie właśnie trwa -> następne dopiero po nim
+                previous.followup = task
+            else:
+                self._start(task)
+        return task
+
+    def cancel(self, task: Task):
+        with self._lock:
+            task.cancelled = True
+            if task.future is not None:
+                task.future.cancel()  # jeszcze w kolejce -> w ogóle nie wystartuje
+            self._forget(task)
+
+    def cancel_all(self):
+        with self._lock:
+            tasks = list(self._inflight)
+        for task in tasks:
+            self.cancel(task)
+
+    def shutdown(self):
+        self.cancel_all()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # --- wewnętrzne
+
+    def _forget(self, task: Task):
+        # wołane z trzymanym self._lock
+        self._inflight.discard(task)
+        if task.key and self._by_key.get(task.key) is task:
+            del self._by_key[task.key]
+
+    def _start(self, task: Task):
+        # wołane z trzymanym self._lock
+        fn, args, kwargs = task.call
+        task.call = None
+        task.future = self._pool.submit(self._run, task, fn, args, kwargs)
+
+    def _run(self, task: Task, fn, args, kwargs):
+        with self._lock:
+            if task.cancelled:
+                return
+            task.started = True
+        try:
+            result, error = fn(*args, **kwargs), None
+        except Exception as e:
+            result, error = None, e
+        with self._lock:
+            task.finished = True
+            followup, task.followup = task.followup, None
+            if followup is not None and not followup.cancelled:
+                self._start(followup)
+        Clock.schedule_once(lambda dt: self._deliver(task, result, error), 0)
+
+    def _deliver(self, task: Task, result, error):
+        with self._lock:
+            if task.cancelled or task not in self._inflight:
+                return
+            self._forget(task)
+            callbacks = task.callbacks
+        for on_success, on_error in callbacks:
+            try:
+                if error is None:
+                    if on_success is not None:
+                        on_success(result)
+                elif on_error is not None:
+                    on_error(error)
+                else:
+                    log.warning("background task failed: %r", error)
+            except Exception:
+                log.exception("background callback failed")
@@ -0,0 +1,126 @@
+# services/cache.py
+"""
+Trwały cache na urządzeniu:
+- obrazy (miniatury, oryginały) po URL - adresy zdjęć z API są niezmienne
+  (klucz = hash treści), więc wpis nigdy nie wymaga rewalidacji;
+  limit rozmiaru, wyrzucanie najdawniej używanych (LRU po mtime pliku),
+- ostatnia pierwsza strona feedu (+ ETag) -> ekran rysuje się od razu
+  z dysku, a świeże dane dochodzą w tle.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Optional, Tuple
+
+# --- konfiguracja
+IMAGE_CACHE_BYTES = 100 * 1024 * 1024
+# po przekroczeniu limitu sprzątamy z zapasem, a nie przy każdym kolejnym obrazie
+EVICT_TO = 0.8
+FEED_FILE = "feed.json"
+FETCH_TIMEOUT = (4, 20)
+
+_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+class DiskCache:
+    def __init__(self, root: str, max_bytes: int = IMAGE_CACHE_BYTES):
+        self.root = root
+        self.images = os.path.join(root, "img")
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.images, exist_ok=True)
+        self._size = 0
+        for e in os.scandir(self.images):
+            if e.name.endswith(".part"):
+                os.remove(e.path)  # przerwane pobranie z poprzedniego uruchomienia
+            elif e.is_file():
+                self._size += e.stat().st_size
+
+    # --- obrazy
+
+    def image_path(self, url: str) -> str:
+        ext = os.path.splitext(url.split("?", 1)[0])[1].lower()
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.images, name + (ext if ext in _EXTENSIONS else ""))
+
+    def get_image(self, url: str) -> Optional[str]:
+        """Ścieżka pliku z cache albo None; trafienie odświeża pozycję w LRU."""
+        path = self.image_path(url)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def fetch_image(self, session, url: str, timeout=FETCH_TIMEOUT) -> str:
+        """Pobiera obraz (wspólna sesja HTTP APIClient) do cache; wołać poza wątkiem UI."""
+        path = self.get_image(url)
+        if path is not None:
+            return path
+        resp = session.get(url, headers={"Accept": "image/*"}, timeout=timeout, stream=True)
+        resp.raise_for_status()
+        fd, tmp = tempfile.mkstemp(dir=self.images, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in resp.iter_content(64 * 1024):
+                    f.write(chunk)
+        except BaseException:
+            os.remove(tmp)
+            raise
+        finally:
+            resp.close()
+        return self._commit(tmp, url)
+
+    def _commit(self, tmp: str, url: str) -> str:
+        path = self.image_path(url)
+        size = os.path.getsize(tmp)
+        with self._lock:
+            try:
+                self._size -= os.path.getsize(path)
+            except FileNotFoundError:
+                pass
+            os.replace(tmp, path)
+            self._size += size
+            if self._size > self.max_bytes:
+                self._evict()
+        return path
+
+    def _evict(self):
+        # wołane z trzymanym self._lock
+        entries = []
+        for e in os.scandir(self.images):
+            if e.is_file() and not e.name.endswith(".part"):
+                st = e.stat()
+                entries.append((st.st_mtime, st.st_size, e.path))
+        entries.sort()
+        target = self.max_bytes * EVICT_TO
+        size = sum(s for _, s, _ in entries)
+        for _, s, path in entries:
+            if size <= target:
+                break
+            try:
+                os.remove(path)
+                size -= s
+            except FileNotFoundError:
+                pass
+        self._size = size
+
+    # --- ostatni feed
+
+    def load_feed(self) -> Tuple[Optional[dict], Optional[str]]:
+        """(pierwsza strona feedu, ETag) z poprzedniego uruchomienia albo (None, None)."""
+        try:
+            with open(os.path.join(self.root, FEED_FILE), "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            return saved["data"], saved.get("etag")
+        except (OSError, ValueError, KeyError):
+            return None, None
+
+    def save_feed(self, data: dict, etag: Optional[str]) -> None:
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".part")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"data": data, "etag": etag, "saved_at": time.time()}, f)
+        os.replace(tmp, os.path.join(self.root, FEED_FILE))
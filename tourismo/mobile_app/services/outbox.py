@@ -0,0 +1,284 @@
+# services/outbox.py
+"""
+Trwała kolejka postów do wysłania (SQLite na urządzeniu) i wątek, który
+ją opróżnia, gdy jest zasięg.
+
+Publikacja tylko zapisuje zdjęcie (już zmniejszone) i wiersz w outboxie,
+więc działa bez sieci. OutboxSync wysyła porcjami przez /api/upload/batch,
+a większe pliki pojedynczo uploadem wznawialnym. Każdy wpis ma stały
+client_key (Idempotency-Key), więc ponowienie po zerwanym połączeniu
+zwraca zapisany post, a nie tworzy duplikatu.
+"""
+import logging
+import os
+import random
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Callable, List, Optional
+
+import requests
+
+log = logging.getLogger("tourismo.outbox")
+
+# --- konfiguracja
+BATCH_POSTS = 5
+# suma plików w jednym żądaniu batch; większy plik idzie sam, porcjami
+BATCH_BYTES = 2 * 1024 * 1024
+BACKOFF_BASE = 5.0
+BACKOFF_MAX = 15 * 60
+# bez kick() i tak zaglądamy co tyle (np. po ponownym zalogowaniu w tle)
+IDLE_POLL = 60.0
+# odpowiedzi, których ponowienie nic nie zmieni
+PERMANENT_STATUS = (400, 413, 422)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    client_key TEXT NOT NULL UNIQUE,
+    user_id INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    lat REAL,
+    lon REAL,
+    queued_at REAL NOT NULL,
+    -- pending -> (wysłany = usunięty) | failed (odrzucony przez serwer)
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS ix_outbox_due ON outbox (user_id, status, next_attempt, id);
+"""
+
+
+class Outbox:
+    def __init__(self, root: str):
+        self.files = os.path.join(root, "files")
+        os.makedirs(self.files, exist_ok=True)
+        self._lock = threading.Lock()
+        # autocommit: każda zmiana od razu trwała (aplikację może zabić system)
+        self._db = sqlite3.connect(
+            os.path.join(root, "outbox.db"), check_same_thread=False, isolation_level=None,
+        )
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    def add(self, user_id: int, src_path: str, lat=None, lon=None) -> str:
+        """Kopia pliku do outboxu + wpis; zwraca client_key posta."""
+        key = uuid.uuid4().hex
+        dest = os.path.join(self.files, key + os.path.splitext(src_path)[1].lower())
+        shutil.copyfile(src_path, dest)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO outbox (client_key, user_id, path, lat, lon, queued_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, user_id, dest, lat, lon, time.time()),
+            )
+        return key
+
+    def due(self, user_id: int, limit: int = BATCH_POSTS) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT * FROM outbox WHERE user_id = ? AND status = 'pending' AND next_attempt <= ?"
+                " ORDER BY id LIMIT ?",
+                (user_id, time.time(), limit),
+            ).fetchall()
+
+    def next_due(self, user_id: int) -> Optional[float]:
+        with self._lock:
+            return self._db.execute(
+                "SELECT MIN(next_attempt) FROM outbox WHERE user_id = ? AND status = 'pending'",
+                (user_id,),
+            ).fetchone()[0]
+
+    def pending_count(self, user_id: int) -> int:
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM outbox WHERE user_id = ? AND status = 'pending'", (user_id,),
+            ).fetchone()[0]
+
+    def done(self, row: sqlite3.Row) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM outbox WHERE id = ?", (row["id"],))
+        try:
+            os.remove(row["path"])
+        except FileNotFoundError:
+            pass
+
+    def retry_later(self, rows: List[sqlite3.Row], error: str) -> None:
+        """Wykładniczy backoff z losowym rozrzutem (wiele urządzeń po powrocie zasięgu)."""
+        now = time.time()
+        with self._lock:
+            for row in rows:
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** row["attempts"]) * random.uniform(0.5, 1.0)
+                self._db.execute(
+                    "UPDATE outbox SET attempts = attempts + 1, next_attempt = ?, last_error = ? WHERE id = ?",
+                    (now + delay, error[:255], row["id"]),
+                )
+
+    def fail(self, row: sqlite3.Row, error: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET status = 'failed', last_error = ? WHERE id = ?", (error[:255], row["id"]),
+            )
+
+    def wake(self, user_id: int) -> None:
+        """Jest połączenie -> czekające na backoff wpisy mogą iść od razu."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE outbox SET next_attempt = 0 WHERE user_id = ? AND status = 'pending'", (user_id,),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class OutboxSync(threading.Thread):
+    """
+    Wątek w tle opróżniający outbox zalogowanego użytkownika.
+    on_sent(row, photo_url) - po zapisaniu posta na serwerze (wątek synchronizacji),
+    on_synced(n) - po rundzie, w której wysłano n postów (wątek synchronizacji),
+    on_unauthorized() - serwer odrzucił token (wątek synchronizacji); wysyłka
+    stoi do logged_in().
+    """
+
+    def __init__(self, outbox: Outbox, api, on_sent: Optional[Callable] = None,
+                 on_synced: Optional[Callable] = None, on_unauthorized: Optional[Callable] = None):
+        super().__init__(name="outbox-sync", daemon=True)
+        self.outbox = outbox
+        self.api = api
+        self.on_sent = on_sent
+        self.on_synced = on_synced
+        self.on_unauthorized = on_unauthorized
+        self._wakeup = threading.Event()
+        # czyszczone przez 401: z odrzuconym tokenem nie ma sensu próbować
+        self._authorized = threading.Event()
+        self._authorized.set()
+        self._stopping = False
+
+    def kick(self) -> None:
+        """Nowy wpis, logowanie albo powrót aplikacji na pierwszy plan -> spróbuj teraz."""
+        self._wakeup.set()
+
+    def logged_in(self) -> None:
+        """Nowy token po zalogowaniu -> wysyłka znowu możliwa, od razu."""
+        self._authorized.set()
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+
+    def run(self) -> None:
+        while not self._stopping:
+            self._wakeup.wait(self._idle_timeout())
+            self._wakeup.clear()
+            if self._stopping:
+                break
+            try:
+                sent = self.sync_once()
+            except Exception:
+                log.exception("outbox sync failed")
+                continue
+            if sent and self.on_synced is not None:
+                self.on_synced(sent)
+
+    def _idle_timeout(self) -> float:
+        user_id = self.api.user_id
+        if not self._authorized.is_set() or not self.api.token or user_id is None:
+            return IDLE_POLL
+        next_due = self.outbox.next_due(user_id)
+        if next_due is None:
+            return IDLE_POLL
+        return min(IDLE_POLL, max(0.0, next_due - time.time()))
+
+    def sync_once(self) -> int:
+        """Wysyła wszystko, co jest do wysłania; przy braku sieci przerywa. -> liczba postów."""
+        total = 0
+        while self._authorized.is_set() and self.api.token and not self._stopping:
+            user_id = self.api.user_id
+            rows = self.outbox.due(user_id)
+            if not rows:
+                break
+            sent = self._send(user_id, self._batch(rows))
+            if sent is None:
+                break
+            total += sent
+        return total
+
+    def _batch(self, rows: List[sqlite3.Row]) -> List[sqlite3.Row]:
+        batch, size = [], 0
+        for row in rows:
+            try:
+                row_size = os.path.getsize(row["path"])
+            except OSError:
+                row_size = 0  # brak pliku -> serwer odrzuci, wpis trafi do failed
+            if batch and size + row_size > BATCH_BYTES:
+                break
+            batch.append(row)
+            size += row_size
+        return batch
+
+    def _send(self, user_id: int, batch: List[sqlite3.Row]) -> Optional[int]:
+        """Jedno żądanie. -> liczba zapisanych postów albo None (spróbować później)."""
+        try:
+            if len(batch) == 1 and os.path.getsize(batch[0]["path"]) > BATCH_BYTES:
+                row = batch[0]
+                result = self.api.upload_photo_resumable(
+                    row["path"], lat=row["lat"], lon=row["lon"], client_key=row["client_key"],
+                )
+                items = [{"ok": True, "photo_url": result["photo_url"]}]
+            else:
+                result = self.api.upload_photos([
+                    {"filepath": row["path"], "lat": row["lat"], "lon": row["lon"], "key": row["client_key"]}
+                    for row in batch
+                ])
+                items = result["items"]
+        except FileNotFoundError as e:
+            for row in batch:
+                if not os.path.exists(row["path"]):
+                    self.outbox.fail(row, repr(e))
+            return 0
+        except requests.HTTPError as e:
+            status = e.response.status_code if e.response is not None else None
+            if status == 401:
+                # sesja wygasła: czekamy na ponowne logowanie, bez liczenia prób
+                self._authorized.clear()
+                if self.on_unauthorized is not None:
+                    self.on_unauthorized()
+                return None
+            if status in PERMANENT_STATUS:
+                if len(batch) > 1:
+                    # odrzucony cały batch -> każdy osobno, żeby znaleźć winowajcę
+                    sent = [self._send(user_id, [row]) for row in batch]
+                    return None if None in sent else sum(sent)
+                self.outbox.fail(batch[0], f"HTTP {status}")
+                return 0
+            self.outbox.retry_later(batch, f"HTTP {status}")
+            return None
+        except (requests.RequestException, RuntimeError) as e:
+            # brak zasięgu / timeout / upload wznawialny się poddał
+            self.outbox.retry_later(batch, repr(e))
+            return None
+
+        # serwer odpowiedział -> jest sieć; wpisy czekające na backoff idą od razu
+        self.outbox.wake(user_id)
+        sent = 0
+        for row, item in zip(batch, items):
+            if item.get("ok"):
+                if self.on_sent is not None:
+                    try:
+                        self.on_sent(row, item["photo_url"])
+                    except Exception:
+                        log.exception("outbox on_sent failed")
+                self.outbox.done(row)
+                sent += 1
+            elif item.get("status") in PERMANENT_STATUS:
+                self.outbox.fail(row, item.get("error") or "rejected")
+            else:
+                # np. serwer nie zapisał pliku -> jak błąd sieci, z backoffem
+                self.outbox.retry_later([row], item.get("error") or "rejected")
+        return sent
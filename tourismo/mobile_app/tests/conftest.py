@@ -0,0 +1,8 @@
+"""
+Testy części aplikacji niezależnych od Kivy (services/, utils/);
+importy jak w main.py - względem katalogu mobile_app.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,54 @@
+import time
+
+from services.api_client import APIClient
+
+ITEM = {
+    "photo": "ab/cd/abc.jpg",
+    "photo_url": "/api/photos/ab/cd/abc.jpg",
+    "thumb": "/api/thumbs/{size}/{format}/ab/cd/abc.jpg?v=1",
+}
+
+
+def test_thumb_url_from_template():
+    api = APIClient("http://host:8000/api")
+    assert api.thumb_url(ITEM) == "http://host:8000/api/thumbs/md/jpeg/ab/cd/abc.jpg?v=1"
+    assert api.thumb_url(ITEM, "sm", "webp") == "http://host:8000/api/thumbs/sm/webp/ab/cd/abc.jpg?v=1"
+    assert api.thumb_url(ITEM, "lg", "auto") == "http://host:8000/api/thumbs/lg/ab/cd/abc.jpg?v=1"
+
+
+def test_thumb_url_missing_falls_back_to_photo():
+    api = APIClient("http://host:8000/api")
+    item = {k: v for k, v in ITEM.items() if k != "thumb"}
+    assert api.thumb_url(item) is None
+    assert api.photo_url(item) == "http://host:8000/api/photos/ab/cd/abc.jpg"
+
+
+def _logged_in(tmp_path, expires_at):
+    api = APIClient("http://host:8000/api", session_path=str(tmp_path / "session.json"))
+    api._request = lambda *a, **kw: {
+        "ok": True, "user_id": 7, "email": "a@b.pl", "token": "tok", "expires_at": expires_at,
+    }
+    api.login("a@b.pl", "secret")
+    return api
+
+
+def test_session_survives_restart(tmp_path):
+    _logged_in(tmp_path, int(time.time()) + 3600)
+    api = APIClient("http://host:8000/api", session_path=str(tmp_path / "session.json"))
+    assert api.restore_session()
+    assert (api.token, api.user_id, api.email) == ("tok", 7, "a@b.pl")
+
+
+def test_expired_session_is_dropped(tmp_path):
+    _logged_in(tmp_path, int(time.time()) + 10)
+    api = APIClient("http://host:8000/api", session_path=str(tmp_path / "session.json"))
+    assert not api.restore_session()
+    assert api.token is None
+    assert not (tmp_path / "session.json").exists()
+
+
+def test_logout_removes_saved_session(tmp_path):
+    api = _logged_in(tmp_path, int(time.time()) + 3600)
+    api.logout()
+    assert not (tmp_path / "session.json").exists()
+    assert not APIClient(session_path=str(tmp_path / "session.json")).restore_session()
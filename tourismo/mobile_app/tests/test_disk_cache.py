@@ -0,0 +1,56 @@
+import os
+
+from services.cache import DiskCache
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, size):
+        yield self.body
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, size=100):
+        self.size = size
+        self.calls = []
+
+    def get(self, url, **kwargs):
+        self.calls.append(url)
+        return FakeResponse(b"x" * self.size)
+
+
+def test_fetch_image_caches_by_url(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    session = FakeSession()
+    path = cache.fetch_image(session, "http://h/api/thumbs/md/jpeg/a.jpg?v=1")
+    assert path.endswith(".jpg") and os.path.getsize(path) == 100
+    assert cache.fetch_image(session, "http://h/api/thumbs/md/jpeg/a.jpg?v=1") == path
+    assert len(session.calls) == 1
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=350)
+    session = FakeSession(100)
+    paths = [cache.fetch_image(session, f"http://h/{i}.jpg") for i in range(3)]
+    for i, path in enumerate(paths):
+        os.utime(path, (1000 + i, 1000 + i))
+    cache.get_image("http://h/0.jpg")  # trafienie -> najświeższy
+    cache.fetch_image(session, "http://h/3.jpg")  # 400 > 350 -> sprzątanie do 80%
+    assert cache.get_image("http://h/1.jpg") is None
+    assert cache.get_image("http://h/0.jpg") is not None
+    assert cache.get_image("http://h/3.jpg") is not None
+
+
+def test_feed_round_trip(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    assert cache.load_feed() == (None, None)
+    cache.save_feed({"items": [{"id": 1}], "next_cursor": None}, '"etag"')
+    assert DiskCache(str(tmp_path)).load_feed() == ({"items": [{"id": 1}], "next_cursor": None}, '"etag"')
@@ -0,0 +1,45 @@
+from utils.feed import append_page, merge_first_page
+
+
+def post(post_id, **extra):
+    return {"id": post_id, "user": "a@b", **extra}
+
+
+def test_merge_into_empty_list_resets():
+    page = [post(3), post(2)]
+    assert merge_first_page([], page) == (page, [], True)
+
+
+def test_merge_new_posts_on_top():
+    current = [post(3), post(2), post(1)]
+    fresh, changed, reset = merge_first_page(current, [post(5), post(4), post(3), post(2)])
+    assert [p["id"] for p in fresh] == [5, 4]
+    assert changed == []
+    assert reset is False
+
+
+def test_merge_reports_changed_posts_with_index():
+    current = [post(3), post(2, placeholder=None), post(1)]
+    updated = post(2, placeholder="LKO2")
+    fresh, changed, reset = merge_first_page(current, [post(3), updated])
+    assert fresh == []
+    assert changed == [(1, updated)]
+    assert reset is False
+
+
+def test_merge_without_overlap_resets():
+    current = [post(3), post(2)]
+    page = [post(10), post(9)]
+    assert merge_first_page(current, page) == (page, [], True)
+
+
+def test_merge_skips_unknown_posts_below_overlap():
+    # post 7 pojawił się pod już widocznymi - nie wstawiamy go w środek listy
+    current = [post(3), post(2)]
+    fresh, _, _ = merge_first_page(current, [post(4), post(3), post(7), post(2)])
+    assert [p["id"] for p in fresh] == [4]
+
+
+def test_append_page_skips_duplicates():
+    current = [post(3), post(2)]
+    assert [p["id"] for p in append_page(current, [post(2), post(1)])] == [1]
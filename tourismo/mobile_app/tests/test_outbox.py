@@ -0,0 +1,87 @@
+import threading
+import time
+
+import requests
+
+from services.outbox import Outbox, OutboxSync
+
+
+class FakeAPI:
+    """Zamiast APIClient: token/user_id i upload_photos z zadaną odpowiedzią."""
+
+    def __init__(self, respond):
+        self.token = "tok"
+        self.user_id = 1
+        self.respond = respond
+        self.calls = 0
+
+    def upload_photos(self, items):
+        self.calls += 1
+        return self.respond(items)
+
+
+def _http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"HTTP {status}", response=response)
+
+
+def _queue(outbox, tmp_path, count=1):
+    for i in range(count):
+        src = tmp_path / f"p{i}.jpg"
+        src.write_bytes(b"jpeg")
+        outbox.add(1, str(src))
+
+
+def test_unauthorized_pauses_sync_until_login(tmp_path):
+    def respond(_items):
+        raise _http_error(401)
+
+    outbox = Outbox(str(tmp_path / "outbox"))
+    _queue(outbox, tmp_path)
+    api = FakeAPI(respond)
+    expired = threading.Event()
+    sync = OutboxSync(outbox, api, on_unauthorized=expired.set)
+    sync.start()
+    try:
+        sync.kick()
+        assert expired.wait(2)
+        time.sleep(0.3)
+        # bez pętli: jedno żądanie i czekanie na logowanie, mimo kick()
+        sync.kick()
+        time.sleep(0.3)
+        assert api.calls == 1
+        assert outbox.pending_count(1) == 1
+
+        api.respond = lambda items: {"ok": True, "items": [{"ok": True, "photo_url": "/p"} for _ in items]}
+        sync.logged_in()
+        deadline = time.time() + 2
+        while outbox.pending_count(1) and time.time() < deadline:
+            time.sleep(0.02)
+        assert outbox.pending_count(1) == 0
+    finally:
+        sync.stop()
+        sync.join(2)
+        outbox.close()
+
+
+def test_item_errors_retry_unless_permanent(tmp_path):
+    def respond(items):
+        return {"ok": False, "items": [
+            {"index": 0, "ok": True, "photo_url": "/p"},
+            {"index": 1, "ok": False, "status": 422, "error": "Nieprawidłowe współrzędne."},
+            {"index": 2, "ok": False, "status": 503, "error": "Nie udało się zapisać pliku."},
+        ]}
+
+    outbox = Outbox(str(tmp_path / "outbox"))
+    _queue(outbox, tmp_path, 3)
+    api = FakeAPI(respond)
+    try:
+        assert OutboxSync(outbox, api).sync_once() == 1
+        assert api.calls == 1
+        # zły wpis odpada, nieudany zapis czeka na backoff
+        assert outbox.pending_count(1) == 1
+        assert outbox.due(1) == []
+        assert outbox.next_due(1) > time.time()
+    finally:
+        outbox.close()
@@ -0,0 +1,39 @@
+from typing import Dict, List, Tuple
+
+# --- scalanie stron feedu z tym, co już jest na ekranie (po "id" posta)
+
+
+def merge_first_page(current: List[dict], page: List[dict]) -> Tuple[List[dict], List[Tuple[int, dict]], bool]:
+    """
+    Pierwsza strona po odświeżeniu vs lista na ekranie.
+    Zwraca (nowe na górę, [(indeks, zmieniony post)], reset):
+    - nowe posty to te przed pierwszym już widocznym,
+    - zmienione to widoczne, których dane się zmieniły (np. placeholder od workera),
+    - reset=True, gdy strona w ogóle nie zachodzi na listę (przerwa dłuższa
+      niż strona) - wtedy lista zaczyna się od nowa od `page`.
+    """
+    if not current:
+        return list(page), [], True
+    index: Dict[int, int] = {item["id"]: i for i, item in enumerate(current)}
+    fresh: List[dict] = []
+    changed: List[Tuple[int, dict]] = []
+    overlap = False
+    for item in page:
+        i = index.get(item["id"])
+        if i is None:
+            if overlap:
+                continue  # usunięty/przestawiony w środku - pominięty do pełnego odświeżenia
+            fresh.append(item)
+            continue
+        overlap = True
+        if current[i] != item:
+            changed.append((i, item))
+    if not overlap:
+        return list(page), [], True
+    return fresh, changed, False
+
+
+def append_page(current: List[dict], page: List[dict]) -> List[dict]:
+    """Posty ze starszej strony, których jeszcze nie ma na liście."""
+    shown = {item["id"] for item in current}
+    return [item for item in page if item["id"] not in shown]
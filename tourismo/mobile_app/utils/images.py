@@ -0,0 +1,44 @@
+import os
+import tempfile
+
+# --- przygotowanie zdjęcia do wysłania
+# dłuższy bok po zmniejszeniu; 2048 px wystarcza na pełny ekran telefonu
+# i na największą miniaturę serwera, a plik spada z 5-12 MB do ~0,5-1 MB
+MAX_EDGE = 2048
+JPEG_QUALITY = 85
+# mniejsze pliki JPEG wysyłamy bez ponownej kompresji (bez straty jakości)
+PASSTHROUGH_BYTES = 1024 * 1024
+
+TAG_ORIENTATION = 0x0112
+
+
+def prepare_for_upload(path: str, max_edge: int = MAX_EDGE, quality: int = JPEG_QUALITY) -> str:
+    """
+    Zmniejsza zdjęcie do `max_edge` px dłuższego boku i zapisuje jako JPEG
+    w katalogu tymczasowym. Obraca piksele wg orientacji EXIF, a resztę EXIF
+    (GPS, data wykonania) zachowuje - serwer z niej korzysta.
+    Zwraca ścieżkę do wysłania: nowy plik albo `path`, gdy nie trzeba nic robić.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as im:
+        exif = im.getexif()
+        small = max(im.size) <= max_edge and exif.get(TAG_ORIENTATION, 1) == 1
+        if small and im.format == "JPEG" and os.path.getsize(path) <= PASSTHROUGH_BYTES:
+            return path
+
+        # JPEG: dekodowanie od razu w zmniejszonej skali (1/2, 1/4, 1/8) -> mniej RAM i CPU
+        im.draft("RGB", (max_edge, max_edge))
+        out = ImageOps.exif_transpose(im)
+        out.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        if out.mode != "RGB":
+            out = out.convert("RGB")
+
+        # piksele są już obrócone -> orientacja w EXIF musi wrócić do 1
+        if TAG_ORIENTATION in exif:
+            del exif[TAG_ORIENTATION]
+
+        fd, dest = tempfile.mkstemp(prefix="tourismo_up_", suffix=".jpg")
+        with os.fdopen(fd, "wb") as f:
+            out.save(f, "JPEG", quality=quality, optimize=True, progressive=True, exif=exif.tobytes())
+    return dest